@@ -0,0 +1,244 @@
+import collections
+import json
+import os
+import subprocess
+import threading
+import time
+
+# The apps Executor can launch (Start Menu and desktop shortcuts and exes,
+# plus the launcher's list of Store apps), kept on disk so start-up reads one
+# file instead of walking the Start Menu and waiting on PowerShell. A refresh
+# stats every directory under the roots but lists only the ones whose mtime
+# moved, which is when an entry in them was added, removed or renamed.
+
+_EXTENSIONS = (('.lnk', 'shortcuts'), ('.exe', 'exes'))
+
+# the assistant's own cache directory; the TTS cache is kept apart from it
+# and trims its directory to a byte budget
+CACHE_ROOT = os.path.join(os.path.expanduser('~'), '.cache', 'voice_ai')
+
+# where earlier versions saved the index, inside the TTS cache
+_OLD_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'voice_ai_tts', 'apps.json')
+
+
+def windows_roots(user = None) -> list:
+    user = user or os.environ.get('USERNAME') or os.environ.get('USER')
+    return [
+        f"C:/Users/{user}/OneDrive/Desktop",
+        "C:/ProgramData/Microsoft/Windows/Start Menu/Programs",
+        f"C:/Users/{user}/AppData/Roaming/Microsoft/Windows/Start Menu/Programs",
+    ]
+
+
+def start_apps(timeout = 8) -> dict:
+    """``{name: AppID}`` of the apps ``Get-StartApps`` lists."""
+    cmd = ["powershell", "-NoProfile", "-Command", "Get-StartApps | ConvertTo-Json -Compress"]
+    out = subprocess.run(cmd, capture_output = True, timeout = timeout).stdout.decode('utf-8').strip()
+    apps = {}
+    if out:
+        data = json.loads(out)
+        if isinstance(data, dict):
+            data = [data]
+        for app in data:
+            name = str(app.get("Name", "")).lower()
+            appid = app.get("AppID")
+            if name and appid:
+                apps[name] = appid
+    return apps
+
+
+class AppCache():
+    """App tables for ``Executor``, persisted to ``path`` and refreshed incrementally.
+
+    ``roots`` are the directories walked for ``.lnk`` and ``.exe`` files
+    (the Windows desktop and Start Menu by default; any tree works).
+    ``launcher()`` returns ``{name: id}`` for the ``uwp`` table, e.g.
+    ``start_apps``; None leaves it empty. ``loaded`` says whether a saved
+    index was read at construction. ``tables()`` returns the three tables
+    as ``Executor._APP_INDEX`` holds them. ``refresh()`` rescans changed
+    directories, queries the launcher again, saves, and returns whether
+    anything changed. ``start(on_change)`` refreshes on a daemon thread now
+    and then every ``interval`` seconds. ``listed`` and ``unchanged`` count
+    directories listed and skipped. ``launches`` counts launches per
+    ``(kind, name)``; ``record(kind, name)`` adds one and saves, so the
+    counts ``AppIndex`` ranks by outlive the process, and ``launched()``
+    is a copy of them."""
+
+    def __init__(self, roots = None, path = None, launcher = None, interval = 300):
+        self.roots = [os.path.normpath(str(root)) for root in (roots if roots is not None else windows_roots())]
+        self.path = path or os.path.join(CACHE_ROOT, 'apps.json')
+        if path is None:
+            self._move_old_index()
+        self.launcher = launcher
+        self.interval = interval
+        self.listed = 0
+        self.unchanged = 0
+        self.refreshes = 0
+        self.refreshed = None
+        # directory -> {'mtime', 'files': {kind: {name: path}}, 'subdirs'},
+        # in the order os.walk would visit them
+        self._dirs = {}
+        self._uwp = {}
+        self.launches = collections.Counter()
+        self._lock = threading.Lock()
+        # one writer of the file at a time: a refresh's and a launch's
+        self._saving = threading.Lock()
+        # one refresh at a time: the poller's and an explicit one
+        self._refreshing = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.loaded = self._load()
+
+    def tables(self) -> dict:
+        with self._lock:
+            dirs, uwp = self._dirs, self._uwp
+        tables = {'shortcuts': {}, 'exes': {}, 'uwp': dict(uwp)}
+        for entry in dirs.values():
+            for kind, files in entry['files'].items():
+                tables[kind].update(files)
+        return tables
+
+    def record(self, kind, name):
+        with self._lock:
+            self.launches[(kind, name)] += 1
+        self._save()
+
+    def launched(self) -> dict:
+        with self._lock:
+            return dict(self.launches)
+
+    def refresh(self) -> bool:
+        with self._refreshing:
+            return self._refresh()
+
+    def _refresh(self):
+        dirs = {}
+        changed = False
+        for root in self.roots:
+            changed |= self._scan(root, dirs)
+        uwp = self._uwp
+        if self.launcher is not None:
+            try:
+                uwp = self.launcher()
+            except Exception as e:
+                # the last list is better than none
+                print(f"INDEX ERROR: {e}")
+        changed |= uwp != self._uwp or list(dirs) != list(self._dirs)
+        with self._lock:
+            self._dirs, self._uwp = dirs, uwp
+            self.refreshes += 1
+            self.refreshed = time.time()
+        if changed or not self.loaded:
+            self._save()
+            self.loaded = True
+        return changed
+
+    def start(self, on_change = None, now = True):
+        """Refresh on a daemon thread, first right away (unless ``now`` is
+        False) and then every ``interval`` seconds until ``stop()``;
+        ``on_change(self)`` runs after each refresh that changed something."""
+        if self._thread is not None:
+            return self._thread
+
+        def poll():
+            wait = 0 if now else self.interval
+            while not self._stop.wait(wait):
+                try:
+                    if self.refresh() and on_change is not None:
+                        on_change(self)
+                except Exception as e:
+                    print(f"INDEX ERROR: {e}")
+                if not self.interval:
+                    return
+                wait = self.interval
+
+        self._stop.clear()
+        self._thread = threading.Thread(target = poll, name = 'app-index', daemon = True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout = 5)
+            self._thread = None
+
+    def _scan(self, root, dirs):
+        # os.walk's top-down order, but a directory whose mtime is unchanged
+        # reuses its saved files and subdirectories instead of being listed
+        changed = False
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            entry = self._dirs.get(directory)
+            if entry is not None and entry['mtime'] == mtime:
+                self.unchanged += 1
+            else:
+                entry = self._list(directory, mtime)
+                self.listed += 1
+                changed = True
+            dirs[directory] = entry
+            stack.extend(reversed(entry['subdirs']))
+        return changed
+
+    def _list(self, directory, mtime):
+        files = {kind: {} for _, kind in _EXTENSIONS}
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for item in entries:
+                    if item.is_dir():
+                        # like os.walk, linked directories are not followed
+                        if not item.is_symlink():
+                            subdirs.append(item.path)
+                        continue
+                    low = item.name.lower()
+                    for extension, kind in _EXTENSIONS:
+                        if low.endswith(extension):
+                            files[kind][low.replace(extension, "")] = item.path
+        except OSError as e:
+            print(f"INDEX ERROR: {e}")
+        return {'mtime': mtime, 'files': files, 'subdirs': subdirs}
+
+    def _move_old_index(self):
+        if os.path.exists(self.path) or not os.path.exists(_OLD_PATH):
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok = True)
+            os.replace(_OLD_PATH, self.path)
+        except OSError as e:
+            print(f'[Index] old app index not moved: {e}')
+
+    def _load(self) -> bool:
+        try:
+            with open(self.path, 'r', encoding = 'utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return False
+        # launch counts are kept whatever the roots
+        self.launches.update({(kind, name): count for kind, name, count in saved.get('launches', [])})
+        # saved for other roots: scan these from scratch
+        if saved.get('roots') != self.roots:
+            return False
+        self._dirs = saved.get('dirs', {})
+        self._uwp = saved.get('uwp', {})
+        self.refreshed = saved.get('refreshed')
+        return True
+
+    def _save(self):
+        with self._lock:
+            saved = {'roots': self.roots, 'dirs': self._dirs, 'uwp': self._uwp, 'refreshed': self.refreshed,
+                     'launches': [[kind, name, count] for (kind, name), count in self.launches.items()]}
+        try:
+            with self._saving:
+                os.makedirs(os.path.dirname(self.path), exist_ok = True)
+                tmp = self.path + '.tmp'
+                with open(tmp, 'w', encoding = 'utf-8') as f:
+                    json.dump(saved, f)
+                os.replace(tmp, self.path)
+        except OSError as e:
+            print(f'[Index] app index not saved: {e}')
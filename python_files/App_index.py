@@ -0,0 +1,177 @@
+"""Fuzzy, ranked lookup of application names.
+
+``AppIndex`` holds the names from ``Executor``'s three app tables
+(shortcuts, exes, uwp). ``best("note pad")`` returns the closest one as a
+``Match``, or None when nothing is close enough.
+
+Names are compared without spaces or punctuation, so "note pad", "Notepad"
+and "notepad.exe" are the same name. A query is looked up in two steps. The
+first is an inverted index from character trigrams to the entries that
+contain them. One ``bincount`` over the posting lists of the query's
+trigrams gives every entry's shared-trigram count at once, and a Dice
+score on those counts picks the sixteen best candidates. The second step
+scores only those candidates on whole words. Query words found in the name count
+(prefixes and misspellings less), and so do name words the query covers, so
+"visual studio code" beats "visual studio installer". Each score is then
+raised by how often that app was launched (``record``). Ties go to
+shortcuts, then exes, then uwp apps, as in the exact lookup.
+"""
+import collections
+import functools
+import math
+import re
+import threading
+
+import numpy as np
+
+KINDS = ('shortcuts', 'exes', 'uwp')
+_WORD = re.compile(r'[a-z0-9]+')
+
+Match = collections.namedtuple('Match', 'name kind target score')
+
+
+def normalize(name) -> str:
+    return ' '.join(_WORD.findall(name.lower()))
+
+
+def trigrams(name) -> set:
+    padded = '^' + normalize(name).replace(' ', '') + '$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@functools.lru_cache(maxsize = 1 << 16)
+def _alike(a, b) -> float:
+    """Dice overlap of the trigrams of words ``a`` and ``b``, remembered per pair."""
+    if 2 * min(len(a), len(b)) < 0.3 * (len(a) + len(b)):
+        return 0.0
+    a, b = trigrams(a), trigrams(b)
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class AppIndex():
+    """Trigram index over app names with word-level ranking.
+
+    ``from_tables(tables)`` builds it from ``{kind: {name: target}}``.
+    ``search(query, limit, min_score)`` returns up to ``limit`` matches
+    scoring at least ``min_score``, highest first, and ``best(query)`` the
+    first one at the class's ``min_score``. ``record(kind, name)`` counts a
+    launch; ``launches`` can be handed to the next index so the counts
+    survive a rebuild (``Executor`` takes them from ``AppCache``, which
+    saves them)."""
+
+    # share of the score from trigrams; the rest is from words
+    trigram_weight = 0.6
+    # how much each doubling of the launch count adds, relatively
+    launch_boost = 0.1
+    min_score = 0.5
+    # trigram overlap at which two different words count as the same one misheard
+    word_alike = 0.4
+    # candidates the word-level step looks at
+    candidates = 16
+
+    def __init__(self, entries = (), launches = None):
+        self.launches = collections.Counter(launches or {})
+        self._names, self._kinds, self._targets, self._words, self._compact = [], [], [], [], []
+        self._exact = {}
+        postings = {}
+        sizes = []
+        for name, kind, target in entries:
+            i = len(self._names)
+            norm = normalize(name)
+            self._names.append(name)
+            self._kinds.append(kind)
+            self._targets.append(target)
+            self._words.append(norm.split())
+            self._compact.append(norm.replace(' ', ''))
+            self._exact.setdefault(self._compact[i], []).append(i)
+            grams = trigrams(name)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self._postings = {gram: np.asarray(ids, dtype = np.int32) for gram, ids in postings.items()}
+        self._sizes = np.asarray(sizes, dtype = np.float32)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_tables(cls, tables, launches = None):
+        return cls(((name, kind, target) for kind in KINDS for name, target in tables.get(kind, {}).items()), launches)
+
+    def __len__(self):
+        return len(self._names)
+
+    def record(self, kind, name):
+        with self._lock:
+            self.launches[(kind, name)] += 1
+
+    def best(self, query, min_score = None):
+        found = self.search(query, limit = 1, min_score = self.min_score if min_score is None else min_score)
+        return found[0] if found else None
+
+    def search(self, query, limit = 5, min_score = 0.0) -> list:
+        norm = normalize(query)
+        if not norm or not self._names:
+            return []
+        compact = norm.replace(' ', '')
+        exact = self._exact.get(compact)
+        if exact is not None:
+            ids, dice = exact, [1.0] * len(exact)
+        else:
+            ids, dice = self._candidates(trigrams(norm))
+        words = norm.split()
+        most = max(self.launches.values(), default = 0)
+        ceiling = 1 + self.launch_boost * math.log2(1 + most)
+        scored, floor = [], min_score
+        # best trigram score first: once even a perfect word score could not
+        # lift a candidate into the top ``limit``, neither can the rest
+        for d, i in sorted(zip(dice, ids), reverse = True):
+            if (self.trigram_weight * d + 1 - self.trigram_weight) * ceiling < floor:
+                break
+            score = self.trigram_weight * d + (1 - self.trigram_weight) * self._word_score(words, compact, i)
+            launches = self.launches.get((self._kinds[i], self._names[i]), 0)
+            if launches:
+                score *= 1 + self.launch_boost * math.log2(1 + launches)
+            if score < min_score:
+                continue
+            scored.append((-score, KINDS.index(self._kinds[i]) if self._kinds[i] in KINDS else len(KINDS), i))
+            if len(scored) >= limit:
+                floor = -sorted(scored)[limit - 1][0]
+        scored.sort()
+        return [Match(self._names[i], self._kinds[i], self._targets[i], -score) for score, _, i in scored[:limit]]
+
+    def _candidates(self, grams):
+        lists = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not lists:
+            return [], []
+        shared = np.bincount(np.concatenate(lists), minlength = len(self._names))
+        # an entry sharing under a quarter of the query's trigrams is not a
+        # candidate; this keeps the arrays past here short
+        ids = np.flatnonzero(shared >= max(1, len(grams) // 4))
+        dice = 2 * shared[ids] / (len(grams) + self._sizes[ids])
+        if len(ids) > self.candidates:
+            top = np.argpartition(dice, -self.candidates)[-self.candidates:]
+            ids, dice = ids[top], dice[top]
+        return ids.tolist(), dice.tolist()
+
+    def _word_score(self, words, compact, i):
+        if compact == self._compact[i]:
+            return 1.0
+        names = self._words[i]
+        found = 0.0
+        covered = set()
+        for word in words:
+            credit = 0.0
+            for j, name in enumerate(names):
+                if word == name:
+                    credit = 1.0
+                elif len(word) > 1 and (name.startswith(word) or word.startswith(name)):
+                    credit = max(credit, 0.7)
+                elif len(word) > 2 and _alike(word, name) >= self.word_alike:
+                    # a misheard word: partial credit if it is spelled much alike
+                    credit = max(credit, 0.7 * _alike(word, name))
+                else:
+                    continue
+                covered.add(j)
+                if credit == 1.0:
+                    break
+            found += credit
+        return 0.5 * found / len(words) + 0.5 * len(covered) / len(names) if names else 0.0
@@ -0,0 +1,178 @@
+"""asyncio front end for the assistant.
+
+    stt, tts, commands = AsyncSTT(STT(...)), AsyncTTS(TTS(...)), AsyncCommandHandler(Command_Handler(xec))
+    command = await stt.listen()
+    await tts.speak(await commands.handle_command(command))
+
+Waiting for a phrase or for speech to finish does not hold a thread: the
+capture session and the speech queue call back into the event loop. Work
+that blocks (opening and calibrating the microphone, recognition requests,
+``Executor`` actions) runs on one shared executor. Many ``AsyncAssistant``
+sessions can run on one loop. Each still has its capture thread, because
+audio sources are read with blocking calls.
+"""
+import asyncio
+import functools
+import time
+
+import speech_recognition as sr
+
+from Metrics import LatencyStats
+from Speech_queue import NORMAL, URGENT
+
+
+def _resolve(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+class AsyncSTT():
+    """``STT`` for an event loop. Needs a persistent session (the default)."""
+
+    def __init__(self, stt, executor = None):
+        if stt.session is None:
+            raise ValueError('AsyncSTT needs an STT with a persistent session')
+        self.stt = stt
+        self.session = stt.session
+        self.executor = executor
+        self._loop = None
+        self._wakeup = None
+
+    async def start(self):
+        if self._wakeup is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self.session.subscribe(self._notify)
+        # a closed session is not started again; ``capture`` then raises
+        if not self.session.running and not self.session.closed:
+            try:
+                await self._loop.run_in_executor(self.executor, self.session.start)
+            except RuntimeError:
+                # closed while it was starting
+                pass
+
+    async def capture(self, timeout = None):
+        # same contract as ``MicSession.listen``: ``timeout`` bounds the wait for
+        # a phrase to start and ``sr.WaitTimeoutError`` is raised when it passes
+        await self.start()
+        session = self.session
+        deadline = None if timeout is None else self._loop.time() + timeout
+        while True:
+            self._wakeup.clear()
+            audio = session.poll()
+            if audio is not None:
+                return audio
+            if session.error:
+                raise session.error
+            if not session.running:
+                raise sr.WaitTimeoutError('microphone session is not running')
+            remaining = None if deadline is None else deadline - self._loop.time()
+            if remaining is not None and remaining <= 0 and not session.speaking:
+                raise sr.WaitTimeoutError('listening timed out while waiting for phrase to start')
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), None if session.speaking else remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def recognize(self, audio):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.stt.recognize, audio)
+
+    async def listen(self, timeout = None):
+        try:
+            audio = await self.capture(self.stt.listen_timeout if timeout is None else timeout)
+        except sr.WaitTimeoutError:
+            return ''
+        except OSError as e:
+            if self.stt.tts:
+                self.stt.tts.speak(f'ERROR: {e}', priority = URGENT, key = 'error')
+            return ''
+        return await self.recognize(audio)
+
+    def close(self):
+        self.stt.close()
+
+    def _notify(self):
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+
+class AsyncTTS():
+    """``TTS`` for an event loop. ``await speak()`` returns once the message has
+    been said (True), or once it will not be: dropped, expired or cut (False)."""
+
+    def __init__(self, tts):
+        self.tts = tts
+
+    async def speak(self, text, priority = NORMAL, key = None, ttl = False) -> bool:
+        handle = self.tts.speak(text, priority = priority, key = key, ttl = ttl)
+        if handle is None:
+            return False
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        handle.add_done_callback(lambda completed: loop.call_soon_threadsafe(_resolve, future, completed))
+        return await future
+
+    def stop(self):
+        self.tts.stop()
+
+    def shutdown(self):
+        self.tts.shutdown()
+
+
+class AsyncCommandHandler():
+    """Routes on the loop (regular expressions only) and runs the ``Executor``
+    action, which may start processes or write files, on ``executor``."""
+
+    def __init__(self, handler, executor = None):
+        self.handler = handler
+        self.executor = executor
+
+    async def handle_command(self, command: str, dictated = False):
+        action, args = self.handler.route(command, dictated = dictated)
+        if action is None:
+            return args
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(action, *args))
+
+
+class AsyncAssistant():
+    """One listen / recognize / dispatch / speak session as a coroutine.
+
+    Replies are spoken in the background, so the next command is listened
+    for while the last one is still being answered. As with ``Pipeline``,
+    ``origin(audio)`` may return a ``perf_counter`` stamp; the time from it
+    to the reply being handed to TTS is recorded in ``response``."""
+
+    def __init__(self, stt, tts, commands, executor = None, origin = None):
+        self.stt = stt if isinstance(stt, AsyncSTT) else AsyncSTT(stt, executor)
+        self.tts = tts if isinstance(tts, AsyncTTS) else AsyncTTS(tts)
+        self.commands = commands if isinstance(commands, AsyncCommandHandler) else AsyncCommandHandler(commands, executor)
+        self.origin = origin or (lambda audio: getattr(audio, 'ended_at', None))
+        self.response = LatencyStats()
+        self._speaking = set()
+
+    async def run(self):
+        while True:
+            try:
+                audio = await self.stt.capture(self.stt.stt.listen_timeout)
+            except sr.WaitTimeoutError:
+                if not self.stt.session.running:
+                    break
+                continue
+            command = await self.stt.recognize(audio)
+            if not command:
+                continue
+            result = await self.commands.handle_command(command, dictated = getattr(audio, 'dictated', False))
+            if result == '__EXIT__':
+                await self.tts.speak('Goodbye!')
+                break
+            start = self.origin(audio)
+            if start is not None:
+                self.response.add(time.perf_counter() - start)
+            self._say(result)
+        if self._speaking:
+            await asyncio.gather(*self._speaking)
+        self.stt.close()
+
+    def _say(self, text):
+        task = asyncio.ensure_future(self.tts.speak(text))
+        self._speaking.add(task)
+        task.add_done_callback(self._speaking.discard)
@@ -0,0 +1,105 @@
+import audioop
+import threading
+
+import speech_recognition as sr
+
+
+class FrameRing():
+    """Preallocated byte ring for captured audio.
+
+    Chunks are copied in place into one ``bytearray``; positions are absolute
+    byte offsets since the ring was created, so a phrase is just a
+    ``(start, end)`` pair. ``view()`` returns a ``memoryview`` into the ring
+    (no copy) unless the range wraps around the end, which happens once per
+    ring length and costs one copy."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = bytearray(capacity)
+        self._view = memoryview(self._data)
+        self.total = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_audio(cls, seconds, sample_rate, sample_width, chunk = 1024):
+        chunk_bytes = chunk * sample_width
+        chunks = max(1, int(seconds * sample_rate * sample_width // chunk_bytes))
+        return cls(chunks * chunk_bytes)
+
+    def write(self, data) -> int:
+        """Copy ``data`` in; returns the absolute offset it was written at."""
+        n = len(data)
+        if n > self.capacity:
+            data, n = memoryview(data)[-self.capacity:], self.capacity
+        with self._lock:
+            start = self.total
+            at = start % self.capacity
+            first = min(n, self.capacity - at)
+            self._view[at:at + first] = data[:first]
+            if first < n:
+                self._view[:n - first] = data[first:]
+            self.total = start + n
+        return start
+
+    def holds(self, start) -> bool:
+        return start >= self.total - self.capacity
+
+    def view(self, start, end):
+        if not self.holds(start) or end > self.total or end < start:
+            raise ValueError(f'range {start}-{end} is no longer in the ring')
+        a, b = start % self.capacity, end % self.capacity
+        if end - start == 0:
+            return self._view[0:0]
+        if a < b or b == 0:
+            return self._view[a:b or self.capacity]
+        return b"".join((self._view[a:], self._view[:b]))
+
+
+class ViewAudioData(sr.AudioData):
+    """``AudioData`` over any bytes-like ``frame_data``, typically a ``FrameRing`` view.
+
+    Segments are views of the same buffer, raw data is returned as-is when no
+    conversion is asked for, and converted data is kept per ``(rate, width)``
+    so several consumers of one phrase (backends, FLAC, WAV) convert once."""
+
+    def __init__(self, frame_data, sample_rate, sample_width, ring = None, start = None):
+        super().__init__(frame_data, sample_rate, sample_width)
+        self.ring = ring
+        self.start = start
+        self._converted = {}
+
+    @property
+    def stale(self) -> bool:
+        # the capture ring has wrapped over this phrase
+        return self.ring is not None and not self.ring.holds(self.start)
+
+    def get_segment(self, start_ms = None, end_ms = None):
+        bytes_per_ms = self.sample_rate * self.sample_width / 1000.0
+        start = 0 if start_ms is None else int(start_ms * bytes_per_ms) // self.sample_width * self.sample_width
+        end = len(self.frame_data) if end_ms is None else int(end_ms * bytes_per_ms) // self.sample_width * self.sample_width
+        view = memoryview(self.frame_data)[start:max(start, end)]
+        return ViewAudioData(view, self.sample_rate, self.sample_width,
+                             ring = self.ring, start = None if self.start is None else self.start + start)
+
+    def get_raw_data(self, convert_rate = None, convert_width = None):
+        rate = None if convert_rate == self.sample_rate else convert_rate
+        width = None if convert_width == self.sample_width else convert_width
+        if rate is None and width is None:
+            return self.frame_data
+        key = (rate, width)
+        if key not in self._converted:
+            if self.sample_width == 1 or width in (1, 3):
+                data = super().get_raw_data(convert_rate, convert_width)
+            elif width is not None and width < self.sample_width:
+                # narrow first so the resampler walks fewer bytes
+                data = audioop.lin2lin(self.frame_data, self.sample_width, width)
+                if rate is not None:
+                    data, _ = audioop.ratecv(data, width, 1, self.sample_rate, rate, None)
+            else:
+                data = self.frame_data
+                if rate is not None:
+                    data, _ = audioop.ratecv(data, self.sample_width, 1, self.sample_rate, rate, None)
+                if width is not None:
+                    data = audioop.lin2lin(data, self.sample_width, width)
+            self._converted[key] = data
+        return self._converted[key]
@@ -0,0 +1,145 @@
+import collections
+import io
+import math
+import threading
+import time
+import wave
+
+import numpy as np
+
+from Metrics import LatencyStats
+
+
+class BargeIn():
+    """Lets the user talk over the assistant.
+
+    Capture keeps running while ``tts`` plays. During playback every chunk is
+    compared with the echo expected from what is being played: the RMS
+    envelope of the WAV on the player (the known output) times a coupling
+    gain learned from chunks that hold only echo. Speech sent straight to an
+    engine has no WAV, so the learned level of the playback is used instead.
+    Chunks under ``margin`` times the expected echo are not speech, so the
+    assistant does not hear itself. ``onset`` seconds of speech above it stop
+    the TTS, and the phrase goes on to be recognized. ``latency`` records user
+    onset to audio stopped."""
+
+    def __init__(self, tts, margin = 2.0, onset = 0.15, slack = 0.15, tail = 0.25, coupling = 1.0, damping = 0.3, envelope_ms = 20):
+        self.tts = tts
+        self.margin = margin
+        self.onset = onset
+        self.slack = slack
+        self.tail = tail
+        self.coupling = coupling
+        self.damping = damping
+        self.envelope_ms = envelope_ms
+        self.echo_level = None
+        self.latency = LatencyStats()
+        self.interruptions = 0
+        self.suppressed = 0
+        self._envelopes = collections.OrderedDict()
+        self._run = 0
+        self._fired = False
+        self._echo_until = 0.0
+        self.bind(16000, 1024)
+
+    def bind(self, sample_rate, chunk_size):
+        self.seconds_per_buffer = float(chunk_size) / sample_rate
+        self._onset_buffers = max(1, int(math.ceil(self.onset / self.seconds_per_buffer)))
+        self._decay = self.damping ** self.seconds_per_buffer
+        return self
+
+    def process(self, pcm, speech) -> bool:
+        """Whether a 16-bit chunk the VAD called ``speech`` is the user rather than playback."""
+        now = time.perf_counter()
+        if self.tts.speaking:
+            # the room keeps ringing for a moment after playback ends
+            self._echo_until = now + self.tail
+        elif now >= self._echo_until:
+            self._run, self._fired = 0, False
+            return speech
+        if self._fired:
+            return speech
+        samples = np.frombuffer(pcm, dtype='<i2').astype(np.float32)
+        level = float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+        reference = self._reference(now)
+        if reference is not None:
+            expected = self.coupling * reference
+        elif self.echo_level is not None:
+            expected = self.echo_level
+        else:
+            expected = float('inf')
+        user = bool(speech) and level > self.margin * expected
+        if not user:
+            self._learn(level, reference)
+            if speech:
+                self.suppressed += 1
+        self._run = self._run + 1 if user else 0
+        if self._run >= self._onset_buffers and self.tts.speaking:
+            self._fired = True
+            self._interrupt(now - self._run * self.seconds_per_buffer)
+        return user
+
+    def snapshot(self) -> dict:
+        return {
+            "interruptions": self.interruptions,
+            "suppressed_chunks": self.suppressed,
+            "coupling": round(self.coupling, 3),
+            "latency": self.latency.snapshot(),
+        }
+
+    def _learn(self, level, reference):
+        if reference is not None:
+            if reference > 1.0:
+                self.coupling = self.coupling * self._decay + (level / reference) * (1 - self._decay)
+        elif self.echo_level is None:
+            self.echo_level = level
+        else:
+            self.echo_level = self.echo_level * self._decay + level * (1 - self._decay)
+
+    def _reference(self, now):
+        playing = self.tts.playing()
+        if playing is None:
+            return None
+        wav, started = playing
+        envelope = self._envelope(wav)
+        if envelope is None:
+            return None
+        frame = self.envelope_ms / 1000.0
+        t = now - started
+        # output and input latency are unknown, so take the loudest part of the window
+        lo = max(0, int((t - self.seconds_per_buffer - self.slack) / frame))
+        hi = min(len(envelope), int((t + self.slack) / frame) + 1)
+        return float(envelope[lo:hi].max()) if hi > lo else 0.0
+
+    def _envelope(self, wav):
+        key = id(wav)
+        if key in self._envelopes and self._envelopes[key][0] is wav:
+            return self._envelopes[key][1]
+        if wav[:4] != b'RIFF':
+            # compressed audio from a network backend; fall back to the echo level
+            return None
+        with wave.open(io.BytesIO(wav), 'rb') as w:
+            channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+            data = w.readframes(w.getnframes())
+        if width == 2:
+            samples = np.frombuffer(data, dtype='<i2')[::channels].astype(np.float32)
+        else:
+            samples = np.zeros(0, dtype=np.float32)
+        step = max(1, int(rate * self.envelope_ms / 1000))
+        n = len(samples) // step
+        frames = samples[:n * step].reshape(n, step)
+        envelope = np.sqrt(np.mean(frames * frames, axis=1)) if n else np.zeros(1, dtype=np.float32)
+        self._envelopes[key] = (wav, envelope)
+        while len(self._envelopes) > 16:
+            self._envelopes.popitem(last = False)
+        return envelope
+
+    def _interrupt(self, onset_at):
+        self.interruptions += 1
+        print('[Barge-in] user spoke over the assistant, stopping speech')
+        self.tts.stop()
+        threading.Thread(target=self._measure, args=(onset_at,), daemon=True).start()
+
+    def _measure(self, onset_at):
+        if self.tts.wait_silent(timeout = 2):
+            self.latency.add(time.perf_counter() - onset_at)
@@ -1,51 +1,140 @@
 import re
 
+from Command_router import CommandRouter
+from Intent_classifier import argument
+from Metrics import LatencyStats
+
 class Command_Handler():
-    def __init__(self, xec = None): 
+    def __init__(self, xec = None, classifier = None, threshold = None): 
         
-        self._OPEN_SITE_PAT = re.compile(r"^(open|launch)\s+(?P<what>youtube|gmail|google|github|notion|spotify|[a-z0-9\.\-]+)$")
+        self._OPEN_SITE_PAT = re.compile(r"^(open|launch)\s+(?P<what>youtube|gmail|google|github|notion|spotify|[a-z0-9\-]+(\.[a-z0-9\-]+)+)$")
+        self._OPEN_APP_PAT  = re.compile(r"^(open|launch)\s+(?P<app>.+)$")
         self._SEARCH_PAT    = re.compile(r"^(google|search|find)\s+(for\s+)?(?P<q>.+)$")
         self._TIME_PAT      = re.compile(r"(what('s| is)?\s+)?(the\s+)?time(\s+now)?\??$", re.I)
         self._DATE_PAT      = re.compile(r"(what('s| is)?\s+)?(the\s+)?date(\s+today)?\??$", re.I)
         self._NOTE_PAT      = re.compile(r"(make|take|add|note)\s+(that\s*)?(?P<text>.+)", re.I)
-        self._FOLDER_PAT    = re.compile(r"^(open)\s+(?P<folder>downloads|documents|desktop)\s+(folder)?$", re.I)
+        # asks for a note without its text: the next phrase is dictated
+        self._DICTATE_PAT   = re.compile(r"((make|take|add|start|new)\s+)?(a\s+)?(new\s+)?note", re.I)
+        self._CANCEL_PAT    = re.compile(r"(cancel|never\s*mind|forget it)( that| it| the note)?", re.I)
+        self._FOLDER_PAT    = re.compile(r"^(open)\s+(?P<folder>downloads|documents|desktop|pictures|music|videos)\s+(folder)?$", re.I)
+        # "open my videos folder please" is an app to the router's open rule
+        self._FOLDER_WORD   = re.compile(r"\bfolders?\b", re.I)
+        # all patterns go into one router; on overlap the higher priority wins
+        self.router = CommandRouter()
+        # commands no pattern matches go to ``classifier`` (Intent_classifier.py)
+        # and are acted on when its confidence reaches ``threshold`` (by default
+        # the classifier's own). An "open ... folder" the app rule took goes
+        # to the folder rule instead when the classifier says open_folder
+        # with that confidence.
+        self.classifier = classifier
+        self.threshold = threshold
+        self.tiers = {'router': LatencyStats(), 'classifier': LatencyStats()}
+        self.fallbacks = 0
+        self.fallback_hits = 0
+        # called when a note is asked for, e.g. the endpointer's ``dictate``
+        self.on_dictation = None
         if not xec:
             return print(f'ERROR: NO EXECUTOR WAS PASSED')    
         self.xec = xec
 
+        self.register(r"exit|quit|stop", "__EXIT__", priority = 100, keywords = ('exit', 'quit', 'stop'))
+        self.register(self._FOLDER_PAT, xec.open_folder, priority = 90, keywords = ('open',))
+        # known sites and domains before apps, so "open youtube" opens the site
+        self.register(self._OPEN_SITE_PAT, xec.open_site, priority = 80, keywords = ('open', 'launch'))
+        self.register(self._OPEN_APP_PAT, xec.launch_windows_apps, priority = 70, keywords = ('open', 'launch'))
+        self.register(self._SEARCH_PAT, xec.google_search, priority = 60, keywords = ('google', 'search', 'find'))
+        self.register(self._TIME_PAT, xec.tell_time, priority = 50, keywords = ('what', 'the', 'time'))
+        self.register(self._DATE_PAT, xec.tell_date, priority = 50, keywords = ('what', 'the', 'date'))
+        self.register(self._DICTATE_PAT, self.start_note, priority = 45, keywords = ('make', 'take', 'add', 'start', 'new', 'a', 'note'))
+        self.register(self._NOTE_PAT, xec.make_note, priority = 40, keywords = ('make', 'take', 'add', 'note'))
+        self._INTENTS = {
+            'exit': "__EXIT__",
+            'open_app': xec.launch_windows_apps,
+            'open_website': xec.open_site,
+            'open_folder': xec.open_folder,
+            'search_web': xec.google_search,
+            'tell_time': xec.tell_time,
+            'tell_date': xec.tell_date,
+            'make_note': xec.make_note,
+        }
+
+    def register(self, pattern, action, priority = 0, keywords = ()):
+        # ``pattern`` must match the whole command. ``action`` is called with its
+        # named groups in order; a string is a plain reply. ``keywords`` are the
+        # words a matching command starts with (none: tried on every command).
+        return self.router.add(pattern, action, priority = priority, keywords = keywords)
+
+    def is_dictation(self, command: str) -> bool:
+        # a note was asked for and its text comes next, so the listener
+        # should not cut the next phrase short
+        return bool(self._DICTATE_PAT.fullmatch(command.strip()))
+
+    def start_note(self) -> str:
+        if self.on_dictation is not None:
+            self.on_dictation()
+        return "What should the note say?"
+
     def handle_command(self, command: str):
+        return self.execute(self.route(command))
+
+    def route(self, command: str, dictated = False):
+        # Returns (action, args). A plain reply is returned as (None, reply).
+        # A dictated phrase (the one after "take a note") is the note's text,
+        # not a command, unless it calls the note off.
         self.cmd = command.strip()
-        if self.cmd in ('exit', 'quit', 'stop'):
-            return "__EXIT__"
-        
-        self.m = self._FOLDER_PAT.match(self.cmd)
-        if self.m:
-            return self.xec.open_folder(self.m.group('folder'))
-        
-        if self.cmd.startswith('open '):
-            app_name = self.cmd[5:].strip()
-            return self.xec.launch_windows_apps(app_name)
-        
-        self.m = self._OPEN_SITE_PAT.match(self.cmd)
-        if self.m:
-            return self.xec.open_site(self.m.group('what'))
-        
-        self.m = self._SEARCH_PAT.match(self.cmd)
-        if self.m:
-            return self.xec.google_search(self.m.group('q'))
-        
-        self.m = self._TIME_PAT.match(self.cmd)
-        if self.m:
-            return self.xec.tell_time()
-        
-        self.m = self._DATE_PAT.match(self.cmd)
-        if self.m:
-            return self.xec.tell_date()
-        
-        self.m = self._NOTE_PAT.match(self.cmd)
-        if self.m:
-            return self.xec.make_note(self.m.group('text'))
-        
-        
-        return "I haven't been modelled for that action!"
-    
\ No newline at end of file
+        if dictated:
+            if self._CANCEL_PAT.fullmatch(self.cmd):
+                return (None, "Okay, no note.")
+            return (self.xec.make_note, (self.cmd,))
+        with self.tiers['router'].time():
+            found = self.router.dispatch(self.cmd)
+        if found is not None and found[0] == self.xec.launch_windows_apps and self._FOLDER_WORD.search(self.cmd):
+            found = self._classify(self.cmd, intents = ('open_folder',)) or found
+        if found is None:
+            found = self._classify(self.cmd)
+        if found is None:
+            return (None, "I haven't been modelled for that action!")
+        action, args = found
+        if isinstance(action, str):
+            return (None, action)
+        return (action, args)
+
+    def stats(self) -> dict:
+        return {
+            "router": self.tiers['router'].snapshot(),
+            "classifier": self.tiers['classifier'].snapshot(),
+            "fallbacks": self.fallbacks,
+            "fallback_hit_rate": round(self.fallback_hits / self.fallbacks, 3) if self.fallbacks else None,
+        }
+
+    def _classify(self, command, intents = None):
+        # ``intents``: the only ones acted on (None: any)
+        if self.classifier is None or not command:
+            return None
+        self.fallbacks += 1
+        with self.tiers['classifier'].time():
+            intent, confidence = self.classifier.predict(command)
+        action = self._INTENTS.get(intent)
+        threshold = self.threshold if self.threshold is not None else self.classifier.threshold
+        if action is None or confidence < threshold or (intents is not None and intent not in intents):
+            return None
+        if isinstance(action, str) or intent in ('tell_time', 'tell_date'):
+            args = ()
+        elif intent == 'make_note':
+            args = (argument(intent, command),)
+            if args[0] is None:
+                # asked for a note without saying it
+                action, args = self.start_note, ()
+        else:
+            args = (argument(intent, command),)
+            if args[0] is None:
+                return None
+        print(f'[Intent] {intent} ({confidence:.2f}) for {command!r}')
+        self.fallback_hits += 1
+        return (action, args)
+
+    def execute(self, route):
+        action, args = route
+        if action is None:
+            return args
+        return action(*args)
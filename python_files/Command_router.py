@@ -0,0 +1,114 @@
+import collections
+import re
+import threading
+
+_NAMED_GROUP = re.compile(r'\(\?P<([A-Za-z_][A-Za-z0-9_]*)>')
+_NAMED_REF = re.compile(r'\(\?P=([A-Za-z_][A-Za-z0-9_]*)\)')
+_NUMBERED_REF = re.compile(r'(?<!\\)\\[1-9]')
+_GLOBAL_FLAGS = re.compile(r'^\(\?[aiLmsux]+\)')
+_WORD = re.compile(r"[a-z0-9]+")
+_SCOPED_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'), (re.VERBOSE, 'x'))
+
+
+class _Route():
+    def __init__(self, index, pattern, target, priority, keywords):
+        compiled = re.compile(pattern) if isinstance(pattern, str) else pattern
+        if _NUMBERED_REF.search(compiled.pattern):
+            raise ValueError(f'numbered backreferences cannot be combined: {compiled.pattern!r}')
+        self.index = index
+        self.pattern = compiled
+        self.target = target
+        self.priority = priority
+        self.keywords = [tuple(_WORD.findall(k.lower())) for k in keywords]
+        # named groups in the order they appear, passed to the target
+        self.names = [name for name, _ in sorted(compiled.groupindex.items(), key = lambda item: item[1])]
+        self.group = f'_{index}'
+        # flags set as (?i) at the start apply to this route only once combined
+        body = _GLOBAL_FLAGS.sub('', compiled.pattern)
+        body = _NAMED_GROUP.sub(lambda m: f'(?P<{self.group}_{m.group(1)}>', body)
+        body = _NAMED_REF.sub(lambda m: f'(?P={self.group}_{m.group(1)})', body)
+        flags = ''.join(letter for flag, letter in _SCOPED_FLAGS if compiled.flags & flag)
+        self.source = f'(?P<{self.group}>(?{flags}:{body}))' if flags else f'(?P<{self.group}>{body})'
+
+
+class CommandRouter():
+    """Routes a transcript to the highest-priority pattern that matches all of it.
+
+    ``add(pattern, target, priority, keywords)`` registers a route.
+    ``keywords`` are the words (or phrases) a matching transcript must
+    start with; a route without them is tried on every transcript. The
+    keywords go into a word trie. The routes a transcript can reach
+    through the trie (plus the keyword-less ones) are compiled into one
+    alternation, highest priority first, ties in order of registration, and
+    matched once. So the cost of a dispatch depends on how many routes share
+    its first words, not on how many there are. ``dispatch`` returns
+    ``(target, args)`` with the route's named groups as ``args``, in
+    pattern order, or None. Recent transcripts are remembered in an LRU of
+    ``cache_size``."""
+
+    def __init__(self, cache_size = 256):
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._routes = []
+        self._trie = {}
+        self._anywhere = []
+        self._compiled = {}
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, pattern, target, priority = 0, keywords = ()):
+        with self._lock:
+            route = _Route(len(self._routes), pattern, target, priority, keywords)
+            self._routes.append(route)
+            if not route.keywords:
+                self._anywhere.append(route)
+            for phrase in route.keywords:
+                node = self._trie
+                for word in phrase:
+                    node = node.setdefault(word, {})
+                node.setdefault(None, []).append(route)
+            self._compiled.clear()
+            self._cache.clear()
+        return route.index
+
+    def __len__(self):
+        return len(self._routes)
+
+    def dispatch(self, text):
+        with self._lock:
+            if text in self._cache:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return self._cache[text]
+            self.misses += 1
+            regex, routes = self._candidates(text)
+        found = None
+        m = regex.fullmatch(text) if regex is not None else None
+        if m:
+            route = routes[m.lastgroup]
+            found = (route.target, tuple(m.group(f'{route.group}_{name}') for name in route.names))
+        with self._lock:
+            self._cache[text] = found
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last = False)
+        return found
+
+    def _candidates(self, text):
+        # the trie nodes along the transcript's first words pick the routes
+        words = _WORD.findall(text.lower())
+        node, path, reached = self._trie, [], []
+        for depth, word in enumerate(words):
+            node = node.get(word)
+            if node is None:
+                break
+            if None in node:
+                path.append(depth)
+                reached.extend(node[None])
+        key = tuple(words[:path[-1] + 1]) if path else ()
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            routes = sorted(set(reached) | set(self._anywhere), key = lambda r: (-r.priority, r.index))
+            regex = re.compile('|'.join(route.source for route in routes)) if routes else None
+            compiled = self._compiled[key] = (regex, {route.group: route for route in routes})
+        return compiled
@@ -0,0 +1,86 @@
+import math
+import time
+
+from Metrics import LatencyStats
+
+
+class AdaptiveEndpointer():
+    """Decides how much trailing silence ends a phrase, and how long a phrase may run.
+
+    The gaps between words inside a phrase are recorded as they are heard.
+    Short utterances (commands) end after the learned gap length plus a margin
+    instead of the fixed ``pause_threshold``. Longer ones keep the fixed value.
+    ``dictate()`` is called when a note is asked for ("take a note"): the
+    next phrase, if it starts within ``dictation_window`` seconds (or is
+    already under way), gets a longer pause and time limit and is the
+    note. ``MicSession`` reports phrases with ``start_phrase()`` and
+    ``end_phrase()``; the latter says whether the phrase was dictated and
+    closes the window, so only that one phrase is."""
+
+    def __init__(self, pause_threshold = 0.8, phrase_time_limit = 5, min_pause = 0.3, short_phrase = 2.0, margin = 1.3, guard = 0.1,
+                 min_samples = 8, dictation_pause = 1.2, dictation_limit = 30, dictation_window = 10, window = 256):
+        self.base_pause = pause_threshold
+        self.phrase_time_limit = phrase_time_limit
+        self.min_pause = min_pause
+        self.short_phrase = short_phrase
+        self.margin = margin
+        self.guard = guard
+        self.min_samples = min_samples
+        self.dictation_pause = dictation_pause
+        self.dictation_limit = dictation_limit
+        self.dictation_window = dictation_window
+        self.gaps = LatencyStats(window = window)
+        self._dictate_until = 0.0
+        self._in_phrase = False
+        # the phrase under way is a dictated one
+        self._latched = False
+
+    def observe_gap(self, seconds):
+        self.gaps.add(seconds)
+
+    @property
+    def dictating(self) -> bool:
+        return self._latched or time.monotonic() < self._dictate_until
+
+    def dictate(self, seconds = None):
+        seconds = self.dictation_window if seconds is None else seconds
+        self._dictate_until = time.monotonic() + seconds
+        # the note may already be under way when its request is recognized
+        self._latched = self._in_phrase and seconds > 0
+
+    def start_phrase(self):
+        self._in_phrase = True
+        self._latched = self._latched or time.monotonic() < self._dictate_until
+
+    def end_phrase(self, published = True) -> bool:
+        dictated = self._latched
+        self._in_phrase = self._latched = False
+        if dictated and published:
+            self._dictate_until = 0.0
+        return dictated and published
+
+    def learned_pause(self) -> float:
+        if self.gaps.count < self.min_samples:
+            return self.base_pause
+        return min(self.base_pause, max(self.min_pause, self.gaps.percentile(95) * self.margin + self.guard))
+
+    def pause_threshold(self, voiced_seconds) -> float:
+        if self.dictating:
+            return self.dictation_pause
+        if voiced_seconds > self.short_phrase:
+            return self.base_pause
+        return self.learned_pause()
+
+    def pause_buffers(self, voiced_seconds, seconds_per_buffer) -> int:
+        return int(math.ceil(self.pause_threshold(voiced_seconds) / seconds_per_buffer))
+
+    def time_limit(self):
+        return self.dictation_limit if self.dictating else self.phrase_time_limit
+
+    def snapshot(self) -> dict:
+        return {
+            "gaps": self.gaps.count,
+            "gap_p95_ms": round(self.gaps.percentile(95) * 1000, 2),
+            "short_pause_ms": round(self.learned_pause() * 1000, 2),
+            "dictating": self.dictating,
+        }
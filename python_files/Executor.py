@@ -1,14 +1,12 @@
 import webbrowser
 import subprocess
 import os
-import json
 from datetime import datetime
 from urllib.parse import quote_plus
-from pathlib import Path
 import platform
 
 class Executor():
-    def __init__(self):
+    def __init__(self, app_roots = None, app_refresh = 300):
         self._APP_INDEX = {
             "shortcuts": {},
             "exes": {},
@@ -17,57 +15,80 @@ class Executor():
         self._IS_WINDOWS = platform.system() == 'Windows'
         self._IS_MAC = platform.system() == 'Darwin'
         self._IS_LINUX = platform.system() == 'Linux'
+        # a Future for index_windows_apps() when it runs in the background
+        self.apps_ready = None
+        # App_index.AppIndex over the three tables once they are indexed
+        self.apps = None
+        # directories searched for apps (App_cache.windows_roots() if None),
+        # rescanned every app_refresh seconds
+        self.app_roots = app_roots
+        self.app_refresh = app_refresh
+        self.app_cache = None
 
     def index_windows_apps(self):
-        self.user = os.environ.get('USERNAME') or os.environ.get('USER')
-        self.search_paths = [
-            Path(f"C:/Users/{self.user}/OneDrive/Desktop"),
-            Path(f"C:/ProgramData/Microsoft/Windows/Start Menu/Programs"),
-            Path(f"C:/Users/{self.user}/AppData/Roaming/Microsoft/Windows/Start Menu/Programs")
-        ] 
+        # the saved index is used at once and rescanned behind it; only the
+        # first run (nothing saved yet) waits for a full scan
+        from App_cache import AppCache, start_apps
+        if self.app_cache is None:
+            self.app_cache = AppCache(roots = self.app_roots, launcher = start_apps if self._IS_WINDOWS else None,
+                                      interval = self.app_refresh)
+        first = not self.app_cache.loaded
+        if first:
+            self.app_cache.refresh()
+        self._use_app_tables(self.app_cache)
+        self.app_cache.start(on_change = self._use_app_tables, now = not first)
 
-        for path in self.search_paths:
-            if path and path.exists():
-                for root, _, files in os.walk(path):
-                    for file in files:
-                        low = file.lower()
-                        full = os.path.join(root, file)
-                        if low.endswith('.lnk'):
-                            self._APP_INDEX['shortcuts'][low.replace('.lnk', "")] = full
-                        elif low.endswith('.exe'):
-                            self._APP_INDEX['exes'][low.replace('.exe', "")] = full
-        
-        try:
-            self.cmd = ["powershell", "-NoProfile", "-Command", "Get-StartApps | ConvertTo-Json -Compress"]
-            self.completed_process = subprocess.run(self.cmd, capture_output = True, timeout = 8)
-            self.out = self.completed_process.stdout.decode('utf-8').strip()
-            if self.out:
-                data = json.loads(self.out)
-                if isinstance(data, dict):
-                    data = [data]
-                for app in data:
-                    name = str(app.get("Name", "")).lower()
-                    appid = app.get("AppID")
-                    if name and appid:
-                        self._APP_INDEX['uwp'][name] = appid
-        except Exception as e:
-            print(f"INDEX ERROR: {e}")
+    def _use_app_tables(self, cache):
+        self._APP_INDEX = cache.tables()
+        self.build_app_index()
+
+    def build_app_index(self):
+        # imported here: NumPy loads on the thread that indexes, not at start-up
+        from App_index import AppIndex
+        # launch counts come from the saved index, else from the index this replaces
+        if self.app_cache is not None:
+            launches = self.app_cache.launched()
+        else:
+            launches = self.apps.launches if self.apps is not None else None
+        self.apps = AppIndex.from_tables(self._APP_INDEX, launches = launches)
+        return self.apps
+
+    def find_app(self, app_name: str):
+        """``(kind, name, target)`` for an exact name, else the closest indexed one, else None."""
+        name = app_name.lower()
+        for kind in ('shortcuts', 'exes', 'uwp'):
+            if name in self._APP_INDEX[kind]:
+                return kind, name, self._APP_INDEX[kind][name]
+        if self.apps is not None:
+            match = self.apps.best(name)
+            if match is not None:
+                return match.kind, match.name, match.target
+        return None
 
     def launch_windows_apps(self, app_name: str)-> str:
         self.name = app_name.lower()
+        if self.apps_ready is not None and not self.apps_ready.done():
+            print('[Index] waiting for the app index . . .')
+            try:
+                self.apps_ready.result(timeout = 15)
+            except Exception as e:
+                print(f"INDEX ERROR: {e}")
+
+        found = self.find_app(self.name)
+        if found is not None:
+            kind, name, target = found
+            if self.apps is not None:
+                self.apps.record(kind, name)
+            if self.app_cache is not None:
+                self.app_cache.record(kind, name)
+            if kind == 'uwp':
+                subprocess.Popen(["explorer.exe", f"shell:appsFolder\\{target}"])
+            elif self._IS_WINDOWS:
+                os.startfile(target)
+            else:
+                subprocess.Popen(["open" if self._IS_MAC else "xdg-open", target])
+            return f"Opening {name}"
 
-        if self.name in self._APP_INDEX['shortcuts']:
-            os.startfile(self._APP_INDEX['shortcuts'][self.name])
-            return f"Opening {self.name}"
-        
-        if self.name in self._APP_INDEX['exes']:
-            os.startfile(self._APP_INDEX['exes'][self.name])
-            return f"Opening {self.name}"
-        
-        if self.name in self._APP_INDEX['uwp']:
-            subprocess.Popen(["explorer.exe", f"shell:appsFolder\\{self._APP_INDEX['uwp'][self.name]}"])
-            return f"Opening {self.name}"
-        
         return f"Application {self.name} not found"
     
     def open_site(self, alias_or_url:str)-> str:
@@ -111,10 +132,13 @@ class Executor():
             "downloads": os.path.join(os.path.expanduser('~'), "Downloads"),
             "documents": os.path.join(os.path.expanduser('~'), "Documents"),
             "desktop"  : os.path.join(os.path.expanduser('~'), "Desktop"),
+            "pictures" : os.path.join(os.path.expanduser('~'), "Pictures"),
+            "music"    : os.path.join(os.path.expanduser('~'), "Music"),
+            "videos"   : os.path.join(os.path.expanduser('~'), "Videos"),
         }
         self.target_folder = self.folder_map.get(name.lower())
         if not self.target_folder or not os.path.exists(self.target_folder):
-            return f"I couldn't find {self.target_folder} folder"
+            return f"I couldn't find the {name} folder"
         if self._IS_WINDOWS:
             subprocess.Popen(["explorer", self.target_folder])
         elif self._IS_MAC:
@@ -0,0 +1,376 @@
+import struct
+import threading
+import time
+
+import numpy as np
+
+from Audio_buffer import ViewAudioData
+from Metrics import LatencyStats
+
+# (block size, max fixed order, max LPC order, max rice partition order, exhaustive order search)
+LEVELS = {
+    0: (1152, 2, 0, 0, False),
+    1: (1152, 4, 0, 2, False),
+    2: (1152, 4, 0, 3, True),
+    3: (4096, 4, 0, 4, False),
+    4: (4096, 4, 0, 4, True),
+    5: (4096, 4, 8, 5, False),
+    6: (4096, 4, 8, 6, False),
+    7: (4096, 4, 12, 6, False),
+    8: (4096, 4, 12, 6, True),
+}
+
+_SAMPLE_RATE_CODES = {8000: 4, 16000: 5, 22050: 6, 24000: 7, 32000: 8, 44100: 9, 48000: 10, 88200: 1, 176400: 2, 192000: 3}
+_BLOCK_SIZE_CODES = {192: 1, 576: 2, 1152: 3, 2304: 4, 4608: 5, 256: 8, 512: 9, 1024: 10, 2048: 11, 4096: 12, 8192: 13}
+_SAMPLE_SIZE_CODES = {8: 1, 12: 2, 16: 4, 20: 5, 24: 6}
+_LPC_PRECISION = 12
+_MAX_RICE = 14
+_MAX_RICE2 = 30
+
+
+def _crc_table(poly, width):
+    top, mask, table = 1 << (width - 1), (1 << width) - 1, []
+    for byte in range(256):
+        crc = byte << (width - 8)
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) if crc & top else (crc << 1)
+        table.append(crc & mask)
+    return table
+
+
+_CRC8 = _crc_table(0x07, 8)
+
+
+def _crc8(data):
+    crc = 0
+    for b in data:
+        crc = _CRC8[crc ^ b]
+    return crc
+
+
+_CRC16_POWERS = np.zeros(0, dtype=np.uint16)
+
+
+def _crc16(data):
+    # FLAC's CRC-16 (poly 0x8005, no reflection, zero init) is linear over
+    # GF(2): every set bit contributes x^(16 + bits after it) mod P, so the
+    # whole frame is one XOR-reduction over a cached table of those powers.
+    global _CRC16_POWERS
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    n = len(bits)
+    if len(_CRC16_POWERS) < n:
+        size = max(n, 2 * len(_CRC16_POWERS), 1 << 16)
+        powers, value = [], 0x8005
+        for _ in range(size):
+            powers.append(value)
+            value = ((value << 1) ^ 0x8005) & 0xFFFF if value & 0x8000 else (value << 1) & 0xFFFF
+        _CRC16_POWERS = np.array(powers, dtype=np.uint16)
+    return int(np.bitwise_xor.reduce(_CRC16_POWERS[n - 1 - np.flatnonzero(bits)], initial=0))
+
+
+def _bits(value, n):
+    return ((int(value) >> np.arange(n - 1, -1, -1, dtype=np.int64)) & 1).astype(np.uint8)
+
+
+def _signed_bits(values, n):
+    values = np.asarray(values, dtype=np.int64) & ((1 << n) - 1)
+    return ((values[:, None] >> np.arange(n - 1, -1, -1, dtype=np.int64)) & 1).astype(np.uint8).ravel()
+
+
+def _utf8_number(n):
+    if n < 0x80:
+        return bytes([n])
+    out, limit, lead = [], 0x3F, 0x80
+    while n > limit:
+        out.insert(0, 0x80 | (n & 0x3F))
+        n >>= 6
+        lead = (lead >> 1) | 0x80
+        limit >>= 1
+    return bytes([lead | n] + out)
+
+
+class FlacEncoder():
+    """In-process FLAC encoder for 16-bit mono PCM (fixed and LPC predictors,
+    partitioned Rice residuals), replacing the ``flac --best`` subprocess that
+    ``AudioData.get_flac_data`` spawns per utterance.
+
+    ``level`` follows the ``flac -0`` .. ``-8`` scale. When an encode takes
+    longer than ``latency_budget`` seconds the working level steps down, and
+    it climbs back towards ``level`` while encodes stay well under budget."""
+
+    def __init__(self, level = 5, latency_budget = 0.05):
+        assert level in LEVELS, "FLAC level must be between 0 and 8"
+        self.level = level
+        self.current_level = level
+        self.latency_budget = latency_budget
+        self.encode_time = LatencyStats()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._fast_streak = 0
+        self._lock = threading.Lock()
+
+    def encode(self, pcm, sample_rate, sample_width = 2, level = None) -> bytes:
+        assert sample_width == 2, "only 16-bit PCM is encoded in-process"
+        start = time.perf_counter()
+        samples = np.frombuffer(pcm, dtype='<i2').astype(np.int64)
+        data = self._encode(samples, sample_rate, self.current_level if level is None else level)
+        elapsed = time.perf_counter() - start
+        if level is None:
+            self._adapt(elapsed)
+        self.encode_time.add(elapsed)
+        self.bytes_in += len(pcm)
+        self.bytes_out += len(data)
+        return data
+
+    def wrap(self, audio):
+        """Return ``audio`` as an ``AudioData`` whose ``get_flac_data`` uses this encoder."""
+        if isinstance(audio, FlacAudioData) and audio.encoder is self:
+            return audio
+        wrapped = FlacAudioData(audio.frame_data, audio.sample_rate, audio.sample_width, encoder = self,
+                                ring = getattr(audio, 'ring', None), start = getattr(audio, 'start', None))
+        if isinstance(audio, ViewAudioData):
+            wrapped._converted = audio._converted
+        wrapped.__dict__.update({k: v for k, v in audio.__dict__.items() if k not in wrapped.__dict__})
+        return wrapped
+
+    def stats(self) -> dict:
+        return {
+            "level": self.current_level,
+            "encode": self.encode_time.snapshot(),
+            "ratio": round(self.bytes_out / float(self.bytes_in), 3) if self.bytes_in else None,
+        }
+
+    def _adapt(self, elapsed):
+        with self._lock:
+            if self.latency_budget is None:
+                return
+            if elapsed > self.latency_budget and self.current_level > 0:
+                self.current_level -= 1
+                self._fast_streak = 0
+            elif elapsed < self.latency_budget / 4 and self.current_level < self.level:
+                self._fast_streak += 1
+                if self._fast_streak >= 8:
+                    self.current_level += 1
+                    self._fast_streak = 0
+            else:
+                self._fast_streak = 0
+
+    def _encode(self, samples, sample_rate, level):
+        block_size, max_fixed, max_lpc, max_partition, exhaustive = LEVELS[level]
+        total = len(samples)
+        frames = []
+        for number, offset in enumerate(range(0, total, block_size)):
+            frames.append(self._frame(samples[offset:offset + block_size], number, sample_rate, max_fixed, max_lpc, max_partition, exhaustive))
+        sizes = [len(f) for f in frames] or [0]
+        block = max(16, min(block_size, total)) if total else 16
+        info = struct.pack('>HH', block, block)
+        info += min(sizes).to_bytes(3, 'big') + max(sizes).to_bytes(3, 'big')
+        packed = (sample_rate << 44) | (0 << 41) | (15 << 36) | total
+        info += packed.to_bytes(8, 'big') + bytes(16)
+        header = b'fLaC' + bytes([0x80]) + len(info).to_bytes(3, 'big') + info
+        return header + b''.join(frames)
+
+    def _frame(self, x, number, sample_rate, max_fixed, max_lpc, max_partition, exhaustive):
+        n = len(x)
+        if n in _BLOCK_SIZE_CODES:
+            bs_code, bs_extra = _BLOCK_SIZE_CODES[n], b''
+        elif n <= 256:
+            bs_code, bs_extra = 6, bytes([n - 1])
+        else:
+            bs_code, bs_extra = 7, struct.pack('>H', n - 1)
+        if sample_rate in _SAMPLE_RATE_CODES:
+            sr_code, sr_extra = _SAMPLE_RATE_CODES[sample_rate], b''
+        elif sample_rate % 1000 == 0 and sample_rate // 1000 < 256:
+            sr_code, sr_extra = 12, bytes([sample_rate // 1000])
+        elif sample_rate < 65536:
+            sr_code, sr_extra = 13, struct.pack('>H', sample_rate)
+        else:
+            sr_code, sr_extra = 0, b''
+        header = bytes([0xFF, 0xF8, (bs_code << 4) | sr_code, (0 << 4) | (_SAMPLE_SIZE_CODES[16] << 1)])
+        header += _utf8_number(number) + bs_extra + sr_extra
+        header += bytes([_crc8(header)])
+
+        bits = self._subframe(x, 16, max_fixed, max_lpc, max_partition, exhaustive)
+        pad = (-len(bits)) % 8
+        if pad:
+            bits = np.concatenate([bits, np.zeros(pad, dtype=np.uint8)])
+        frame = header + np.packbits(bits).tobytes()
+        return frame + struct.pack('>H', _crc16(frame))
+
+    def _subframe(self, x, bps, max_fixed, max_lpc, max_partition, exhaustive):
+        n = len(x)
+        if n and np.all(x == x[0]):
+            return np.concatenate([_bits(0b00000000, 8), _signed_bits([x[0]], bps)])
+        best = None
+
+        orders = range(min(max_fixed, n - 1) + 1) if exhaustive else [self._guess_fixed_order(x, max_fixed)]
+        for order in orders:
+            residual = np.diff(x, n=order) if order else x
+            cost, coded = self._residual(residual, n, order, max_partition)
+            cost += 8 + order * bps
+            if best is None or cost < best[0]:
+                best = (cost, ('fixed', order, coded))
+
+        if max_lpc and n > max_lpc * 2:
+            for cost, candidate in self._lpc_candidates(x, bps, max_lpc, max_partition, exhaustive):
+                if cost < best[0]:
+                    best = (cost, candidate)
+
+        if best[0] >= 8 + n * bps:
+            return np.concatenate([_bits(0b00000010, 8), _signed_bits(x, bps)])
+
+        kind = best[1]
+        if kind[0] == 'fixed':
+            _, order, coded = kind
+            return np.concatenate([_bits(0b00010000 | (order << 1), 8), _signed_bits(x[:order], bps), coded()])
+        _, order, qcoef, shift, coded = kind
+        return np.concatenate([
+            _bits(0b01000000 | ((order - 1) << 1), 8), _signed_bits(x[:order], bps),
+            _bits(_LPC_PRECISION - 1, 4), _signed_bits([shift], 5), _signed_bits(qcoef, _LPC_PRECISION), coded(),
+        ])
+
+    def _guess_fixed_order(self, x, max_fixed):
+        # cheapest order by total absolute residual, as flac does for fixed predictors
+        best, best_order = None, 0
+        residual = x
+        for order in range(min(max_fixed, len(x) - 1) + 1):
+            if order:
+                residual = np.diff(residual)
+            total = np.abs(residual[max_fixed - order:]).sum()
+            if best is None or total < best:
+                best, best_order = total, order
+        return best_order
+
+    def _lpc_candidates(self, x, bps, max_lpc, max_partition, exhaustive):
+        n = len(x)
+        window = np.ones(n)
+        taper = max(1, n // 4)
+        ramp = 0.5 - 0.5 * np.cos(np.pi * np.arange(taper) / taper)
+        window[:taper], window[-taper:] = ramp, ramp[::-1]
+        w = x.astype(np.float64) * window
+        autoc = np.array([np.dot(w[:n - lag], w[lag:]) for lag in range(max_lpc + 1)])
+        if autoc[0] == 0:
+            return []
+        coefs, errors = self._levinson(autoc, max_lpc)
+        if exhaustive:
+            orders = range(1, max_lpc + 1)
+        else:
+            # estimated bits per sample from the prediction error of each order
+            est = [0.5 * np.log2(max(errors[k] / n, 1e-9)) * n + k * (_LPC_PRECISION + bps) for k in range(1, max_lpc + 1)]
+            orders = [int(np.argmin(est)) + 1]
+        out = []
+        for order in orders:
+            qcoef, shift = self._quantize(coefs[order])
+            if qcoef is None:
+                continue
+            predicted = np.convolve(x, qcoef)[order - 1:n - 1] >> shift
+            residual = x[order:] - predicted
+            if np.abs(residual).max(initial=0) >= 1 << 30:
+                continue
+            cost, coded = self._residual(residual, n, order, max_partition)
+            cost += 8 + order * bps + 4 + 5 + order * _LPC_PRECISION
+            out.append((cost, ('lpc', order, qcoef, shift, coded)))
+        return out
+
+    @staticmethod
+    def _levinson(autoc, max_order):
+        coefs, errors = {}, {0: autoc[0]}
+        a = np.zeros(0)
+        err = autoc[0]
+        for k in range(1, max_order + 1):
+            if err <= 0:
+                break
+            acc = autoc[k] - np.dot(a, autoc[k - 1:0:-1]) if k > 1 else autoc[1]
+            r = acc / err
+            a = np.concatenate([a - r * a[::-1], [r]])
+            err *= (1 - r * r)
+            coefs[k], errors[k] = a.copy(), err
+        for k in range(len(coefs) + 1, max_order + 1):
+            coefs[k], errors[k] = coefs[len(coefs)], errors[len(coefs)]
+        return coefs, errors
+
+    @staticmethod
+    def _quantize(coef):
+        cmax = np.abs(coef).max()
+        if not np.isfinite(cmax) or cmax <= 0:
+            return None, 0
+        _, exponent = np.frexp(cmax)
+        shift = min(15, max(0, _LPC_PRECISION - 1 - int(exponent)))
+        limit = (1 << (_LPC_PRECISION - 1)) - 1
+        qcoef = np.clip(np.round(coef * (1 << shift)), -limit - 1, limit).astype(np.int64)
+        return qcoef, shift
+
+    def _residual(self, residual, block_size, order, max_partition):
+        # Rice parameters are chosen from per-partition sums, as libFLAC does:
+        # sum(u >> k) is estimated by sum(u) >> k, and the sums of a coarser
+        # partition order are the pairwise sums of the finer one.
+        u = (residual << 1) ^ (residual >> 63)
+        p = max_partition
+        while p > 0 and (block_size % (1 << p) or (block_size >> p) <= order):
+            p -= 1
+        if (block_size >> p) <= order:
+            raise ValueError('block too short for the chosen predictor order')
+        sums = np.concatenate([np.zeros(order, dtype=np.int64), u]).reshape(1 << p, -1).sum(axis=1)
+        counts = np.full(1 << p, block_size >> p, dtype=np.int64)
+        counts[0] -= order
+        ks = np.arange(_MAX_RICE2 + 1, dtype=np.int64)
+        best = None
+        while True:
+            cost = counts[:, None] * (ks[None, :] + 1) + (sums[:, None] >> ks[None, :])
+            k_best = cost.argmin(axis=1)
+            param_bits = 5 if k_best.max() > _MAX_RICE else 4
+            total = int(cost[np.arange(len(k_best)), k_best].sum()) + 2 + 4 + len(k_best) * param_bits
+            if best is None or total < best[0]:
+                best = (total, p, k_best, param_bits)
+            if p == 0:
+                break
+            p -= 1
+            sums = sums.reshape(-1, 2).sum(axis=1)
+            counts = counts.reshape(-1, 2).sum(axis=1)
+        total, p, k_best, param_bits = best
+        return total, lambda: self._rice(u, block_size, order, p, k_best, param_bits)
+
+    @staticmethod
+    def _rice(u, block_size, order, p, k_best, param_bits):
+        # All partitions are laid out in one pass: each sample is q zeros, a
+        # stop bit and k remainder bits, with a parameter field in front of
+        # the first sample of every partition.
+        size = block_size >> p
+        counts = np.full(1 << p, size, dtype=np.int64)
+        counts[0] -= order
+        k = np.repeat(k_best.astype(np.int64), counts)
+        q = u >> k
+        lengths = q + 1 + k
+        first = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        lengths[first] += param_bits
+        ends = np.cumsum(lengths) + 6
+        starts = ends - lengths
+        out = np.zeros(int(ends[-1]) if len(ends) else 6 + param_bits * len(k_best), dtype=np.uint8)
+        out[:6] = np.concatenate([_bits(0 if param_bits == 4 else 1, 2), _bits(p, 4)])
+
+        field = np.arange(param_bits - 1, -1, -1, dtype=np.int64)
+        param_pos = starts[first][:, None] + np.arange(param_bits)[None, :]
+        out[param_pos.ravel()] = ((k_best.astype(np.int64)[:, None] >> field[None, :]) & 1).ravel()
+        starts[first] += param_bits
+
+        stop = starts + q
+        out[stop] = 1
+        for j in range(int(k.max()) if len(k) else 0):
+            sel = k > j
+            out[stop[sel] + 1 + j] = (u[sel] >> (k[sel] - 1 - j)) & 1
+        return out
+
+
+class FlacAudioData(ViewAudioData):
+    """``AudioData`` whose FLAC conversion runs through a shared ``FlacEncoder``."""
+
+    def __init__(self, frame_data, sample_rate, sample_width, encoder = None, ring = None, start = None):
+        super().__init__(frame_data, sample_rate, sample_width, ring = ring, start = start)
+        self.encoder = encoder or FlacEncoder()
+
+    def get_flac_data(self, convert_rate = None, convert_width = None):
+        width = self.sample_width if convert_width is None else convert_width
+        if width != 2:
+            return super().get_flac_data(convert_rate, convert_width)
+        raw = self.get_raw_data(convert_rate, 2)
+        return self.encoder.encode(raw, self.sample_rate if convert_rate is None else convert_rate)
@@ -0,0 +1,346 @@
+"""Intent classifiers for commands the regex router does not know.
+
+    python Intent_classifier.py train [dataset.csv] [model.joblib]
+    python Intent_classifier.py export [dataset.csv] [directory]
+    python Intent_classifier.py predict "could you fire up spotify"
+
+The model is the notebook's (Intent Classification/Notebooks): TF-IDF over
+unigrams and bigrams with English stop words removed, then
+``LogisticRegression``. ``train`` fits it on the whole dataset and saves the
+vectorizer and model with joblib. ``IntentClassifier`` loads them on first
+use, so scikit-learn is not imported at start-up. If the saved model is
+missing it says so and answers ``none``; training takes a second, too long
+to do inside a request.
+
+``export`` trains the same logistic regression on hashed word and character
+n-grams instead and writes its weights as ``weights.npy`` plus
+``meta.json``. ``HashedIntentClassifier`` scores that with NumPy alone.
+The export ships in Intent Classification/Models/intent_hashed; plain
+arrays and JSON do not depend on the scikit-learn version, unlike the
+joblib pickle, which is left to ``train``. ``load_classifier()`` picks
+the NumPy model when it is there.
+
+``out_of_domain.csv`` adds a ``none`` intent of chit-chat and requests the
+assistant cannot act on, so ordinary speech has somewhere to go besides
+the nearest command. ``held_out.csv`` (in-domain paraphrases and more
+out-of-domain phrases) is never trained on; bench_intents.py tunes
+``threshold`` and ``margin`` on it.
+"""
+import importlib.util
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+
+from Metrics import LatencyStats
+
+# found, not imported: scikit-learn takes most of a second to import
+_HAS_SKLEARN = importlib.util.find_spec('sklearn') is not None and importlib.util.find_spec('joblib') is not None
+
+_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Intent Classification')
+DATASET = os.path.join(_ROOT, 'Datasets', 'toy_set.csv')
+OUT_OF_DOMAIN = os.path.join(_ROOT, 'Datasets', 'out_of_domain.csv')
+HELD_OUT = os.path.join(_ROOT, 'Datasets', 'held_out.csv')
+MODEL = os.path.join(_ROOT, 'Models', 'intent_tfidf_lr.joblib')
+HASHED_MODEL = os.path.join(_ROOT, 'Models', 'intent_hashed')
+
+# words that carry the intent rather than its argument, stripped from the front
+_CARRIERS = {
+    'open_app': {'could', 'can', 'would', 'you', 'please', 'open', 'launch', 'start', 'run', 'fire', 'up', 'the', 'app',
+                 'application', 'program'},
+    'open_website': {'could', 'can', 'would', 'you', 'please', 'open', 'launch', 'go', 'to', 'visit', 'the', 'site',
+                     'website'},
+    'open_folder': {'could', 'can', 'would', 'you', 'please', 'open', 'go', 'to', 'show', 'me', 'my', 'the'},
+    'search_web': {'could', 'can', 'would', 'you', 'please', 'search', 'find', 'google', 'look', 'up', 'for', 'me',
+                   'the', 'web', 'online'},
+    'make_note': {'take', 'make', 'a', 'note', 'down', 'add', 'create', 'remember', 'to', 'about', 'for', 'reminder',
+                  'please', 'that'},
+}
+# the intent of anything the assistant should not act on
+NONE = 'none'
+_WORD = re.compile(r"[\w'.\-]+")
+_TOKEN = re.compile(r"\w+")
+
+
+def argument(intent, text):
+    """What the command is about: ``text`` without its leading intent words."""
+    carriers = _CARRIERS.get(intent)
+    if carriers is None:
+        return None
+    words = _WORD.findall(text.lower())
+    while words and words[0].strip('.:') in carriers:
+        words.pop(0)
+    if intent == 'open_folder' and 'folder' in words:
+        words = words[:words.index('folder')]
+    while words and words[-1] in ('please', 'folder', 'now'):
+        words.pop()
+    return ' '.join(words) or None
+
+
+def load_rows(*datasets) -> list:
+    """The ``intent,text`` rows of every dataset that exists, in order."""
+    import csv
+    found = []
+    for dataset in datasets:
+        if dataset and os.path.exists(dataset):
+            with open(dataset, newline = '', encoding = 'utf-8') as f:
+                found.extend(csv.DictReader(f))
+    return found
+
+
+def _decide(classes, probabilities, margin):
+    # (intent, confidence) per row; a winner that does not lead the
+    # runner-up by ``margin`` is too close to call, so it is ``none``
+    found = []
+    for row in probabilities:
+        first, second = row.argsort()[::-1][:2] if len(row) > 1 else (row.argmax(), None)
+        intent = str(classes[first])
+        if second is not None and row[first] - row[second] < margin:
+            intent = NONE
+        found.append((intent, float(row[first])))
+    return found
+
+
+def train(dataset = DATASET, path = MODEL, out_of_domain = OUT_OF_DOMAIN):
+    import joblib
+    import sklearn
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    samples = load_rows(dataset, out_of_domain)
+    texts, intents = [row['text'] for row in samples], [row['intent'] for row in samples]
+    vectorizer = TfidfVectorizer(lowercase = True, stop_words = 'english', ngram_range = (1, 2))
+    # balanced: the none rows outnumber every command's and would otherwise win most ties
+    model = LogisticRegression(max_iter = 1000, class_weight = 'balanced')
+    model.fit(vectorizer.fit_transform(texts), intents)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    joblib.dump({'vectorizer': vectorizer, 'model': model, 'sklearn': sklearn.__version__, 'samples': len(texts)}, path)
+    return vectorizer, model
+
+
+class IntentClassifier():
+    """Persisted TF-IDF + logistic regression, loaded on first use.
+
+    ``predict(text)`` returns ``(intent, confidence)`` and
+    ``predict_batch(texts)`` a list of them; confidence is the model's
+    probability for the intent; a lead over the runner-up under ``margin``
+    makes it ``none``. ``warm()`` loads the model ahead of time, e.g. from a
+    background start-up step. ``load`` records how long loading took and
+    ``latency`` each prediction call."""
+
+    # confidence and lead to act on, tuned with bench_intents.py --sweep
+    threshold = 0.4
+    margin = 0.1
+
+    def __init__(self, path = MODEL):
+        if not _HAS_SKLEARN:
+            raise ImportError('scikit-learn is not installed')
+        self.path = path
+        self.load = LatencyStats()
+        self.latency = LatencyStats()
+        self._vectorizer = None
+        self._model = None
+        self._missing = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def warm(self):
+        self._ensure()
+        return self
+
+    def predict(self, text):
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts) -> list:
+        texts = list(texts)
+        self._ensure()
+        if self._model is None:
+            return [(NONE, 0.0)] * len(texts)
+        with self.latency.time():
+            probabilities = self._model.predict_proba(self._vectorizer.transform(texts))
+        return _decide(self._model.classes_, probabilities, self.margin)
+
+    def _ensure(self):
+        if self._model is not None or self._missing:
+            return
+        with self._lock:
+            if self._model is not None or self._missing:
+                return
+            if not os.path.exists(self.path):
+                print(f'[Intent] no saved model at {self.path}; run "python Intent_classifier.py train". '
+                      f'Commands the router does not know are not classified.')
+                self._missing = True
+                return
+            with self.load.time():
+                import joblib
+                saved = joblib.load(self.path)
+            self._vectorizer = saved['vectorizer']
+            self._model = saved['model']
+
+
+def hashed_features(text, n_features = 1 << 14, char_ngrams = (3, 5)):
+    """``(indices, values)`` of the hashed word 1-2 grams and character n-grams of ``text``.
+
+    Character n-grams are taken inside space-padded words, so paraphrases and
+    misrecognized words still share features. Hashes are CRC32 (stable
+    across runs, unlike ``hash()``); one bit picks the sign so collisions
+    tend to cancel. Counts are L2 normalized."""
+    import numpy as np
+    words = _TOKEN.findall(text.lower())
+    grams = ['w ' + w for w in words] + ['w ' + a + ' ' + b for a, b in zip(words, words[1:])]
+    lo, hi = char_ngrams
+    for w in words:
+        padded = f' {w} '
+        for n in range(lo, hi + 1):
+            grams.extend('c ' + padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+    counts = {}
+    for gram in grams:
+        h = zlib.crc32(gram.encode('utf-8'))
+        index = h % n_features
+        counts[index] = counts.get(index, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+    indices = np.fromiter(counts.keys(), dtype = np.int64, count = len(counts))
+    values = np.fromiter(counts.values(), dtype = np.float32, count = len(counts))
+    norm = float(np.sqrt(np.dot(values, values)))
+    return indices, values / norm if norm else values
+
+
+def export(dataset = DATASET, directory = HASHED_MODEL, n_features = 1 << 14, char_ngrams = (3, 5), C = 10.0, threshold = 0.3,
+           margin = 0.1, out_of_domain = OUT_OF_DOMAIN):
+    # training still uses scikit-learn; scoring the export does not
+    import numpy as np
+    from sklearn.linear_model import LogisticRegression
+    samples = load_rows(dataset, out_of_domain)
+    X = np.zeros((len(samples), n_features), dtype = np.float32)
+    for i, row in enumerate(samples):
+        indices, values = hashed_features(row['text'], n_features, char_ngrams)
+        np.add.at(X[i], indices, values)
+    # weaker regularization than the notebook's C = 1: spread over many more
+    # features, the probabilities would otherwise all sit near 1 / intents
+    model = LogisticRegression(C = C, max_iter = 1000)
+    model.fit(X, [row['intent'] for row in samples])
+    os.makedirs(directory, exist_ok = True)
+    np.save(os.path.join(directory, 'weights.npy'), np.ascontiguousarray(model.coef_.T, dtype = np.float32))
+    with open(os.path.join(directory, 'meta.json'), 'w', encoding = 'utf-8') as f:
+        json.dump({'classes': [str(c) for c in model.classes_], 'intercept': model.intercept_.tolist(),
+                   'n_features': n_features, 'char_ngrams': list(char_ngrams), 'threshold': threshold, 'margin': margin,
+                   'samples': len(samples)}, f)
+    return model
+
+
+class HashedIntentClassifier():
+    """The exported hashed n-gram model, scored with NumPy.
+
+    Same interface as ``IntentClassifier``. On first use ``weights.npy``
+    (features x intents) is memory-mapped, so only the rows an utterance
+    touches are read. A batch is one sparse-dense product: each text's
+    feature values times the weight rows they hash to, summed per text, then
+    a softmax over the intents. The export's ``threshold`` and ``margin``
+    replace the defaults here once it is loaded."""
+
+    threshold = 0.3
+    # lead over the runner-up below which the answer is ``none``
+    margin = 0.1
+
+    def __init__(self, directory = HASHED_MODEL):
+        self.directory = directory
+        self.load = LatencyStats()
+        self.latency = LatencyStats()
+        self._weights = None
+        self._meta = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._weights is not None
+
+    def warm(self):
+        self._ensure()
+        return self
+
+    def predict(self, text):
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts) -> list:
+        import numpy as np
+        self._ensure()
+        meta = self._meta
+        with self.latency.time():
+            rows, indices, values = [], [], []
+            for row, text in enumerate(texts):
+                i, v = hashed_features(text, meta['n_features'], tuple(meta['char_ngrams']))
+                rows.append(np.full(len(i), row))
+                indices.append(i)
+                values.append(v)
+            scores = np.tile(self._intercept, (len(texts), 1))
+            if indices:
+                indices = np.concatenate(indices)
+                np.add.at(scores, np.concatenate(rows), np.concatenate(values)[:, None] * self._weights[indices])
+            scores = np.exp(scores - scores.max(axis = 1, keepdims = True))
+            probabilities = scores / scores.sum(axis = 1, keepdims = True)
+        return _decide(self._classes, probabilities, self.margin)
+
+    def _ensure(self):
+        if self._weights is not None:
+            return
+        with self._lock:
+            if self._weights is not None:
+                return
+            import numpy as np
+            with self.load.time():
+                with open(os.path.join(self.directory, 'meta.json'), 'r', encoding = 'utf-8') as f:
+                    meta = json.load(f)
+                self._classes = meta['classes']
+                self._intercept = np.asarray(meta['intercept'], dtype = np.float32)
+                self._meta = meta
+                self.threshold = meta.get('threshold', self.threshold)
+                self.margin = meta.get('margin', self.margin)
+                self._weights = np.load(os.path.join(self.directory, 'weights.npy'), mmap_mode = 'r')
+
+
+_warned = False
+
+
+def load_classifier():
+    """The NumPy model if it has been exported, else the scikit-learn one if
+    it has been trained, else None (with a warning, once)."""
+    global _warned
+    if os.path.exists(os.path.join(HASHED_MODEL, 'weights.npy')) and importlib.util.find_spec('numpy') is not None:
+        return HashedIntentClassifier()
+    if _HAS_SKLEARN and os.path.exists(MODEL):
+        return IntentClassifier()
+    if not _warned:
+        _warned = True
+        print(f'[Intent] no intent model in {HASHED_MODEL}; unknown commands will not be classified. '
+              'Run "python Intent_classifier.py export" (or "train") to build one')
+    return None
+
+
+def _main(argv):
+    if argv and argv[0] == 'train':
+        dataset = argv[1] if len(argv) > 1 else DATASET
+        path = argv[2] if len(argv) > 2 else MODEL
+        start = time.perf_counter()
+        _, model = train(dataset, path)
+        print(f'[Intent] {len(model.classes_)} intents, saved to {path} in {(time.perf_counter() - start) * 1000:.0f} ms')
+    elif argv and argv[0] == 'export':
+        dataset = argv[1] if len(argv) > 1 else DATASET
+        directory = argv[2] if len(argv) > 2 else HASHED_MODEL
+        model = export(dataset, directory)
+        size = os.path.getsize(os.path.join(directory, 'weights.npy'))
+        print(f'[Intent] {len(model.classes_)} intents, {size // 1024} KB of weights in {directory}')
+    elif argv and argv[0] == 'predict':
+        classifier = load_classifier()
+        for text in argv[1:]:
+            intent, confidence = classifier.predict(text)
+            print(f'{text!r}: {intent} ({confidence:.2f}), argument {argument(intent, text)!r}')
+    else:
+        print(__doc__)
+
+
+if __name__ == '__main__':
+    _main(sys.argv[1:])
@@ -0,0 +1,275 @@
+import audioop
+import collections
+import math
+import threading
+import time
+
+import speech_recognition as sr
+
+from Audio_buffer import FrameRing, ViewAudioData
+
+
+class MicSession():
+    """Long-lived capture session: the stream is opened and calibrated once,
+    then a worker thread segments phrases out of it for ``listen()`` to pick up.
+
+    ``start()`` after a capture error opens the stream again. ``stop()`` closes
+    the session for good, and so does the end of a finite source (a file, a
+    replay); ``start()`` on a closed session raises ``RuntimeError``. Start and
+    stop are serialised, so a ``stop()`` racing a ``start()`` on another
+    thread waits for it and then stops the thread it started."""
+
+    def __init__(self, recognizer = None, source = None, ambient_duration = 1, phrase_time_limit = None, max_pending = 4, vad = None, wake = None, wake_window = 6, endpointer = None, ring_seconds = 60, echo = None):
+        self.recognizer = recognizer or sr.Recognizer()
+        self.source = source
+        self.vad = vad
+        self.wake = wake
+        self.wake_window = wake_window
+        self.ambient_duration = ambient_duration
+        self.phrase_time_limit = phrase_time_limit
+        self.endpointer = endpointer
+        self.ring_seconds = ring_seconds
+        self.echo = echo
+        self.stop_event = threading.Event()
+        self.ready_event = threading.Event()
+        self.error = None
+
+        self._cond = threading.Condition()
+        self._pending = collections.deque(maxlen = max_pending)
+        self._speaking = False
+        self._listeners = []
+        self._worker_thread = None
+        # held by start() and stop()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def running(self):
+        return self._worker_thread is not None and self._worker_thread.is_alive()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def start(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('microphone session is closed')
+            if self.running:
+                return
+            self.stop_event.clear()
+            self.ready_event.clear()
+            self.error = None
+            if self.source is None:
+                self.source = sr.Microphone()
+            self._worker_thread = threading.Thread(target=self._loop, daemon=True)
+            self._worker_thread.start()
+            self.ready_event.wait()
+        if self.error:
+            raise self.error
+
+    def stop(self, timeout = 3):
+        with self._lock:
+            self._closed = True
+            self.stop_event.set()
+            thread = self._worker_thread
+        with self._cond:
+            self._cond.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout = timeout)
+
+    @property
+    def backlog(self) -> int:
+        return len(self._pending)
+
+    @property
+    def speaking(self) -> bool:
+        return self._speaking
+
+    def subscribe(self, callback):
+        # ``callback()`` runs on the capture thread whenever a phrase starts or
+        # is published and when capture ends, so a caller can wait without a thread
+        self._listeners.append(callback)
+
+    def poll(self):
+        """The next phrase if one is ready, else None; never blocks."""
+        with self._cond:
+            while self._pending:
+                audio = self._pending.popleft()
+                if audio.stale:
+                    print('[Mic] dropped a phrase the capture ring has already overwritten')
+                    continue
+                return audio
+        return None
+
+    def flush(self):
+        with self._cond:
+            self._pending.clear()
+
+    def listen(self, timeout = None):
+        # ``timeout`` bounds the wait for a phrase to *start*; a phrase already
+        # in progress is always waited for, just like ``Recognizer.listen``.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                audio = self.poll()
+                if audio is not None:
+                    return audio
+                if self.error:
+                    raise self.error
+                if self.stop_event.is_set() or not self.running:
+                    raise sr.WaitTimeoutError('microphone session is not running')
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0 and not self._speaking:
+                    raise sr.WaitTimeoutError('listening timed out while waiting for phrase to start')
+                self._cond.wait(None if self._speaking else remaining)
+
+    def _loop(self):
+        try:
+            with self.source as source:
+                if source.stream is None:
+                    raise OSError('Could not open the microphone stream')
+                calibrated = self._calibrate(source)
+                self.ready_event.set()
+                self._capture(source, calibrated)
+            if not self.stop_event.is_set():
+                # the source ran out: there is nothing to start again
+                self._closed = True
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ready_event.set()
+            with self._cond:
+                self._speaking = False
+                self._cond.notify_all()
+            self._notify()
+
+    def _calibrate(self, source):
+        if self.wake is not None:
+            self.wake.bind(source.SAMPLE_RATE)
+        if self.echo is not None:
+            self.echo.bind(source.SAMPLE_RATE, source.CHUNK)
+        if self.vad is None:
+            self.recognizer.adjust_for_ambient_noise(source, duration = self.ambient_duration)
+            seconds_per_buffer = float(source.CHUNK) / source.SAMPLE_RATE
+            return int(self.ambient_duration / seconds_per_buffer + 1e-9) * seconds_per_buffer
+        self.vad.bind(source.SAMPLE_RATE, source.CHUNK)
+        chunks = []
+        for _ in range(int(math.ceil(self.ambient_duration * source.SAMPLE_RATE / source.CHUNK))):
+            buffer = source.stream.read(source.CHUNK)
+            if len(buffer) == 0:
+                break
+            chunks.append(self._pcm16(buffer, source.SAMPLE_WIDTH))
+            if self.wake is not None:
+                self.wake.feed(chunks[-1])
+        self.vad.calibrate(b"".join(chunks))
+        return len(chunks) * float(source.CHUNK) / source.SAMPLE_RATE
+
+    def _pcm16(self, buffer, width):
+        return buffer if width == 2 else audioop.lin2lin(buffer, width, 2)
+
+    def _is_speech(self, buffer, pcm, source, in_phrase):
+        r = self.recognizer
+        if self.vad is not None:
+            return self.vad.process(pcm, adapt = not in_phrase)
+        energy = audioop.rms(buffer, source.SAMPLE_WIDTH)
+        speech = energy > r.energy_threshold
+        if r.dynamic_energy_threshold and not (speech and not in_phrase):
+            target_energy = energy * r.dynamic_energy_ratio
+            r.energy_threshold = r.energy_threshold * self._damping + target_energy * (1 - self._damping)
+        return speech
+
+    def _capture(self, source, position = 0.0):
+        r = self.recognizer
+        seconds_per_buffer = float(source.CHUNK) / source.SAMPLE_RATE
+        self._damping = r.dynamic_energy_adjustment_damping ** seconds_per_buffer
+        # chunks live in one preallocated ring; preroll and frames only hold offsets into it
+        ring = FrameRing.for_audio(max(self.ring_seconds, (self.phrase_time_limit or 0) * 2), source.SAMPLE_RATE, source.SAMPLE_WIDTH, source.CHUNK)
+        preroll = collections.deque(maxlen = max(1, int(math.ceil(r.non_speaking_duration / seconds_per_buffer))))
+        frames = None
+        armed_until = -1.0
+        ep = self.endpointer
+
+        while not self.stop_event.is_set():
+            buffer = source.stream.read(source.CHUNK)
+            if len(buffer) == 0:
+                break
+            position += float(len(buffer)) / (source.SAMPLE_WIDTH * source.SAMPLE_RATE)
+            offset = ring.write(buffer)
+            pcm = self._pcm16(buffer, source.SAMPLE_WIDTH) if (self.vad or self.wake or self.echo) else buffer
+            speech = self._is_speech(buffer, pcm, source, frames is not None)
+            if self.echo is not None:
+                # the assistant's own playback is not speech; the user talking over it is
+                speech = self.echo.process(pcm, speech)
+
+            woke = self.wake is not None and self.wake.feed(pcm)
+            if woke:
+                armed_until = position + self.wake_window
+                print('[Wake] wake word detected')
+
+            if frames is None:
+                preroll.append(offset)
+                if speech:
+                    frames = list(preroll)
+                    preroll.clear()
+                    pause_count, phrase_count = 0, 0
+                    pause_buffer_count = int(math.ceil(r.pause_threshold / seconds_per_buffer))
+                    phrase_buffer_count = int(math.ceil(r.phrase_threshold / seconds_per_buffer))
+                    non_speaking_buffer_count = int(math.ceil(r.non_speaking_duration / seconds_per_buffer))
+                    speech_start = position - seconds_per_buffer
+                    speech_end = position
+                    gated = self.wake is not None and speech_start > armed_until
+                    if ep is not None:
+                        ep.start_phrase()
+                    self._set_speaking(True)
+            else:
+                frames.append(offset)
+                phrase_count += 1
+                if speech:
+                    if ep is not None and pause_count and not ep.dictating:
+                        ep.observe_gap(pause_count * seconds_per_buffer)
+                    speech_end = position
+                pause_count = 0 if speech else pause_count + 1
+                if woke:
+                    # keep only what follows the wake word
+                    del frames[:-1]
+                    gated, phrase_count, speech_start = False, 0, position
+                time_limit = self.phrase_time_limit
+                if ep is not None:
+                    pause_buffer_count = ep.pause_buffers((phrase_count - pause_count) * seconds_per_buffer, seconds_per_buffer)
+                    time_limit = ep.time_limit()
+                timed_out = time_limit and phrase_count * seconds_per_buffer > time_limit
+                if pause_count > pause_buffer_count or timed_out:
+                    published = not gated and phrase_count - pause_count >= phrase_buffer_count
+                    dictated = ep.end_phrase(published) if ep is not None else False
+                    if published:
+                        keep = len(frames) - max(0, pause_count - non_speaking_buffer_count)
+                        end = frames[keep] if keep < len(frames) else ring.total
+                        audio = ViewAudioData(ring.view(frames[0], end), source.SAMPLE_RATE, source.SAMPLE_WIDTH, ring = ring, start = frames[0])
+                        # stream offsets (seconds) of the first and last voiced chunk, and of the endpoint
+                        audio.speech_start, audio.speech_end, audio.endpoint = speech_start, speech_end, position
+                        # wall-clock end of speech, for end-of-speech to response latency
+                        audio.ended_at = time.perf_counter() - (position - speech_end)
+                        audio.truncated = bool(timed_out)
+                        # the note asked for by the phrase before (see Endpointing.dictate)
+                        audio.dictated = dictated
+                        self._publish(audio)
+                        armed_until = -1.0
+                    frames = None
+                    self._set_speaking(False)
+
+    def _set_speaking(self, speaking):
+        with self._cond:
+            self._speaking = speaking
+            self._cond.notify_all()
+        self._notify()
+
+    def _publish(self, audio):
+        with self._cond:
+            self._pending.append(audio)
+            self._cond.notify_all()
+        self._notify()
+
+    def _notify(self):
+        for callback in self._listeners:
+            callback()
@@ -0,0 +1,171 @@
+import itertools
+import queue
+import threading
+import time
+
+from Metrics import LatencyStats
+
+_STOP = object()
+
+
+class Stage():
+    """One step of the pipeline. ``func`` receives the previous stage's output
+    and returns the value handed to the next stage, or ``None`` to drop it.
+    The first stage of a pipeline is the source and is called with no argument."""
+
+    def __init__(self, name, func, workers = 1, maxsize = 2):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.inbox = queue.Queue(maxsize = maxsize)
+        self.service = LatencyStats()
+        self.wait = LatencyStats()
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+
+        self._order_lock = threading.Lock()
+        self._done = {}
+        self._next_seq = 0
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.inbox.qsize(),
+            "capacity": self.inbox.maxsize,
+            "workers": self.workers,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "service": self.service.snapshot(),
+            "queue_wait": self.wait.snapshot(),
+        }
+
+
+class Pipeline():
+    """Runs stages on their own worker threads, joined by bounded queues.
+
+    A full inbox blocks the upstream stage (backpressure), so a slow stage
+    throttles capture instead of growing memory. Items keep their capture
+    order even when a stage has several workers.
+
+    ``origin(item)`` may return a ``perf_counter`` stamp for each source item;
+    the time from that stamp to the last stage picking the item up is recorded
+    in ``response``."""
+
+    def __init__(self, stages, origin = None):
+        self.stages = stages
+        self.origin = origin
+        self.response = LatencyStats()
+        self._origins = {}
+        self.stop_event = threading.Event()
+        self._seq = itertools.count()
+        self._threads = []
+
+    def start(self):
+        self.stop_event.clear()
+        for index, stage in enumerate(self.stages):
+            for n in range(1 if index == 0 else stage.workers):
+                t = threading.Thread(target=self._work, args=(index,), name=f'{stage.name}-{n}', daemon=True)
+                self._threads.append(t)
+                t.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for stage in self.stages[1:]:
+            self._drain(stage)
+            for _ in range(stage.workers):
+                try:
+                    stage.inbox.put(_STOP, timeout = 0.5)
+                except queue.Full:
+                    break
+
+    def wait(self, timeout = None):
+        return self.stop_event.wait(timeout)
+
+    def join(self, timeout = 3):
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0, deadline - time.monotonic()))
+        self._threads = []
+
+    def stats(self) -> dict:
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def bottleneck(self):
+        # the stage whose per-worker service time is highest limits throughput
+        busiest = max(self.stages[1:] or self.stages, key=lambda s: s.service.mean / s.workers)
+        return busiest.name
+
+    def report(self):
+        print(f"{'stage':<12}{'depth':>7}{'done':>7}{'drop':>7}{'err':>6}{'svc p50':>10}{'svc p95':>10}{'wait p95':>10}")
+        for stage in self.stages:
+            s = stage.stats()
+            print(f"{stage.name:<12}{s['depth']:>4}/{s['capacity']:<2}{s['processed']:>7}{s['dropped']:>7}{s['errors']:>6}"
+                  f"{s['service']['p50_ms']:>10}{s['service']['p95_ms']:>10}{s['queue_wait']['p95_ms']:>10}")
+        print(f'[Pipeline] bottleneck: {self.bottleneck()}')
+        if self.response.count:
+            r = self.response.snapshot()
+            print(f"[Pipeline] end of speech to response: p50 {r['p50_ms']} ms, p95 {r['p95_ms']} ms over {r['count']}")
+
+    def _work(self, index):
+        stage = self.stages[index]
+        while not self.stop_event.is_set():
+            if index == 0:
+                seq, payload = next(self._seq), None
+            else:
+                item = stage.inbox.get()
+                if item is _STOP:
+                    break
+                seq, payload, queued_at = item
+                stage.wait.add(time.perf_counter() - queued_at)
+
+            if index + 1 == len(self.stages):
+                origin = self._origins.pop(seq, None)
+                if origin is not None and payload is not None:
+                    self.response.add(time.perf_counter() - origin)
+
+            out = None
+            if index == 0 or payload is not None:
+                start = time.perf_counter()
+                try:
+                    out = stage.func() if index == 0 else stage.func(payload)
+                except Exception as e:
+                    stage.errors += 1
+                    print(f'[Pipeline] {stage.name} error: {e}')
+                stage.service.add(time.perf_counter() - start)
+                stage.processed += 1
+                if out is None and index + 1 < len(self.stages):
+                    stage.dropped += 1
+                elif index == 0 and self.origin is not None:
+                    origin = self.origin(out)
+                    if origin is not None:
+                        self._origins[seq] = origin
+            self._emit(index, seq, out)
+
+    def _emit(self, index, seq, out):
+        if index + 1 >= len(self.stages):
+            return
+        stage, nxt = self.stages[index], self.stages[index + 1]
+        # dropped items still travel downstream as ``None`` so every stage sees
+        # a gap-free sequence and can restore order after parallel workers
+        with stage._order_lock:
+            stage._done[seq] = out
+            while stage._next_seq in stage._done:
+                ready = stage._done.pop(stage._next_seq)
+                self._put(nxt, (stage._next_seq, ready, time.perf_counter()))
+                stage._next_seq += 1
+
+    def _put(self, stage, item):
+        while not self.stop_event.is_set():
+            try:
+                stage.inbox.put(item, timeout = 0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _drain(self, stage):
+        try:
+            while True:
+                stage.inbox.get_nowait()
+        except queue.Empty:
+            pass
@@ -0,0 +1,308 @@
+"""Replay recorded commands through the assistant without a microphone or Google.
+
+    python Replay_harness.py [manifest.txt] [--speed N] [--service-latency S] [--tts] [--flac-level N]
+
+The manifest has one ``path.wav<TAB>transcript`` line per command; without
+one a few synthetic commands are generated. The WAVs are played into ``STT``
+as one stream (``--speed 1`` is real time, ``--speed 0`` as fast as
+possible). Recognition goes to a local stand-in for Google's speech endpoint
+that answers with each clip's transcript. Spoken replies and ``Executor``
+side effects (browser, apps, notes, folders) are recorded instead of
+performed. Prints p50/p95/p99 per stage and end to end; with ``--tts`` the
+replies are spoken and the time from request to first audio is a row too.
+``--flac-level`` encodes with the in-process ``FlacEncoder`` instead of the
+``flac`` subprocess and adds its encode time.
+"""
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import speech_recognition as sr
+from speech_recognition.audio import get_flac_converter
+
+from Command_handler import Command_Handler
+from Executor import Executor
+from Metrics import LatencyStats
+from STT_backends import GoogleBackend
+from STT_class import STT
+from Synthetic_audio import CHUNK, SAMPLE_RATE, PcmSource, spoken
+from main_assist import build_pipeline
+
+SYNTHETIC = [
+    'what is the time',
+    'open youtube',
+    'search for python tutorials',
+    'take a note buy milk and eggs',
+    'what is the date',
+    'open downloads folder',
+]
+
+
+class ReplaySource(PcmSource):
+    """The clips as one 16-bit mono stream, with silence before and between them.
+
+    With ``speed = 0`` reads are not paced; ``hold()``, when given, is polled
+    and reading waits while it returns True, so capture cannot run away from
+    the rest of the pipeline."""
+
+    def __init__(self, clips, speed = 1.0, lead = 1.5, gap = 2.0, noise = 30, seed = 0):
+        rng = np.random.default_rng(seed)
+        parts, self.clips, offset = [], [], 0
+        for pcm, transcript in [(None, None)] + list(clips):
+            if pcm is not None:
+                parts.append(pcm)
+                self.clips.append((offset, offset + len(pcm), transcript))
+                offset += len(pcm)
+            silence = (rng.normal(0, noise, int((lead if pcm is None else gap) * SAMPLE_RATE))).astype('<i2').tobytes()
+            parts.append(silence)
+            offset += len(silence)
+        super().__init__(b"".join(parts))
+        self.speed = speed
+        self.finished = threading.Event()
+        self.hold = None
+        self._read_at = []
+
+    def __enter__(self):
+        super().__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def read(self, size):
+        data = super().read(size)
+        while not self.speed and self.hold is not None and self.hold():
+            time.sleep(0.005)
+        if self.speed:
+            due = self._started + self._offset / 2.0 / SAMPLE_RATE / self.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        self._read_at.append(time.perf_counter())
+        if not data:
+            self.finished.set()
+        return data
+
+    def wall_time(self, seconds):
+        """``perf_counter`` at which stream offset ``seconds`` was handed to the capture thread."""
+        index = min(len(self._read_at) - 1, int(seconds * SAMPLE_RATE / CHUNK))
+        return self._read_at[index] if index >= 0 else None
+
+    def transcript_at(self, offset):
+        for start, end, transcript in self.clips:
+            if start <= offset < end:
+                return transcript
+        return None
+
+
+class RecognitionStandIn():
+    """Local HTTP server speaking the Google v2 speech API that ``recognize_google`` uses.
+
+    Each request's FLAC is decoded and located in the replayed stream to find
+    which clip it came from. ``latency`` and ``jitter`` (seconds, seeded)
+    stand in for the network and the service."""
+
+    def __init__(self, source, latency = 0.0, jitter = 0.0, seed = 0):
+        self.source = source
+        self.latency = latency
+        self.jitter = jitter
+        self.service = LatencyStats()
+        self.requests = 0
+        self.unmatched = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._converter = get_flac_converter()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                start = time.perf_counter()
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                reply = stand_in.answer(body)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.end_headers()
+                self.wfile.write(reply.encode('utf-8'))
+                stand_in.service.add(time.perf_counter() - start)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.endpoint = f'http://127.0.0.1:{self.server.server_address[1]}/speech-api/v2/recognize'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def answer(self, flac):
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+        pcm = subprocess.run([self._converter, '-d', '-s', '-c', '--force-raw-format', '--endian=little', '--sign=signed', '-'],
+                             input=flac, capture_output=True).stdout
+        probe = pcm[len(pcm) // 2 & ~1:][:4096]
+        offset = self.source.pcm.find(probe) if probe else -1
+        transcript = self.source.transcript_at(offset) if offset >= 0 else None
+        time.sleep(delay)
+        if transcript is None:
+            self.unmatched += 1
+            return '{"result":[]}\n'
+        result = {"result": [{"alternative": [{"transcript": transcript, "confidence": 0.95}], "final": True}], "result_index": 0}
+        return '{"result":[]}\n' + json.dumps(result) + '\n'
+
+
+class RecordingTTS():
+    """TTS sink that keeps what would have been said."""
+
+    def __init__(self):
+        self.spoken = []
+
+    def speak(self, text, priority = None, key = None, ttl = False):
+        if text:
+            self.spoken.append((time.perf_counter(), str(text)))
+            print(f'[Assistant]: {text}')
+        return None
+
+    def shutdown(self):
+        pass
+
+
+class RecordingExecutor(Executor):
+    """``Executor`` whose side effects are recorded instead of performed."""
+
+    def __init__(self):
+        super().__init__()
+        self.actions = []
+
+    def launch_windows_apps(self, app_name: str) -> str:
+        self.actions.append(('launch', app_name))
+        return f"Opening {app_name.lower()}"
+
+    def open_site(self, alias_or_url: str) -> str:
+        self.actions.append(('open_site', alias_or_url))
+        return f"Opening {alias_or_url}"
+
+    def google_search(self, query: str) -> str:
+        self.actions.append(('search', query))
+        return f"Searching Google for {query}"
+
+    def make_note(self, note: str) -> str:
+        self.actions.append(('note', note))
+        return "Saved your note."
+
+    def open_folder(self, name: str) -> str:
+        self.actions.append(('open_folder', name))
+        return f"Opening {name} folder"
+
+
+def load_manifest(path):
+    clips = []
+    with open(path, encoding = 'utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            wav_path, transcript = line.rstrip('\n').split('\t', 1)
+            audio = sr.AudioData.from_file(wav_path)
+            clips.append((audio.get_raw_data(convert_rate = SAMPLE_RATE, convert_width = 2), transcript.strip()))
+    return clips
+
+
+def replay(clips, speed = 1.0, service_latency = 0.15, jitter = 0.05, real_tts = False, settle = 1.5, flac_level = None):
+    source = ReplaySource(clips, speed = speed)
+    stand_in = RecognitionStandIn(source, latency = service_latency, jitter = jitter).start()
+    xec = RecordingExecutor()
+    c_h = Command_Handler(xec = xec)
+    if real_tts:
+        from TTS_class import TTS
+        tts = TTS(rate = 0, volume = 100)
+    else:
+        tts = RecordingTTS()
+    stt = STT(tts = tts, source = source, backend = GoogleBackend(endpoint = stand_in.endpoint), dictation_hint = c_h.is_dictation,
+              flac_level = flac_level)
+
+    source.hold = lambda: stt.session.backlog >= 1
+    pipeline = build_pipeline(stt, c_h, tts)
+    pipeline.origin = lambda audio: source.wall_time(audio.speech_end)
+    endpointing = LatencyStats()
+    capture = pipeline.stages[0].func
+
+    def timed_capture():
+        if source.finished.is_set() and not stt.session.running and not stt.session.backlog:
+            time.sleep(0.05)
+            return None
+        audio = capture()
+        if audio is not None:
+            # trailing silence waited before the phrase was handed on, in stream seconds
+            endpointing.add(audio.endpoint - audio.speech_end)
+        return audio
+    pipeline.stages[0].func = timed_capture
+
+    calibration = LatencyStats()
+    with calibration.time():
+        stt.session.start()
+    pipeline.start()
+    last = None
+    while not pipeline.wait(0.1):
+        activity = sum(stage.processed for stage in pipeline.stages[1:])
+        if source.finished.is_set() and not stt.session.running:
+            if activity == last and all(stage.inbox.empty() for stage in pipeline.stages[1:]):
+                pipeline.wait(settle)
+                pipeline.stop()
+                break
+            last = activity
+    stt.close()
+    pipeline.join()
+    stand_in.stop()
+    tts.shutdown()
+
+    stages = pipeline.stats()
+    rows = [
+        ('calibration', calibration.snapshot()),
+        ('capture', endpointing.snapshot()),
+        ('flac encode', stt.flac.encode_time.snapshot() if stt.flac else None),
+        ('http', stand_in.service.snapshot()),
+        ('recognize', stages['recognize']['service']),
+        ('route', stages['route']['service']),
+        ('dispatch', stages['execute']['service']),
+        # request to first audio; the speak stage itself only queues the text
+        ('first audio', tts.first_audio.snapshot() if real_tts else None),
+        ('end to end', pipeline.response.snapshot()),
+    ]
+    print(f"\n{'stage':<14}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, s in rows:
+        if s:
+            print(f"{name:<14}{s['count']:>7}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+    print(f'[Replay] {stand_in.requests} recognition requests, {stand_in.unmatched} unmatched, {len(xec.actions)} actions: {xec.actions}')
+    return pipeline, stand_in, xec, tts
+
+
+def _main(argv):
+    speed, latency, real_tts, flac_level, paths = 1.0, 0.15, False, None, []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--speed':
+            speed = float(next(args))
+        elif arg == '--service-latency':
+            latency = float(next(args))
+        elif arg == '--tts':
+            real_tts = True
+        elif arg == '--flac-level':
+            flac_level = int(next(args))
+        else:
+            paths.append(arg)
+    clips = load_manifest(paths[0]) if paths else [(spoken(t, i), t) for i, t in enumerate(SYNTHETIC)]
+    replay(clips, speed = speed, service_latency = latency, real_tts = real_tts, flac_level = flac_level)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
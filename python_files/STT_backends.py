@@ -0,0 +1,328 @@
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import speech_recognition as sr
+
+from Metrics import LatencyStats
+
+# A backend turns an ``AudioData`` into ``(text, confidence)`` and raises
+# ``sr.UnknownValueError`` / ``sr.RequestError`` like the recognizer methods do.
+# ``min_confidence`` is the score a hedged race accepts from it right away;
+# ``None`` means its score is not calibrated and it only wins at the deadline.
+
+
+class GoogleBackend():
+    name = 'google'
+    min_confidence = 0.5
+
+    def __init__(self, recognizer = None, key = None, language = 'en-US', endpoint = None):
+        self.recognizer = recognizer or sr.Recognizer()
+        self.key = key
+        self.language = language
+        self.endpoint = endpoint
+
+    def recognize(self, audio):
+        kwargs = {'endpoint': self.endpoint} if self.endpoint else {}
+        return self.recognizer.recognize_google(audio, key = self.key, language = self.language, with_confidence = True, **kwargs)
+
+
+class SphinxBackend():
+    """Offline recognition with a pool of warm pocketsphinx decoders.
+
+    ``recognize_sphinx`` builds a new ``Config`` and ``Decoder`` per call, which
+    reloads the acoustic model, language model and dictionary every time. Here
+    each decoder is built once and handed back to the pool after every phrase;
+    ``warm()`` builds them ahead of the first utterance."""
+
+    name = 'sphinx'
+    min_confidence = None
+
+    def __init__(self, language = 'en-US', pool_size = 2, keyword_entries = None, warm = True):
+        self.language = language
+        self.pool_size = pool_size
+        self.keyword_entries = keyword_entries
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        try:
+            from pocketsphinx import pocketsphinx
+        except ImportError:
+            raise sr.RequestError("missing PocketSphinx module: ensure that PocketSphinx is set up correctly.")
+        self._ps = pocketsphinx
+        self._paths = self._model_paths(language)
+        if warm:
+            threading.Thread(target=self.warm, daemon=True).start()
+
+    def warm(self):
+        while True:
+            with self._lock:
+                if self._created >= self.pool_size:
+                    return
+                self._created += 1
+            try:
+                self._pool.put(self._new_decoder())
+            except Exception as e:
+                with self._lock:
+                    self._created -= 1
+                print(f'[Sphinx] decoder warm-up failed: {e}')
+                return
+
+    def recognize(self, audio):
+        decoder = self._acquire()
+        try:
+            raw = audio.get_raw_data(convert_rate = 16000, convert_width = 2)
+            decoder.start_utt()
+            decoder.process_raw(raw, False, True)
+            decoder.end_utt()
+            hypothesis = decoder.hyp()
+            if hypothesis is None or not hypothesis.hypstr:
+                raise sr.UnknownValueError()
+            try:
+                confidence = decoder.get_logmath().exp(hypothesis.prob)
+            except Exception:
+                confidence = 0.5
+            return hypothesis.hypstr, confidence
+        finally:
+            self._pool.put(decoder)
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            grow = self._created < self.pool_size
+            if grow:
+                self._created += 1
+        if grow:
+            try:
+                return self._new_decoder()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._pool.get()
+
+    def _model_paths(self, language):
+        if not isinstance(language, str):
+            return tuple(language)
+        data = os.path.join(os.path.dirname(os.path.abspath(sr.__file__)), "pocketsphinx-data", language)
+        paths = (os.path.join(data, "acoustic-model"), os.path.join(data, "language-model.lm.bin"), os.path.join(data, "pronounciation-dictionary.dict"))
+        if all(os.path.exists(p) for p in paths):
+            return paths
+        if language == 'en-US':
+            # pocketsphinx >= 5 ships its own US English model as the default config
+            return None
+        raise sr.RequestError(f'missing PocketSphinx language data directory: "{data}"')
+
+    def _new_decoder(self):
+        config = self._ps.Config()
+        if self._paths:
+            hmm, lm, dictionary = self._paths
+            config.set_string("-hmm", hmm)
+            config.set_string("-lm", lm)
+            config.set_string("-dict", dictionary)
+        config.set_string("-logfn", os.devnull)
+        decoder = self._ps.Decoder(config)
+        if self.keyword_entries:
+            with sr.PortableNamedTemporaryFile("w") as f:
+                f.writelines("{} /1e{}/\n".format(keyword, 100 * sensitivity - 110) for keyword, sensitivity in self.keyword_entries)
+                f.flush()
+                decoder.add_kws("keywords", f.name)
+            decoder.activate_search("keywords")
+        return decoder
+
+
+class WhisperBackend():
+    """Local Whisper through faster-whisper, with the model loaded once.
+
+    ``recognize_faster_whisper`` builds a ``WhisperModel`` per call and goes
+    through a WAV file and soundfile; here the model is kept and fed the
+    16 kHz samples directly."""
+
+    name = 'whisper'
+    min_confidence = 0.6
+
+    def __init__(self, model = 'base.en', language = 'en', device = 'cpu', compute_type = 'int8', beam_size = 1, warm = True):
+        try:
+            import numpy as np
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise sr.RequestError("missing faster_whisper module: ensure that faster-whisper is set up correctly.")
+        self._np = np
+        self._model_class = WhisperModel
+        self.model_name = model
+        self.language = language
+        self.device = device
+        self.compute_type = compute_type
+        self.beam_size = beam_size
+        self._model = None
+        self._lock = threading.Lock()
+        if warm:
+            threading.Thread(target=self._load, daemon=True).start()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                self._model = self._model_class(self.model_name, device = self.device, compute_type = self.compute_type)
+            return self._model
+
+    def recognize(self, audio):
+        model = self._model or self._load()
+        samples = self._np.frombuffer(audio.get_raw_data(convert_rate = 16000, convert_width = 2), dtype='<i2').astype(self._np.float32) / 32768.0
+        segments, _ = model.transcribe(samples, language = self.language, beam_size = self.beam_size)
+        segments = [s for s in segments if s.no_speech_prob < 0.6]
+        text = " ".join(s.text.strip() for s in segments).strip()
+        if not text:
+            raise sr.UnknownValueError()
+        return text, math.exp(sum(s.avg_logprob for s in segments) / len(segments))
+
+
+class BackendHealth():
+    """Online latency and success estimate for one backend."""
+
+    def __init__(self, alpha = 0.2, prior_latency = 1.0):
+        self.alpha = alpha
+        self.latency = prior_latency
+        self.success = 1.0
+        self.stats = LatencyStats(window = 256)
+        self.failures = 0
+
+    def record(self, seconds, ok):
+        self.stats.add(seconds)
+        self.latency += self.alpha * (seconds - self.latency)
+        self.success += self.alpha * ((1.0 if ok else 0.0) - self.success)
+        if not ok:
+            self.failures += 1
+
+    @property
+    def score(self) -> float:
+        # expected seconds until a usable answer; lower is better
+        return self.latency / max(self.success, 0.05)
+
+    def snapshot(self) -> dict:
+        return {"latency_ms": round(self.latency * 1000, 1), "success": round(self.success, 3),
+                "failures": self.failures, "samples": self.stats.snapshot()}
+
+
+class HedgedBackend():
+    """Races several backends on the same ``AudioData`` under a deadline.
+
+    The ``fanout`` backends with the best health score start at once (those
+    whose confidence is uncalibrated rank last); the rest
+    join when the leader has not answered within its usual (p90) latency. The
+    first answer at or above its backend's ``min_confidence`` wins. At the
+    deadline the most confident answer so far is returned. Late calls are not
+    waited for, but their outcome still updates the backend's health; a call
+    still running at the deadline counts as a failure that took the deadline."""
+
+    name = 'hedged'
+
+    def __init__(self, backends, deadline = 3.0, fanout = 2):
+        self.backends = list(backends)
+        self.deadline = deadline
+        self.fanout = fanout
+        self.health = {id(b): BackendHealth() for b in self.backends}
+        self.wins = {b.name: 0 for b in self.backends}
+        self._executor = ThreadPoolExecutor(max_workers = 2 * len(self.backends), thread_name_prefix = 'hedge')
+
+    def ranked(self):
+        # backends that can win outright lead; uncalibrated ones are fallbacks
+        return sorted(self.backends, key=lambda b: (b.min_confidence is None, self.health[id(b)].score))
+
+    def recognize(self, audio):
+        start = time.perf_counter()
+        deadline = start + self.deadline
+        order = self.ranked()
+        leader = self.health[id(order[0])]
+        hedge_at = start + min(self.deadline, max(0.05, leader.stats.percentile(90) if leader.stats.count >= 5 else leader.latency))
+        running = {}
+        for backend in order[:self.fanout]:
+            running[self._launch(backend, audio)] = backend
+        waiting = order[self.fanout:]
+
+        best, errors = None, []
+        while running:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            until = deadline if not waiting else min(deadline, hedge_at)
+            done, _ = wait(list(running), timeout = max(0, until - now), return_when = FIRST_COMPLETED)
+            if not done and waiting and time.perf_counter() >= hedge_at:
+                for backend in waiting:
+                    running[self._launch(backend, audio)] = backend
+                waiting = []
+                continue
+            for future in done:
+                backend = running.pop(future)
+                try:
+                    text, confidence = future.result()
+                except (sr.UnknownValueError, sr.RequestError) as e:
+                    errors.append(e)
+                    continue
+                except Exception as e:
+                    errors.append(sr.RequestError(f'{backend.name}: {e}'))
+                    continue
+                floor = backend.min_confidence
+                if floor is not None and confidence >= floor:
+                    self.wins[backend.name] += 1
+                    return text, confidence
+                # calibrated scores first, then the higher one
+                if best is None or (floor is not None, confidence) > (best[2].min_confidence is not None, best[1]):
+                    best = (text, confidence, backend)
+            if not running and waiting:
+                for backend in waiting:
+                    running[self._launch(backend, audio)] = backend
+                waiting = []
+
+        for future, backend in running.items():
+            future.missed = True
+            self.health[id(backend)].record(self.deadline, False)
+        if best is not None:
+            self.wins[best[2].name] += 1
+            return best[0], best[1]
+        if any(isinstance(e, sr.UnknownValueError) for e in errors):
+            raise sr.UnknownValueError()
+        raise sr.RequestError(f'no backend answered within {self.deadline} s' if not errors else str(errors[-1]))
+
+    def _launch(self, backend, audio):
+        start = time.perf_counter()
+        future = self._executor.submit(backend.recognize, audio)
+        future.missed = False
+        health = self.health[id(backend)]
+
+        def record(f):
+            if f.missed:
+                return
+            # "no speech" is still a working backend; only errors count against it
+            ok = not f.cancelled() and (f.exception() is None or isinstance(f.exception(), sr.UnknownValueError))
+            health.record(time.perf_counter() - start, ok)
+        future.add_done_callback(record)
+        return future
+
+    def stats(self) -> dict:
+        return {b.name: dict(self.health[id(b)].snapshot(), wins=self.wins[b.name]) for b in self.backends}
+
+
+BACKENDS = {
+    'google': GoogleBackend,
+    'sphinx': SphinxBackend,
+    'whisper': WhisperBackend,
+}
+
+
+def make_backend(kind, recognizer = None, **kwargs):
+    if isinstance(kind, (list, tuple)):
+        # several backends: race them
+        return HedgedBackend([make_backend(k, recognizer) for k in kind], **kwargs)
+    if not isinstance(kind, str):
+        return kind
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown STT backend '{kind}', expected one of {sorted(BACKENDS)}")
+    if kind == 'google':
+        return GoogleBackend(recognizer, **kwargs)
+    return BACKENDS[kind](**kwargs)
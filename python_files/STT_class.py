@@ -1,32 +1,110 @@
 import speech_recognition as sr
+from Mic_session import MicSession
+from STT_backends import make_backend
+from Endpointing import AdaptiveEndpointer
+from Speech_queue import URGENT
+
+try:
+    from Flac_encoder import FlacEncoder
+    _HAS_FLAC_ENCODER = True
+except ImportError:
+    _HAS_FLAC_ENCODER = False
 
 class STT():
-    def __init__(self, tts = None, ambient_duration = 1, listen_timeout = 6, listen_phrase_time_limit = 5):
+    def __init__(self, tts = None, ambient_duration = 1, listen_timeout = 6, listen_phrase_time_limit = 5, persistent = True, source = None, vad = None, flac_level = None, flac_budget = 0.05, backend = 'google', wake_word = None, endpointing = True, dictation_hint = None, barge_in = None):
         self.recognizer = sr.Recognizer()
+        self.backend = make_backend(backend, self.recognizer)
         self.ambient_duration = ambient_duration
         self.listen_timeout = listen_timeout
         self.listen_phrase_time_limit = listen_phrase_time_limit
         self.tts = tts
+        self.dictation_hint = dictation_hint
+        self.session = None
+        self.flac = None
+        if flac_level is not None and _HAS_FLAC_ENCODER:
+            # in-process FLAC instead of spawning the bundled flac binary per
+            # utterance; opt-in, since on Linux the subprocess is faster (bench_flac.py)
+            self.flac = FlacEncoder(level = flac_level, latency_budget = flac_budget)
+        if vad is not None:
+            # 'energy', 'zcr', 'flatness' or a VAD instance; needs numpy
+            from VAD import make_vad
+            vad = make_vad(vad)
+        self.wake = None
+        if wake_word is not None:
+            # a KeywordSpotter or a template file written by Wake_word.py; needs numpy
+            from Wake_word import KeywordSpotter
+            self.wake = KeywordSpotter.load(wake_word) if isinstance(wake_word, str) else wake_word
+        self.endpointer = None
+        if endpointing is True:
+            self.endpointer = AdaptiveEndpointer(pause_threshold = self.recognizer.pause_threshold, phrase_time_limit = listen_phrase_time_limit)
+        elif endpointing:
+            self.endpointer = endpointing
+        self.barge_in = None
+        if barge_in is True:
+            # keep listening while tts talks and cut it off when the user does; needs numpy
+            from Barge_in import BargeIn
+            self.barge_in = BargeIn(tts)
+        elif barge_in:
+            self.barge_in = barge_in
+        if persistent:
+            self.session = MicSession(self.recognizer, source = source, ambient_duration = ambient_duration, phrase_time_limit = listen_phrase_time_limit, vad = vad, wake = self.wake, endpointer = self.endpointer,
+                                      echo = self.barge_in)
+
+    @property
+    def closed(self) -> bool:
+        return self.session is not None and self.session.closed
+
+    def capture(self):
+        # None once the session is closed (stopped, or its source ran out);
+        # a session that failed is started again
+        if self.session:
+            if self.session.closed:
+                return None
+            try:
+                self.session.start()
+            except RuntimeError:
+                # closed while this capture was starting it
+                return None
+            print('Listening . . .')
+            return self.session.listen(timeout = self.listen_timeout)
+        with sr.Microphone() as source:
+            print('Listening . . .')
+            self.recognizer.adjust_for_ambient_noise(source, duration = self.ambient_duration)
+            return self.recognizer.listen(source, timeout = self.listen_timeout, phrase_time_limit = self.listen_phrase_time_limit)
 
     def listen(self):
         try:
-            with sr.Microphone() as source:
-                print('Listening . . .')
-                self.recognizer.adjust_for_ambient_noise(source, duration = self.ambient_duration)
-                self.audio = self.recognizer.listen(source, timeout = self.listen_timeout, phrase_time_limit = self.listen_phrase_time_limit)
-                try:
-                    self.command = self.recognizer.recognize_google(self.audio)
-                    print(f'You said: {self.command}')
-                    return self.command.lower().strip()
-                except sr.UnknownValueError:
-                    print('Sorry, I did not understand that')
-                    return ''
-                except sr.RequestError:
-                    self.tts.speak('ERROR: Speech service error!')
-                    return ''
+            self.audio = self.capture()
+            if self.audio is None:
+                return ""
         except sr.WaitTimeoutError:
             return ""
         except OSError as e:
-            self.tts.speak(f'ERROR: {e}')
+            self.tts.speak(f'ERROR: {e}', priority = URGENT, key = 'error')
             return ""
-        
+        return self.recognize(self.audio)
+
+    def recognize(self, audio):
+        if self.flac:
+            audio = self.flac.wrap(audio)
+        try:
+            command, _ = self.backend.recognize(audio)
+            print(f'You said: {command}')
+            command = command.lower().strip()
+            if self.wake and command.startswith(self.wake.keyword):
+                command = command[len(self.wake.keyword):].lstrip(' ,')
+            if self.endpointer and self.dictation_hint and self.dictation_hint(command):
+                # a note was asked for: its text, the next phrase, may run longer
+                self.endpointer.dictate()
+            return command
+        except sr.UnknownValueError:
+            print('Sorry, I did not understand that')
+            return ''
+        except sr.RequestError:
+            self.tts.speak('ERROR: Speech service error!', priority = URGENT, key = 'error')
+            return ''
+
+    def close(self):
+        if self.session:
+            self.session.stop()
+
@@ -0,0 +1,184 @@
+import threading
+import time
+
+from Metrics import LatencyStats
+
+# lower is more important
+URGENT, NORMAL, CHATTER = 0, 1, 2
+
+# seconds a message may wait before it is no longer worth saying
+DEFAULT_TTL = {URGENT: None, NORMAL: 20.0, CHATTER: 6.0}
+
+
+class QueuedSpeech():
+    """A message in the queue; also the handle ``TTS.speak`` returns.
+
+    ``done`` is set once the message has been said (``completed``) or will
+    not be: it expired, was cleared, or was cut short."""
+
+    def __init__(self, text, priority, key, ttl):
+        self.text = text
+        self.priority = priority
+        self.key = key
+        self.requested_at = time.perf_counter()
+        self.deadline = None if ttl is None else self.requested_at + ttl
+        self.cut = False
+        self.completed = False
+        self.done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def wait(self, timeout = None) -> bool:
+        self.done.wait(timeout)
+        return self.completed
+
+    def add_done_callback(self, fn):
+        # ``fn(completed)``, from the thread that finishes the message
+        with self._lock:
+            if not self.done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self.completed)
+
+    def _finish(self, completed):
+        with self._lock:
+            if self.done.is_set():
+                return
+            self.completed = completed
+            self.done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(completed)
+
+
+class SpeechQueue():
+    """What the assistant still has to say, most important first.
+
+    Messages of equal priority keep their order. A message whose deadline
+    passes while it waits is dropped. The same text queued again, or a
+    message with the ``key`` of one still waiting, is merged into it: the
+    newer text wins, with the higher priority and later deadline of the two.
+    Text that is being said right now is not queued again. An ``URGENT``
+    message arriving while something less important is being spoken calls
+    ``on_preempt(message)`` with the message to cut short. That call is made
+    after the queue's lock is released, by which time the speaker may have
+    moved on, so it should only cut if ``message`` is still the one playing.
+    The queue is small, so a list is scanned."""
+
+    def __init__(self, on_preempt = None, ttl = None):
+        self.on_preempt = on_preempt
+        self.ttl = dict(DEFAULT_TTL)
+        self.ttl.update(ttl or {})
+        self.wait = LatencyStats()
+        self.expired = 0
+        self.merged = 0
+        self.preempted = 0
+        self.current = None
+        self._pending = []
+        self._seq = 0
+        self._unfinished = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, text, priority = NORMAL, key = None, ttl = False):
+        message = QueuedSpeech(text, priority, key, self.ttl.get(priority) if ttl is False else ttl)
+        preempt = None
+        with self._cond:
+            older = self._find(text, key)
+            if self.current is not None and self.current.text == text:
+                # being said right now
+                self.merged += 1
+                return self.current
+            if older is not None:
+                self.merged += 1
+                older.text = text
+                older.priority = min(older.priority, priority)
+                older.deadline = None if (older.deadline is None or message.deadline is None) else max(older.deadline, message.deadline)
+            else:
+                self._seq += 1
+                message.seq = self._seq
+                self._pending.append(message)
+                self._unfinished += 1
+            current = self.current
+            if priority == URGENT and current is not None and current.priority > URGENT:
+                self.preempted += 1
+                current.cut = True
+                preempt = current
+            self._cond.notify_all()
+        if preempt is not None and self.on_preempt:
+            self.on_preempt(preempt)
+        return older or message
+
+    def get(self):
+        """Next message to say, or None once the queue is closed."""
+        with self._cond:
+            while True:
+                self._expire(time.perf_counter())
+                if self._pending:
+                    message = min(self._pending, key = lambda m: (m.priority, m.seq))
+                    self._pending.remove(message)
+                    self.current = message
+                    self.wait.add(time.perf_counter() - message.requested_at)
+                    return message
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+    def task_done(self):
+        with self._cond:
+            current, self.current = self.current, None
+            self._unfinished -= 1
+            self._cond.notify_all()
+        if current is not None:
+            current._finish(not current.cut)
+
+    def join(self):
+        with self._cond:
+            while self._unfinished > 0:
+                self._cond.wait()
+
+    def empty(self) -> bool:
+        with self._cond:
+            return not self._pending
+
+    def clear(self):
+        # everything waiting is dropped and what is being said is marked cut
+        with self._cond:
+            dropped, self._pending = self._pending, []
+            self._unfinished -= len(dropped)
+            if self.current is not None:
+                self.current.cut = True
+            self._cond.notify_all()
+        for message in dropped:
+            message._finish(False)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "wait": self.wait.snapshot(),
+            "expired": self.expired,
+            "merged": self.merged,
+            "preempted": self.preempted,
+            "pending": len(self._pending),
+        }
+
+    def _find(self, text, key):
+        for message in self._pending:
+            if message.text == text or (key is not None and message.key == key):
+                return message
+        return None
+
+    def _expire(self, now):
+        live = [m for m in self._pending if m.deadline is None or m.deadline > now]
+        if len(live) < len(self._pending):
+            dropped = [m for m in self._pending if m not in live]
+            self.expired += len(dropped)
+            self._unfinished -= len(dropped)
+            self._pending = live
+            self._cond.notify_all()
+            for message in dropped:
+                message._finish(False)
@@ -0,0 +1,133 @@
+import platform
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class _Step():
+    def __init__(self, name, after):
+        self.name = name
+        self.after = after
+        self.future = Future()
+        # dependencies not finished yet
+        self.waiting = len(after)
+        # scheduled or failed already
+        self.decided = False
+        self.started = None
+        self.ended = None
+
+
+class Startup():
+    """Runs start-up steps in parallel, each once the steps it needs are done.
+
+        startup = Startup()
+        startup.step('tts', TTS)
+        startup.step('greeting', lambda: startup.result('tts').prerender(['Greetings']), after = ('tts',))
+        tts = startup.result('tts')
+
+    ``step`` returns the step's ``Future``, so code that needs a slow step
+    (the app index) can wait on it while everything else goes ahead. A step
+    is handed to the pool only once the steps it needs have finished, so no
+    worker sits blocked on another step; if one of them failed, the step
+    does not run and its ``Future`` raises that error. Steps named in
+    ``after`` must have been added first.
+    ``report()`` prints when each step ran and the critical path: the chain
+    of steps, each waiting on the one before, that ends with the last to
+    finish among ``report(until)``."""
+
+    def __init__(self, workers = 6):
+        self.origin = time.perf_counter()
+        self._steps = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers = workers, thread_name_prefix = 'startup', initializer = self._init_thread)
+
+    def step(self, name, fn, *args, after = (), **kwargs):
+        step = _Step(name, tuple(after))
+        with self._lock:
+            self._steps[name] = step
+            needed = [self._steps[n].future for n in step.after]
+        if not needed:
+            self._submit(step, fn, args, kwargs)
+        for future in needed:
+            future.add_done_callback(lambda done: self._finished(step, done, fn, args, kwargs))
+        return step.future
+
+    def result(self, name, timeout = None):
+        return self._steps[name].future.result(timeout)
+
+    def future(self, name):
+        return self._steps[name].future
+
+    def elapsed(self, name = None) -> float:
+        # seconds since start-up began, to the end of step ``name`` if given
+        if name is None:
+            return time.perf_counter() - self.origin
+        return self._steps[name].ended - self.origin
+
+    def critical_path(self, until = None) -> list:
+        done = [s for s in self._steps.values() if s.ended is not None and (until is None or s.name in until)]
+        if not done:
+            return []
+        step = max(done, key = lambda s: s.ended)
+        path = [step]
+        while step.after:
+            # the dependency that held this step back is the one that ended last
+            step = max((self._steps[name] for name in step.after), key = lambda s: s.ended or 0)
+            path.append(step)
+        return path[::-1]
+
+    def report(self, until = None):
+        for step in sorted(self._steps.values(), key = lambda s: s.started or float('inf')):
+            if step.ended is None:
+                print(f"[Startup] {step.name:<14} {'not run' if step.future.done() else 'still running'}")
+                continue
+            print(f'[Startup] {step.name:<14}{(step.started - self.origin) * 1000:>8.0f} ->{(step.ended - self.origin) * 1000:>6.0f} ms')
+        path = self.critical_path(until)
+        if path:
+            chain = ' > '.join(f'{s.name} {(s.ended - s.started) * 1000:.0f} ms' for s in path)
+            print(f'[Startup] critical path: {chain} = ready at {(path[-1].ended - self.origin) * 1000:.0f} ms')
+
+    def shutdown(self):
+        self._pool.shutdown(wait = False)
+
+    def _finished(self, step, done, fn, args, kwargs):
+        # a step this one needs has finished: the last one to finish
+        # schedules it, and the first to fail fails it
+        failed = done.cancelled() or done.exception() is not None
+        with self._lock:
+            step.waiting -= 1
+            if step.decided or not (failed or step.waiting == 0):
+                return
+            step.decided = True
+        if not failed:
+            self._submit(step, fn, args, kwargs)
+        elif step.future.set_running_or_notify_cancel():
+            error = RuntimeError(f'{step.name}: a step it needs was cancelled') if done.cancelled() else done.exception()
+            step.future.set_exception(error)
+
+    def _submit(self, step, fn, args, kwargs):
+        try:
+            self._pool.submit(self._run, step, fn, args, kwargs)
+        except RuntimeError as e:
+            # shut down before this step's turn came
+            if step.future.set_running_or_notify_cancel():
+                step.future.set_exception(e)
+
+    def _run(self, step, fn, args, kwargs):
+        if not step.future.set_running_or_notify_cancel():
+            return
+        step.started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            step.ended = time.perf_counter()
+            step.future.set_exception(e)
+        else:
+            step.ended = time.perf_counter()
+            step.future.set_result(result)
+
+    def _init_thread(self):
+        if platform.system() == 'Windows':
+            # TTS is built here, and SAPI is a COM object
+            import pythoncom
+            pythoncom.CoInitialize()
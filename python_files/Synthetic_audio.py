@@ -0,0 +1,74 @@
+"""Speech-like audio for the benches and the replay harness.
+
+No recordings ship with the repo, so the benches make their own. A voiced
+sound is a stack of harmonics on a pitch that wobbles a few times a second,
+which is enough for the VAD, the endpointer and the FLAC encoder to treat
+it as speech. ``PcmSource`` plays 16-bit mono PCM into ``MicSession`` or
+``STT`` the way a microphone would.
+"""
+import numpy as np
+import speech_recognition as sr
+
+SAMPLE_RATE = 16000
+CHUNK = 1024
+
+
+def voiced(n, f0, vibrato = 0.05, rate = 3, harmonics = 9, sample_rate = SAMPLE_RATE):
+    """``n`` samples of ``harmonics`` harmonics of ``f0`` Hz, the pitch moving
+    by ``vibrato`` of itself ``rate`` times a second. Peaks near 3."""
+    t = np.arange(n) / sample_rate
+    phase = 2 * np.pi * np.cumsum(f0 * (1 + vibrato * np.sin(2 * np.pi * rate * t))) / sample_rate
+    return sum(np.sin(k * phase) / k for k in range(1, harmonics + 1))
+
+
+def word(rng, seconds, sample_rate = SAMPLE_RATE):
+    """One spoken-word burst of ``seconds``, as float samples."""
+    n = int(seconds * sample_rate)
+    return 4000 * voiced(n, rng.uniform(110, 200), sample_rate = sample_rate) * np.hanning(n) ** 0.3
+
+
+def spoken(transcript, seed):
+    """16-bit PCM of ``transcript``: one burst per word, longer for longer
+    words, with short gaps between them."""
+    rng = np.random.default_rng(seed)
+    parts = []
+    for text in transcript.split():
+        parts.append(word(rng, 0.12 + 0.05 * len(text)))
+        parts.append(np.zeros(int(SAMPLE_RATE * rng.uniform(0.06, 0.15))))
+    return np.concatenate(parts[:-1]).astype('<i2').tobytes()
+
+
+class PcmSource(sr.AudioSource):
+    """16-bit mono ``pcm`` as an audio source, read as fast as it is asked for.
+
+    ``at(t, fn)`` calls ``fn()`` once the stream reaches ``t`` seconds;
+    ``position`` is how far it has been read, in seconds."""
+
+    def __init__(self, pcm, hooks = None, sample_rate = SAMPLE_RATE):
+        self.pcm = pcm
+        self.hooks = sorted((hooks or {}).items())
+        self.SAMPLE_RATE, self.SAMPLE_WIDTH, self.CHUNK = sample_rate, 2, CHUNK
+        self.stream = None
+        self._offset = 0
+
+    @property
+    def position(self):
+        return self._offset / 2.0 / self.SAMPLE_RATE
+
+    def at(self, seconds, fn):
+        self.hooks = sorted(self.hooks + [(seconds, fn)], key = lambda hook: hook[0])
+
+    def __enter__(self):
+        self.stream = self
+        self._offset = 0
+        return self
+
+    def __exit__(self, *exc):
+        self.stream = None
+
+    def read(self, size):
+        data = self.pcm[self._offset:self._offset + 2 * size]
+        self._offset += len(data)
+        while self.hooks and self.hooks[0][0] <= self.position:
+            self.hooks.pop(0)[1]()
+        return data
@@ -0,0 +1,343 @@
+import asyncio
+import base64
+import re
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+from Metrics import LatencyStats
+
+try:
+    import aiohttp
+    import certifi
+    from edge_tts.communicate import (connect_id, date_to_string, get_headers_and_data, mkssml,
+                                      remove_incompatible_characters, split_text_by_byte_length, ssml_headers_plus_data)
+    from edge_tts.constants import DEFAULT_VOICE, SEC_MS_GEC_VERSION, WSS_HEADERS, WSS_URL
+    from edge_tts.data_classes import TTSConfig
+    from edge_tts.drm import DRM
+    from edge_tts.exceptions import NoAudioReceived, UnexpectedResponse, WebSocketError
+    _HAS_EDGE_TTS = True
+except ImportError:
+    _HAS_EDGE_TTS = False
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from gtts import gTTS, gTTSError
+    from gtts.lang import tts_langs
+    _HAS_GTTS = True
+except ImportError:
+    _HAS_GTTS = False
+
+# A backend turns text into encoded audio with ``render(text) -> bytes``;
+# ``audio_format`` says what the bytes are ('wav' or 'mp3') so the player and
+# the cache know how to handle them. One that also has ``stream(text)``
+# yields the audio in playable parts, and TTS plays each as it arrives.
+
+_EDGE_CONFIG = ('Content-Type:application/json; charset=utf-8\r\n'
+                'Path:speech.config\r\n\r\n'
+                '{"context":{"synthesis":{"audio":{"metadataoptions":{'
+                '"sentenceBoundaryEnabled":"false","wordBoundaryEnabled":"false"},'
+                '"outputFormat":"audio-24khz-48kbitrate-mono-mp3"}}}}\r\n')
+
+# the audio in a batchexecute reply: ...,"jQ1olc","[\"<base64>\"]",...
+_GTTS_AUDIO = re.compile(r'jQ1olc","\[\\"(.*?)\\"]')
+
+
+class _Dropped(Exception):
+    """The socket went away before the turn produced any audio; safe to retry."""
+
+
+class EdgeBackend():
+    """Microsoft Edge read-aloud voices over a pool of warm websockets.
+
+    ``edge_tts.Communicate`` opens a new ``aiohttp`` session, SSL context and
+    websocket handshake for every 4 KB chunk of every text. Here one session
+    and SSL context live as long as the backend, on its own event loop
+    thread. Up to ``pool_size`` sockets stay open between turns:
+    ``speech.config`` is sent once per socket, and each chunk of text is one
+    ``ssml`` turn read up to ``turn.end``. A socket the service has closed,
+    or that sat idle longer than ``max_idle``, is replaced. A turn that fails
+    before any audio arrived is retried once on a new socket. ``url`` points
+    the backend at a stand-in. With ``persistent = False`` it connects per
+    turn, as edge_tts does."""
+
+    name = 'edge'
+    audio_format = 'mp3'
+
+    def __init__(self, voice = None, rate = '+0%', volume = '+0%', pitch = '+0Hz', pool_size = 2, max_idle = 30.0,
+                 url = None, persistent = True, proxy = None, connect_timeout = 10, receive_timeout = 60):
+        if not _HAS_EDGE_TTS:
+            raise ImportError('edge_tts is not installed')
+        # numbers are on the SAPI scales TTS takes: rate -10..10, volume 0..100;
+        # None, TTS's default, is the voice's own rate and volume
+        if rate is None:
+            rate = '+0%'
+        if volume is None:
+            volume = '+0%'
+        if isinstance(rate, (int, float)):
+            rate = f'{int(rate) * 10:+d}%'
+        if isinstance(volume, (int, float)):
+            volume = f'{int(volume) - 100:+d}%'
+        self.voice = voice or DEFAULT_VOICE
+        self.config = TTSConfig(self.voice, rate, volume, pitch, 'SentenceBoundary')
+        self.pool_size = pool_size
+        self.max_idle = max_idle
+        self.url = url
+        self.persistent = persistent
+        self.proxy = proxy
+        self.timeout = aiohttp.ClientTimeout(total = None, connect = None, sock_connect = connect_timeout, sock_read = receive_timeout)
+        self.handshake = LatencyStats()
+        self.turns = LatencyStats()
+        self.connects = 0
+        self.reconnects = 0
+        self._ssl = None
+        self._session = None
+        self._idle = []
+        self._loop = asyncio.new_event_loop()
+        self._slots = None
+        self._thread = threading.Thread(target=self._loop.run_forever, name='edge-tts', daemon=True)
+        self._thread.start()
+
+    def render(self, text) -> bytes:
+        return asyncio.run_coroutine_threadsafe(self.synthesize(text), self._loop).result()
+
+    async def render_async(self, text) -> bytes:
+        # from any other event loop
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.synthesize(text), self._loop))
+
+    async def synthesize(self, text) -> bytes:
+        """MP3 for ``text``; runs on the backend's loop."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        audio = []
+        for chunk in split_text_by_byte_length(escape(remove_incompatible_characters(text)), 4096):
+            audio.append(await self._turn(chunk))
+        return b"".join(audio)
+
+    def stats(self) -> dict:
+        return {
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "handshake": self.handshake.snapshot(),
+            "turn": self.turns.snapshot(),
+        }
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(timeout = 5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout = 3)
+
+    async def _turn(self, chunk):
+        async with self._slots:
+            for attempt in (0, 1):
+                ws, session = await self._acquire()
+                try:
+                    with self.turns.time():
+                        audio = await self._speak(ws, chunk)
+                except _Dropped:
+                    await self._discard(ws, session)
+                    self.reconnects += 1
+                    if attempt:
+                        raise WebSocketError('connection dropped twice in a row')
+                    continue
+                except BaseException:
+                    await self._discard(ws, session)
+                    raise
+                await self._release(ws, session)
+                return audio
+
+    async def _speak(self, ws, chunk):
+        try:
+            await ws.send_str(ssml_headers_plus_data(connect_id(), date_to_string(), mkssml(self.config, chunk)))
+        except (aiohttp.ClientError, ConnectionError, RuntimeError) as e:
+            raise _Dropped(e)
+        audio = []
+        async for received in ws:
+            if received.type == aiohttp.WSMsgType.TEXT:
+                encoded = received.data.encode('utf-8')
+                headers, _ = get_headers_and_data(encoded, encoded.find(b"\r\n\r\n"))
+                if headers.get(b'Path') == b'turn.end':
+                    if not audio:
+                        raise NoAudioReceived('No audio was received. Please verify that your parameters are correct.')
+                    return b"".join(audio)
+            elif received.type == aiohttp.WSMsgType.BINARY:
+                if len(received.data) < 2:
+                    raise UnexpectedResponse('binary message without a header length')
+                headers, data = get_headers_and_data(received.data, int.from_bytes(received.data[:2], 'big'))
+                if headers.get(b'Path') != b'audio':
+                    raise UnexpectedResponse('binary message that is not audio')
+                if data:
+                    audio.append(data)
+            elif received.type == aiohttp.WSMsgType.ERROR:
+                raise WebSocketError(received.data if received.data else 'Unknown error')
+        if audio:
+            raise WebSocketError('connection closed in the middle of a turn')
+        raise _Dropped('connection closed before the turn started')
+
+    async def _acquire(self):
+        now = time.monotonic()
+        while self._idle:
+            ws, session, idle_since = self._idle.pop()
+            if not ws.closed and now - idle_since < self.max_idle:
+                return ws, session
+            await self._discard(ws, session)
+        session = await self._get_session()
+        return await self._connect(session), session
+
+    async def _release(self, ws, session):
+        if self.persistent and not ws.closed:
+            self._idle.append((ws, session, time.monotonic()))
+        else:
+            await self._discard(ws, session)
+
+    async def _discard(self, ws, session):
+        try:
+            await ws.close()
+        except Exception:
+            pass
+        if session is not self._session:
+            await session.close()
+
+    async def _get_session(self):
+        if not self.persistent:
+            # what edge_tts does for every chunk
+            self._ssl = ssl.create_default_context(cafile = certifi.where())
+            return aiohttp.ClientSession(trust_env = True, timeout = self.timeout)
+        if self._ssl is None:
+            self._ssl = ssl.create_default_context(cafile = certifi.where())
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(trust_env = True, timeout = self.timeout)
+        return self._session
+
+    async def _connect(self, session):
+        for attempt in (0, 1):
+            url = self.url or (f'{WSS_URL}&Sec-MS-GEC={DRM.generate_sec_ms_gec()}'
+                               f'&Sec-MS-GEC-Version={SEC_MS_GEC_VERSION}&ConnectionId={connect_id()}')
+            try:
+                with self.handshake.time():
+                    ws = await session.ws_connect(url, compress = 15, proxy = self.proxy, headers = WSS_HEADERS,
+                                                  ssl = self._ssl if url.startswith('wss:') else None)
+            except aiohttp.WSServerHandshakeError as e:
+                if e.status != 403 or attempt:
+                    raise
+                # the token is clock based; edge_tts corrects the skew the same way
+                DRM.handle_client_response_error(e)
+                continue
+            self.connects += 1
+            await ws.send_str(f'X-Timestamp:{date_to_string()}\r\n' + _EDGE_CONFIG)
+            return ws
+
+    async def _close(self):
+        while self._idle:
+            ws, session, _ = self._idle.pop()
+            await self._discard(ws, session)
+        if self._session is not None:
+            await self._session.close()
+
+
+class GTTSBackend():
+    """Google Translate voices through gTTS, with one pooled session.
+
+    ``gTTS.stream`` opens a ``requests.Session`` per text part and fetches
+    the parts one after another. Here gTTS only splits the text and builds
+    the requests. One session, whose connection pool holds ``workers``
+    kept-alive connections, sends them from ``workers`` threads at once.
+    ``stream(text)`` yields each part's MP3 in order as soon as it and
+    the parts before it have arrived; TTS plays from it, so the first part
+    is heard while the rest are fetched. ``render(text)`` joins the parts.
+    ``url`` points the backend at a stand-in. Building the requests uses
+    gTTS's private ``_prepare_requests``; a gTTS without it falls back to
+    ``gTTS.stream``, one part after another."""
+
+    name = 'gtts'
+    audio_format = 'mp3'
+
+    def __init__(self, lang = 'en', tld = 'com', slow = False, workers = 4, url = None, timeout = 10, voice = None,
+                 rate = None, volume = None):
+        if not _HAS_GTTS:
+            raise ImportError('gTTS is not installed')
+        # gTTS has one voice per language and no rate or volume; a voice
+        # from the catalog is a language code, anything else is ignored
+        self.lang = voice if voice in tts_langs() else lang
+        self.tld = tld
+        self.slow = slow
+        self.pool_size = workers
+        self.url = url
+        self.timeout = timeout
+        self.fetch = LatencyStats()
+        self.parts = 0
+        # parts are counted on the fetch threads
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._pool = ThreadPoolExecutor(max_workers = workers, thread_name_prefix = 'gtts')
+
+    def render(self, text) -> bytes:
+        return b"".join(self.stream(text))
+
+    def stream(self, text):
+        tts = gTTS(text, tld = self.tld, lang = self.lang, slow = self.slow, lang_check = False, timeout = self.timeout)
+        try:
+            prepared = tts._prepare_requests()
+        except AttributeError:
+            # not in this gTTS version
+            for part in tts.stream():
+                self._count()
+                yield part
+            return
+        if self.url:
+            for request in prepared:
+                request.url = self.url
+        futures = [self._pool.submit(self._fetch, tts, request) for request in prepared]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "parts": self.parts,
+            "fetch": self.fetch.snapshot(),
+        }
+
+    def close(self):
+        self._pool.shutdown(wait = False, cancel_futures = True)
+        self.session.close()
+
+    def _fetch(self, tts, request):
+        with self.fetch.time():
+            try:
+                r = self.session.send(request, timeout = self.timeout)
+                r.raise_for_status()
+            except requests.exceptions.HTTPError:
+                raise gTTSError(tts = tts, response = r)
+            except requests.exceptions.RequestException:
+                raise gTTSError(tts = tts)
+        # one search over the body instead of decoding it line by line
+        found = _GTTS_AUDIO.search(r.text)
+        if not found:
+            raise gTTSError(tts = tts, response = r)
+        self._count()
+        return base64.b64decode(found.group(1))
+
+    def _count(self):
+        with self._lock:
+            self.parts += 1
+
+
+BACKENDS = {cls.name: cls for cls in (EdgeBackend, GTTSBackend)}
+
+
+def make_backend(kind, **kwargs):
+    if not isinstance(kind, str):
+        return kind
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{kind}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[kind](**kwargs)
@@ -0,0 +1,164 @@
+import collections
+import hashlib
+import io
+import os
+import re
+import threading
+import wave
+
+# Replies built as "<fixed text> <variable text>". The fixed part is cached
+# on its own, so only the tail has to be synthesized.
+TEMPLATES = [
+    re.compile(r"^(?P<fixed>Opening|Searching Google for|The current time is|Today's date is|Application)\s+(?P<tail>.+)$"),
+]
+
+# every format a backend can cache; eviction covers them all, since
+# engines share the directory
+AUDIO_EXTENSIONS = ('.wav', '.mp3')
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=\S)')
+
+
+def split_sentences(text):
+    return [sentence for sentence in _SENTENCE_END.split(text.strip()) if sentence]
+
+
+def split_template(text):
+    for pattern in TEMPLATES:
+        m = pattern.match(text)
+        if m:
+            return [m.group('fixed'), m.group('tail')]
+    return [text]
+
+
+def segments(text):
+    """Sentences, each split at its template boundary, in speaking order."""
+    return [part for sentence in split_sentences(text) for part in split_template(sentence)]
+
+
+def wav_bytes(pcm, sample_rate, sample_width = 2, channels = 1):
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as w:
+        w.setnchannels(channels)
+        w.setsampwidth(sample_width)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return out.getvalue()
+
+
+class SpeechCache():
+    """Synthesized speech keyed by ``(text, engine, voice, rate, volume)``.
+
+    A small in-memory LRU sits in front of a directory of audio files,
+    named with the engine's ``audio_format`` (``wav`` or ``mp3``). The
+    directory is trimmed to ``disk_bytes``, least recently used first; hits
+    touch the file so they count as recent. It is scanned once, here; after
+    that the sizes and their order are kept in ``_files``."""
+
+    def __init__(self, directory = None, memory_items = 64, disk_bytes = 64 * 1024 * 1024, audio_format = 'wav'):
+        self.directory = directory or os.path.join(os.path.expanduser('~'), '.cache', 'voice_ai_tts')
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self.audio_format = audio_format
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()
+        # path -> size on disk, least recently used first
+        self._files = collections.OrderedDict()
+        self._disk_total = 0
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(self.directory, exist_ok = True)
+            self._scan()
+        except OSError as e:
+            print(f'[TTS Cache] disk tier disabled: {e}')
+            self.directory = None
+
+    @staticmethod
+    def key(text, engine, voice, rate, volume) -> str:
+        return hashlib.sha256(repr((text, engine, voice, rate, volume)).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+        path = self._path(key)
+        if path:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                data = None
+            if data:
+                self._remember(key, data)
+                with self._lock:
+                    self.disk_hits += 1
+                    if path in self._files:
+                        self._files.move_to_end(path)
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data):
+        self._remember(key, data)
+        path = self._path(key)
+        if not path:
+            return
+        try:
+            tmp = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f'[TTS Cache] write failed: {e}')
+            return
+        with self._lock:
+            self._disk_total += len(data) - self._files.pop(path, 0)
+            self._files[path] = len(data)
+            self._evict()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / float(lookups), 3) if lookups else None,
+            "disk_bytes": self._disk_total,
+        }
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last = False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.{self.audio_format}') if self.directory else None
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(AUDIO_EXTENSIONS):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        for _, size, path in sorted(entries):
+            self._files[path] = size
+            self._disk_total += size
+        self._evict()
+
+    def _evict(self):
+        # called with the lock held
+        while self._disk_total > self.disk_bytes and self._files:
+            path, size = self._files.popitem(last = False)
+            self._disk_total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -1,6 +1,19 @@
+import io
+import itertools
+import os
 import platform
 import queue
+import tempfile
 import threading
+import time
+import wave
+
+from Metrics import LatencyStats
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from TTS_cache import SpeechCache, segments, wav_bytes
+from Speech_queue import NORMAL, SpeechQueue
+from TTS_backends import make_backend
+from Voice_catalog import ENUMERATORS, VoiceCatalog, available, pyttsx3_voices, sapi_voices
 
 SVSFlagsAsync = 1
 SVSFPurgeBeforeSpeak = 2
@@ -17,16 +30,322 @@ try:
 except ImportError:
     _HAS_PYTTSX3 = False
 
+try:
+    import winsound
+    _HAS_WINSOUND = True
+except ImportError:
+    _HAS_WINSOUND = False
 
+try:
+    import pyaudio
+    _HAS_PYAUDIO = True
+except ImportError:
+    _HAS_PYAUDIO = False
 
-class TTS:
-    def __init__(self, voice=None, rate = None, volume = None):
+try:
+    from playsound import playsound
+    _HAS_PLAYSOUND = True
+except ImportError:
+    _HAS_PLAYSOUND = False
+
+SAFT22kHz16BitMono = 22
+
+
+class _Player():
+    """Plays WAV bytes in order on its own thread, so the next part of a reply
+    can be synthesized while the previous one is heard."""
+
+    def __init__(self, first_audio = None):
         self.queue = queue.Queue()
+        self.first_audio = first_audio
+        self.idle = threading.Event()
+        self.idle.set()
+        # ``(wav, started)`` while a WAV is playing, for echo suppression
+        self.current = None
+        self._stop_now = threading.Event()
+        self._pa = pyaudio.PyAudio() if (_HAS_PYAUDIO and not _HAS_WINSOUND) else None
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def available(compressed = False):
+        if compressed:
+            return _HAS_PLAYSOUND
+        return _HAS_WINSOUND or _HAS_PYAUDIO
+
+    def play(self, wav, requested_at = None):
+        # ``requested_at`` marks the first part of a reply, for time to first audio
+        self.idle.clear()
+        self.queue.put((wav, requested_at))
+
+    def wait(self):
+        self.idle.wait()
+
+    def stop(self):
+        self._stop_now.set()
+        try:
+            while True:
+                self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        if self.current is None:
+            # purged before the player thread picked anything up
+            self.idle.set()
+        if _HAS_WINSOUND:
+            winsound.PlaySound(None, 0)
+
+    def shutdown(self):
+        self.stop()
+        self.queue.put(None)
+        self._thread.join(timeout = 3)
+
+    def _loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            wav, requested_at = item
+            self._stop_now.clear()
+            if requested_at is not None and self.first_audio is not None:
+                self.first_audio.add(time.perf_counter() - requested_at)
+            self.current = (wav, time.perf_counter())
+            try:
+                self._play(wav)
+            except Exception as e:
+                print(f'[TTS Error]: {e}')
+            self.current = None
+            if self.queue.empty():
+                self.idle.set()
+
+    def _play(self, wav):
+        if wav[:4] != b'RIFF':
+            # MP3 from a network backend
+            self._play_file(wav)
+            return
+        if _HAS_WINSOUND:
+            winsound.PlaySound(wav, winsound.SND_MEMORY)
+            return
+        with wave.open(io.BytesIO(wav), 'rb') as w:
+            stream = self._pa.open(format = self._pa.get_format_from_width(w.getsampwidth()), channels = w.getnchannels(),
+                                   rate = w.getframerate(), output = True)
+            try:
+                data = w.readframes(1024)
+                while data and not self._stop_now.is_set():
+                    stream.write(data)
+                    data = w.readframes(1024)
+            finally:
+                stream.stop_stream()
+                stream.close()
+
+    def _play_file(self, data):
+        fd, path = tempfile.mkstemp(suffix = '.mp3')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            playsound(path)
+        finally:
+            os.remove(path)
+
+
+class _Utterance():
+    """One command for ``_EngineLoop``; ``done`` is set when the engine reports it finished."""
+
+    def __init__(self, name, text, path = None, requested_at = None):
+        self.name = name
+        self.text = text
+        self.path = path
+        self.requested_at = requested_at
+        self.done = threading.Event()
+        self.completed = False
+
+    def wait(self, timeout = None) -> bool:
+        self.done.wait(timeout)
+        return self.completed
+
+
+class _EngineLoop():
+    """Owns a pyttsx3 engine and drives it from one persistent external loop.
+
+    The engine is started once with ``startLoop(False)`` and ``iterate()`` is
+    called every ``tick`` seconds on this thread, so speaking an utterance
+    does not start and tear down a driver loop the way ``runAndWait()`` does.
+    Completion comes from the ``finished-utterance`` callback. ``stop()`` may
+    be called from any thread; the engine itself is only touched here.
+    Drivers that cannot run an external loop get ``runAndWait()`` per
+    command on the same thread instead."""
+
+    def __init__(self, engine, first_audio = None, tick = 0.01):
+        self.engine = engine
+        self.first_audio = first_audio
+        self.tick = tick
+        self.commands = queue.Queue()
+        self.external = True
+        self._names = itertools.count()
+        self._current = None
+        self._stop_now = threading.Event()
+        engine.connect('started-utterance', self._on_started)
+        engine.connect('finished-utterance', self._on_finished)
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def say(self, text, requested_at = None) -> _Utterance:
+        return self._submit(_Utterance(f'u{next(self._names)}', text, requested_at = requested_at))
+
+    def save_to_file(self, text, path) -> _Utterance:
+        return self._submit(_Utterance(f'u{next(self._names)}', text, path = path))
+
+    def stop(self):
+        self._stop_now.set()
+        if not self.external:
+            # the loop thread is blocked in runAndWait()
+            try:
+                self.engine.stop()
+            except Exception:
+                pass
+
+    def shutdown(self):
+        self.stop()
+        self.commands.put(None)
+        self._thread.join(timeout = 3)
+
+    def _submit(self, utterance):
+        self.commands.put(utterance)
+        return utterance
+
+    def _on_started(self, name):
+        current = self._current
+        if current is not None and current.name == name and current.requested_at is not None and self.first_audio is not None:
+            self.first_audio.add(time.perf_counter() - current.requested_at)
+
+    def _on_finished(self, name, completed):
+        current = self._current
+        if current is not None and current.name == name:
+            self._finish(current, completed)
+
+    def _finish(self, utterance, completed):
+        utterance.completed = completed
+        self._current = None
+        utterance.done.set()
+
+    def _loop(self):
+        if platform.system() == 'Windows':
+            import pythoncom
+            pythoncom.CoInitialize()
+        try:
+            self.engine.startLoop(False)
+            self.engine.iterate()
+        except Exception:
+            # e.g. espeak in pyttsx3 2.9x has no generator ``iterate``
+            self.external = False
+            try:
+                self.engine.endLoop()
+            except Exception:
+                pass
+        try:
+            while True:
+                if self._stop_now.is_set():
+                    self._stop()
+                if self._current is None:
+                    try:
+                        item = self.commands.get(timeout = self.tick)
+                    except queue.Empty:
+                        if self.external:
+                            self.engine.iterate()
+                        continue
+                    if item is None:
+                        break
+                    self._start(item)
+                    continue
+                self.engine.iterate()
+                if self._current is not None and self._current.path is not None and not self.engine.isBusy():
+                    # sapi5 writes files synchronously and does not report them finished
+                    self._finish(self._current, os.path.exists(self._current.path))
+                if self._current is not None:
+                    self._current.done.wait(self.tick)
+        finally:
+            if self.external:
+                try:
+                    self.engine.endLoop()
+                except Exception:
+                    pass
+
+    def _start(self, utterance):
+        self._current = utterance
+        try:
+            if utterance.path is None:
+                self.engine.say(utterance.text, utterance.name)
+            else:
+                self.engine.save_to_file(utterance.text, utterance.path, utterance.name)
+            if not self.external:
+                self.engine.runAndWait()
+                if self._current is utterance:
+                    self._finish(utterance, utterance.path is None or os.path.exists(utterance.path))
+        except Exception as e:
+            print(f'[TTS Error]: {e}')
+            self._finish(utterance, False)
+
+    def _stop(self):
+        self._stop_now.clear()
+        try:
+            while True:
+                item = self.commands.get_nowait()
+                if item is None:
+                    self.commands.put(None)
+                    break
+                item.done.set()
+        except queue.Empty:
+            pass
+        if self._current is not None:
+            try:
+                self.engine.stop()
+            except Exception:
+                pass
+            if self._current is not None:
+                self._finish(self._current, False)
+
+
+class TTS:
+    def __init__(self, voice=None, rate = None, volume = None, cache = True, cache_dir = None, render_workers = 1, driver = None, backend = None,
+                 catalog = None):
+        # urgent messages cut the current utterance short
+        self.queue = SpeechQueue(on_preempt = self._cut)
         self.stop_event = threading.Event()
         self.engine_kind = None
         self.sapi_voice = None
+        self.voice = voice
+        self._sapi_render = None
+        self._pytts = None
+        self._engine_loop = None
+        self._backend = None
+        # voices are looked up in the persisted catalog, see Voice_catalog.py;
+        # the local engine in use, as (name, enumerate), for ``voices()``
+        self.catalog = catalog
+        self._local_voices = None
+        self.rate = rate
+        self.volume = volume
+        self.first_audio = LatencyStats()
+        self.cache = None
+        self._player = None
+        self._renderer = None
+        self._inflight = []
+        self._generation = 0
+        self._talking = False
+        # the message being said; a preemption cuts only that one
+        self._saying = None
+        self._cut_lock = threading.Lock()
+
+        if backend is not None:
+            # a network voice ('edge') or a backend object, see TTS_backends.py
+            try:
+                if voice and backend in ENUMERATORS:
+                    found = self._find_voice(backend, ENUMERATORS[backend])
+                    voice = found['id'] if found else voice
+                self._backend = make_backend(backend, voice = voice, rate = rate, volume = volume)
+                self.engine_kind = self._backend.name
+            except Exception as e:
+                print(f'[TTS Error]: {backend} backend unavailable: {e}')
 
-        if platform.system() == 'Windows'and _HAS_SAPI:
+        if self.engine_kind is None and platform.system() == 'Windows'and _HAS_SAPI:
             try: 
                 self.engine_kind = 'sapi'
                 self.sapi_voice = win32com.client.Dispatch("SAPI.SpVoice")
@@ -38,12 +357,14 @@ class TTS:
                     self.sapi_voice.Volume = int(volume)
                 except Exception:
                     pass
+                self._local_voices = ('sapi', lambda: sapi_voices(self.sapi_voice))
                 if voice:
                     try:
-                        for v in self.sapi_voice.GetVoices():
-                            if voice.lower() in v.GetDescription().lower():
-                                self.sapi_voice.Voice = v
-                                break
+                        found = self._find_voice(*self._local_voices)
+                        if found:
+                            token = win32com.client.Dispatch("SAPI.SpObjectToken")
+                            token.SetId(found['id'])
+                            self.sapi_voice.Voice = token
                     except Exception:
                         pass
             except Exception:
@@ -53,7 +374,7 @@ class TTS:
         if self.engine_kind is None and _HAS_PYTTSX3:
             try:
                 self.engine_kind = 'pyttsx3'
-                self._pytts = pyttsx3.init()
+                self._pytts = pyttsx3.init(driver)
                 try:
                     self._pytts.setProperty('rate', int(rate))
                 except Exception:
@@ -62,15 +383,16 @@ class TTS:
                     self._pytts.setProperty('volume', float(volume) / 100.0)
                 except Exception:
                     pass
+                # each driver has its own voices
+                self._local_voices = (f'pyttsx3-{driver}' if driver else 'pyttsx3', lambda: pyttsx3_voices(self._pytts))
                 if voice:
                     try:
-
-                        for v in self._pytts.getProperty('voices'):
-                            if voice.lower() in v.name.lower():
-                                self._pytts.setProperty('voice', v.id)
-                                break
+                        found = self._find_voice(*self._local_voices)
+                        if found:
+                            self._pytts.setProperty('voice', found['id'])
                     except Exception:
                         pass
+                self._engine_loop = _EngineLoop(self._pytts, first_audio = self.first_audio)
             except Exception:
                 self.engine_kind = None
                 self._pytts = None
@@ -78,51 +400,246 @@ class TTS:
             if self.engine_kind is None:
                 print('No TTS engine available. Please install pyttsx or win32com.client for TTS supprt.\nOnly text will appear in the console.')
 
+        compressed = self._backend is not None and self._backend.audio_format != 'wav'
+        if (cache or self._backend) and self.engine_kind and _Player.available(compressed):
+            # replies are rendered once and replayed from the cache;
+            # backends can only be heard this way
+            audio_format = self._backend.audio_format if self._backend is not None else 'wav'
+            self.cache = SpeechCache(directory = cache_dir, audio_format = audio_format) if cache else None
+            self._player = _Player(first_audio = self.first_audio)
+            # sentences are rendered ahead of playback; local engines are not
+            # thread-safe, so they get a single render thread
+            if self._backend is not None:
+                render_workers = max(render_workers, getattr(self._backend, 'pool_size', 1))
+            self._renderer = ThreadPoolExecutor(max_workers = render_workers, thread_name_prefix = 'tts-render',
+                                                initializer = self._init_render_thread)
+
         self._worker_thread = threading.Thread(target=self._loop, daemon =True)
         self._worker_thread.start()
         
-    def speak(self, text: str):
+    def speak(self, text: str, priority = NORMAL, key = None, ttl = False):
+        # ``key`` names a message that a newer one with the same key replaces;
+        # ``ttl`` overrides the priority's default deadline (None: no deadline).
+        # Returns a handle whose ``wait()`` blocks until the message is said.
         if not text:
-            return
-        self.queue.put(str(text))
+            return None
+        return self.queue.put(str(text), priority = priority, key = key, ttl = ttl)
+
+    def prerender(self, texts):
+        # fills the cache ahead of time, in order; returns the futures
+        if self._renderer is None or self.cache is None:
+            return []
+        return [self._renderer.submit(self._cached_render, part) for text in texts for part in segments(text)]
     
     def stop(self):
-        try:
-            while not self.queue.empty():
-               _ = self.queue.get_nowait()
-               self.queue.task_done()
-        except Exception:
-            pass
+        self.queue.clear()
+        self._cut()
 
+    def _cut(self, message = None):
+        # stop what is being said now, leaving the queue alone; with
+        # ``message``, only if that message is still the one being said
+        with self._cut_lock:
+            if message is not None and message is not self._saying:
+                return
+            self._stop_speech()
+
+    def _stop_speech(self):
         if self.engine_kind == 'sapi' and self.sapi_voice:
             try:
                 self.sapi_voice.Speak('', SVSFPurgeBeforeSpeak|SVSFlagsAsync)
                 # Stop the current speech ourge speech flag triggers the stop and async flag allows the speech to be stopped immediately
             except Exception:
                 pass
-        elif self.engine_kind == 'pyttsx3'and self._pytts:
-            try:
-                self._pytts.stop()
-            except Exception:
-                pass
+        elif self.engine_kind == 'pyttsx3'and self._engine_loop:
+            self._engine_loop.stop()
+        if self._player:
+            self._generation += 1
+            for future in self._inflight:
+                future.cancel()
+            self._player.stop()
+
+    @property
+    def speaking(self) -> bool:
+        return self._talking or (self._player is not None and not self._player.idle.is_set())
+
+    def playing(self):
+        """``(wav, started)`` for the WAV being played, or None when playback is not from WAV."""
+        return self._player.current if self._player else None
+
+    def wait_silent(self, timeout = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.speaking:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
 
     def shutdown(self):
         self.stop_event.set()
-        self.queue.put(None)
+        self.queue.close()
         self._worker_thread.join(timeout = 3)
+        if self._player:
+            self._player.shutdown()
+            self._renderer.shutdown(wait = False, cancel_futures = True)
+        if self._engine_loop:
+            self._engine_loop.shutdown()
+        if self._backend is not None and hasattr(self._backend, 'close'):
+            self._backend.close()
+
+    def stats(self) -> dict:
+        return {
+            "first_audio": self.first_audio.snapshot(),
+            "queue": self.queue.stats(),
+            "cache": self.cache.stats() if self.cache else None,
+            "backend": self._backend.stats() if hasattr(self._backend, 'stats') else None,
+        }
+
+    def _speak_pipelined(self, text, requested_at):
+        # every sentence is queued for rendering at once and played in order
+        # as soon as it is ready, so the first one is heard while the rest render;
+        # a backend that streams (gTTS) hands over each part of a sentence as it arrives
+        generation = self._generation
+        streamed = hasattr(self._backend, 'stream')
+        parts = segments(text)
+        arrivals = [queue.Queue() if streamed else None for _ in parts]
+        self._inflight = [self._renderer.submit(self._streamed_render, part, arrived) if streamed
+                          else self._renderer.submit(self._cached_render, part)
+                          for part, arrived in zip(parts, arrivals)]
+        first = True
+        try:
+            for future, arrived in zip(self._inflight, arrivals):
+                for wav in (self._arrived(future, arrived, generation) if streamed else (future.result(),)):
+                    if generation != self._generation:
+                        return
+                    self._player.play(wav, requested_at if first else None)
+                    first = False
+                if generation != self._generation:
+                    return
+        except CancelledError:
+            return
+        finally:
+            if generation != self._generation:
+                for future in self._inflight:
+                    future.cancel()
+        self._player.wait()
+
+    def _arrived(self, future, arrived, generation):
+        # the parts ``_streamed_render`` puts on ``arrived``, until its None
+        while generation == self._generation:
+            try:
+                wav = arrived.get(timeout = 0.05)
+            except queue.Empty:
+                if future.done():
+                    # cancelled before it ran, or failed: raises
+                    future.result()
+                continue
+            if wav is None:
+                # raises what stopped the backend part way
+                future.result()
+                return
+            yield wav
+
+    def voices(self) -> dict:
+        # ``{engine: voices}`` of every installed network backend and the
+        # local engine in use, plus any other engine the catalog has stored
+        if self.catalog is None:
+            self.catalog = VoiceCatalog()
+        enumerators = available()
+        if self._local_voices is not None:
+            enumerators[self._local_voices[0]] = self._local_voices[1]
+        return self.catalog.all(enumerators)
+
+    def _find_voice(self, engine, enumerate):
+        if self.catalog is None:
+            self.catalog = VoiceCatalog()
+        return self.catalog.find(self.voice, engine = engine, enumerate = enumerate)
+
+    def _cached_render(self, text):
+        if self.cache is None:
+            return self._render(text)
+        key = SpeechCache.key(text, self.engine_kind, self.voice, self.rate, self.volume)
+        wav = self.cache.get(key)
+        if wav is None:
+            wav = self._render(text)
+            self.cache.put(key, wav)
+        return wav
+
+    def _streamed_render(self, text, arrived):
+        # like ``_cached_render``, but each part goes on ``arrived`` as soon as
+        # the backend has it; the joined audio is what gets cached
+        key = SpeechCache.key(text, self.engine_kind, self.voice, self.rate, self.volume)
+        audio = self.cache.get(key) if self.cache is not None else None
+        try:
+            if audio is not None:
+                arrived.put(audio)
+                return audio
+            parts = []
+            for part in self._backend.stream(text):
+                parts.append(part)
+                arrived.put(part)
+            audio = b"".join(parts)
+        finally:
+            arrived.put(None)
+        if self.cache is not None:
+            self.cache.put(key, audio)
+        return audio
+
+    def _init_render_thread(self):
+        if platform.system() == 'Windows':
+            # SAPI (and pyttsx3's sapi5 driver) are COM objects
+            import pythoncom
+            pythoncom.CoInitialize()
+
+    def _render(self, text):
+        if self._backend is not None:
+            return self._backend.render(text)
+        if self.engine_kind == 'sapi':
+            if self._sapi_render is None:
+                self._sapi_render = win32com.client.Dispatch("SAPI.SpVoice")
+                self._sapi_render.Voice = self.sapi_voice.Voice
+                self._sapi_render.Rate = self.sapi_voice.Rate
+                self._sapi_render.Volume = self.sapi_voice.Volume
+            stream = win32com.client.Dispatch("SAPI.SpMemoryStream")
+            audio_format = win32com.client.Dispatch("SAPI.SpAudioFormat")
+            audio_format.Type = SAFT22kHz16BitMono
+            stream.Format = audio_format
+            self._sapi_render.AudioOutputStream = stream
+            self._sapi_render.Speak(text)
+            return wav_bytes(bytes(stream.GetData()), 22050, 2)
+        fd, path = tempfile.mkstemp(suffix = '.wav')
+        os.close(fd)
+        try:
+            if not self._engine_loop.save_to_file(text, path).wait():
+                raise RuntimeError('pyttsx3 did not write the audio file')
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(path)
 
     def _loop(self):
         while not self.stop_event.is_set():
             item = self.queue.get()
             if item is None:
                 break
-            text = str(item)
+            text, requested_at = item.text, item.requested_at
             print(f'[Assistant]: {text}')
+            with self._cut_lock:
+                self._saying = item
 
+            if self._player:
+                try:
+                    self._speak_pipelined(text, requested_at)
+                    self._said()
+                    continue
+                except Exception as e:
+                    # fall back to speaking through the engine directly
+                    print(f'[TTS Error]: {e}')
            
+            self._talking = True
             try:
                 if self.engine_kind == 'sapi' and self.sapi_voice:        
                     self.sapi_voice.Speak(text, SVSFlagsAsync)
+                    self.first_audio.add(time.perf_counter() - requested_at)
                     max_wait_ms = min(max(500,len(text)*50), 30000) 
                     waited = 0
                     step = 150
@@ -130,14 +647,18 @@ class TTS:
                         if self.sapi_voice.WaitUntilDone(step):
                             break
                         waited += step
-                elif self.engine_kind == 'pyttsx3' and self._pytts:
-                    self._pytts.say(text)
-                    self._pytts.runAndWait()
+                elif self.engine_kind == 'pyttsx3' and self._engine_loop:
+                    self._engine_loop.say(text, requested_at).wait()
                 else:
                     pass
             except Exception as e:
                 print(f'[TTS Error]: {e}')
-            
-            self.queue.task_done()
+            self._talking = False
+            self._said()
+
+    def _said(self):
+        with self._cut_lock:
+            self._saying = None
+        self.queue.task_done()
 
 
@@ -0,0 +1,142 @@
+import numpy as np
+
+
+class VAD():
+    """Voice-activity detector working on a batch of short frames at once.
+
+    ``process`` takes raw 16-bit mono PCM (one capture chunk, or several),
+    splits it into ``frame_ms`` frames, scores every frame in a single NumPy
+    pass and returns whether the chunk holds speech. The noise floor is an
+    exponentially damped average, like ``Recognizer.energy_threshold``, but it
+    is updated for the whole batch in closed form instead of frame by frame."""
+
+    name = 'base'
+
+    def __init__(self, frame_ms = 20, ratio = 1.5, damping = 0.15, min_speech_fraction = 0.5, min_threshold = 50.0):
+        self.frame_ms = frame_ms
+        self.ratio = ratio
+        self.damping = damping
+        self.min_speech_fraction = min_speech_fraction
+        self.min_threshold = min_threshold
+        self.energy_threshold = 300.0
+        self.sample_rate = None
+        self.frame_len = None
+
+    def bind(self, sample_rate, chunk_size):
+        per_chunk = max(1, int(round(chunk_size / (sample_rate * self.frame_ms / 1000.0))))
+        self.sample_rate = sample_rate
+        self.frame_len = max(1, chunk_size // per_chunk)
+        self._decay = self.damping ** (float(self.frame_len) / sample_rate)
+        self._weights = np.empty(0, dtype=np.float64)
+        return self
+
+    def frames(self, data) -> np.ndarray:
+        samples = np.frombuffer(data, dtype='<i2')
+        n = len(samples) // self.frame_len
+        return samples[:n * self.frame_len].reshape(n, self.frame_len).astype(np.float32)
+
+    def features(self, frames: np.ndarray) -> dict:
+        return {"energy": np.sqrt(np.mean(frames * frames, axis=1))}
+
+    def decide(self, feats: dict) -> np.ndarray:
+        return feats["energy"] > self.energy_threshold
+
+    def classify(self, data) -> np.ndarray:
+        """Per-frame speech mask for ``data``."""
+        frames = self.frames(data)
+        if not len(frames):
+            return np.zeros(0, dtype=bool)
+        return self.decide(self.features(frames))
+
+    def process(self, data, adapt = True) -> bool:
+        frames = self.frames(data)
+        if not len(frames):
+            return False
+        feats = self.features(frames)
+        mask = self.decide(feats)
+        if adapt:
+            self._adapt(feats, ~mask)
+        return bool(mask.mean() >= self.min_speech_fraction)
+
+    def calibrate(self, data):
+        frames = self.frames(data)
+        if len(frames):
+            self._adapt(self.features(frames), np.ones(len(frames), dtype=bool))
+
+    def _adapt(self, feats, quiet):
+        values = feats["energy"][quiet]
+        if len(values):
+            self.energy_threshold = max(self.min_threshold, self._ema(self.energy_threshold, values * self.ratio))
+
+    def _ema(self, start, values):
+        # x_n = x_0 * d^n + (1 - d) * sum(v_i * d^(n-1-i)), evaluated in one dot product
+        n = len(values)
+        if len(self._weights) < n:
+            self._weights = self._decay ** np.arange(max(n, 2 * len(self._weights)), dtype=np.float64)
+        return float(start * self._decay ** n + (1 - self._decay) * np.dot(self._weights[:n][::-1], values))
+
+
+class EnergyVAD(VAD):
+    name = 'energy'
+
+
+class ZeroCrossingVAD(VAD):
+    """Energy gate that also rejects frames whose zero-crossing rate is
+    too high for voiced speech (hiss, keyboard clicks, broadband bursts)."""
+
+    name = 'zcr'
+
+    def __init__(self, zcr_max = 0.25, **kwargs):
+        super().__init__(**kwargs)
+        self.zcr_max = zcr_max
+
+    def features(self, frames):
+        feats = super().features(frames)
+        signs = np.signbit(frames)
+        feats["zcr"] = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(frames.shape[1] - 1 or 1)
+        return feats
+
+    def decide(self, feats):
+        return (feats["energy"] > self.energy_threshold) & (feats["zcr"] < self.zcr_max)
+
+
+class SpectralFlatnessVAD(VAD):
+    """Energy gate that also requires a peaky (harmonic) spectrum in the
+    speech band; stationary broadband noise like fans is close to flat."""
+
+    name = 'flatness'
+
+    def __init__(self, flatness_max = 0.35, band = (100, 4000), **kwargs):
+        super().__init__(**kwargs)
+        self.flatness_max = flatness_max
+        self.band = band
+
+    def bind(self, sample_rate, chunk_size):
+        super().bind(sample_rate, chunk_size)
+        self._window = np.hanning(self.frame_len).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.frame_len, 1.0 / sample_rate)
+        self._band = (freqs >= self.band[0]) & (freqs <= self.band[1])
+        if not self._band.any():
+            self._band[:] = True
+        return self
+
+    def features(self, frames):
+        feats = super().features(frames)
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1))[:, self._band] ** 2 + 1e-10
+        feats["flatness"] = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+        return feats
+
+    def decide(self, feats):
+        return (feats["energy"] > self.energy_threshold) & (feats["flatness"] < self.flatness_max)
+
+
+VADS = {cls.name: cls for cls in (EnergyVAD, ZeroCrossingVAD, SpectralFlatnessVAD)}
+
+
+def make_vad(kind, **kwargs) -> VAD:
+    if isinstance(kind, VAD):
+        return kind
+    try:
+        return VADS[kind](**kwargs)
+    except KeyError:
+        raise ValueError(f"Unknown VAD '{kind}', expected one of {sorted(VADS)}")
@@ -0,0 +1,210 @@
+import asyncio
+import importlib.util
+import json
+import os
+import re
+import threading
+import time
+
+# The voices every engine offers, enumerated once and kept on disk for
+# ``ttl`` seconds, so picking a voice at start-up is a dictionary lookup
+# rather than a walk over SAPI tokens or a request to the Edge voice list.
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+# SAPI reports languages as hex LCIDs
+_LCIDS = {
+    0x409: 'en-US', 0x809: 'en-GB', 0xc09: 'en-AU', 0x1009: 'en-CA', 0x4009: 'en-IN',
+    0x407: 'de-DE', 0x40c: 'fr-FR', 0xc0a: 'es-ES', 0x80a: 'es-MX', 0x410: 'it-IT',
+    0x411: 'ja-JP', 0x412: 'ko-KR', 0x416: 'pt-BR', 0x419: 'ru-RU', 0x804: 'zh-CN', 0x439: 'hi-IN',
+}
+
+
+def tokens(text) -> list:
+    return _TOKEN.findall(str(text).lower())
+
+
+def _language(value):
+    # pyttsx3's espeak driver prefixes languages with a priority byte
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'ignore')
+    value = ''.join(c for c in str(value) if c.isprintable()).strip()
+    return value.replace('_', '-')
+
+
+class VoiceCatalog():
+    """Voices of every engine, persisted to ``path`` with a time to live.
+
+    ``voices(engine, enumerate)`` returns the stored list while it is
+    younger than ``ttl`` seconds and only calls ``enumerate()`` (see the
+    ``*_voices`` functions below) when it is missing or stale. Lists are
+    kept per engine, so picking a voice only enumerates the engine it is
+    for; ``all(enumerators)`` lists every engine given (``available()``
+    names the installed network ones) plus any already stored. Each voice
+    is a dict with ``engine``, ``id``, ``name``, ``languages`` and
+    ``gender``. It is indexed by language, gender and the tokens of its
+    name and id. ``find('zira')``, ``find('en-GB female')`` or
+    ``find(language = 'fr', gender = 'male')`` intersect the indexes."""
+
+    def __init__(self, path = None, ttl = 7 * 24 * 3600):
+        self.path = path or os.path.join(os.path.expanduser('~'), '.cache', 'voice_ai_tts', 'voices.json')
+        self.ttl = ttl
+        self.hits = 0
+        self.enumerations = 0
+        self._engines = {}
+        self._index = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def voices(self, engine, enumerate = None) -> list:
+        with self._lock:
+            entry = self._engines.get(engine)
+            if entry is not None and (enumerate is None or time.time() - entry['fetched'] < self.ttl):
+                self.hits += 1
+                return entry['voices']
+            if enumerate is None:
+                return []
+            try:
+                found = list(enumerate())
+            except Exception as e:
+                print(f'[Voices] could not list {engine} voices: {e}')
+                # a stale list is better than none
+                return entry['voices'] if entry else []
+            self.enumerations += 1
+            voices = [dict(voice, engine = engine) for voice in found]
+            self._engines[engine] = {'fetched': time.time(), 'voices': voices}
+            self._build(engine)
+            self._save()
+            return voices
+
+    def all(self, enumerators = None) -> dict:
+        """``{engine: voices}`` for every engine in ``enumerators`` (``{engine: enumerate}``,
+        each listed under the TTL as in ``voices``) and every engine already stored."""
+        for engine, enumerate in (enumerators or {}).items():
+            self.voices(engine, enumerate)
+        with self._lock:
+            return {engine: entry['voices'] for engine, entry in self._engines.items()}
+
+    def find(self, query = None, engine = None, language = None, gender = None, enumerate = None):
+        """The first voice matching every word of ``query`` plus the filters, or None.
+
+        A query that is not made of whole words falls back to the substring
+        match TTS used before, e.g. ``find('Zir')``."""
+        if engine is not None:
+            self.voices(engine, enumerate)
+        engines = [engine] if engine is not None else list(self._engines)
+        words = tokens(query) if query else []
+        for name in engines:
+            index = self._index.get(name) or self._build(name)
+            if not index:
+                continue
+            keys = words + tokens(language) if language else list(words)
+            if gender:
+                keys.append('gender:' + gender.lower())
+            match = self._lookup(index, keys)
+            if match is None and query:
+                needle = query.lower()
+                match = next((v for v in self._engines[name]['voices']
+                              if needle in v['name'].lower() or needle in v['id'].lower()), None)
+            if match is not None:
+                return match
+        return None
+
+    def refresh(self, engine = None):
+        with self._lock:
+            for name in ([engine] if engine else list(self._engines)):
+                if name in self._engines:
+                    self._engines[name]['fetched'] = 0
+
+    def _lookup(self, index, keys):
+        if not keys:
+            return None
+        found = None
+        for key in keys:
+            posting = index.get(key)
+            if not posting:
+                return None
+            found = posting if found is None else found & posting
+            if not found:
+                return None
+        return index['__voices__'][min(found)]
+
+    def _build(self, engine):
+        if engine not in self._engines:
+            return None
+        voices = self._engines[engine]['voices']
+        index = {'__voices__': voices}
+        for i, voice in enumerate(voices):
+            keys = set(tokens(voice['name'])) | set(tokens(voice['id']))
+            for language in voice.get('languages') or ():
+                keys.update(tokens(language))
+            if voice.get('gender'):
+                keys.add('gender:' + voice['gender'].lower())
+                keys.add(voice['gender'].lower())
+            for key in keys:
+                index.setdefault(key, set()).add(i)
+        self._index[engine] = index
+        return index
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding = 'utf-8') as f:
+                self._engines = json.load(f)
+        except (OSError, ValueError):
+            self._engines = {}
+        # indexes are built on the first lookup of each engine
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok = True)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding = 'utf-8') as f:
+                json.dump(self._engines, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f'[Voices] catalog not saved: {e}')
+
+
+def sapi_voices(sapi):
+    for token in sapi.GetVoices():
+        languages = []
+        for lcid in (token.GetAttribute('Language') or '').split(';'):
+            try:
+                languages.append(_LCIDS.get(int(lcid, 16), lcid))
+            except ValueError:
+                pass
+        yield {'id': token.Id, 'name': token.GetDescription(), 'languages': languages,
+               'gender': token.GetAttribute('Gender') or None}
+
+
+def pyttsx3_voices(engine):
+    for voice in engine.getProperty('voices'):
+        yield {'id': voice.id, 'name': voice.name or voice.id, 'languages': [_language(l) for l in voice.languages or ()],
+               'gender': voice.gender}
+
+
+def edge_voices(proxy = None):
+    import edge_tts
+    for voice in asyncio.run(edge_tts.list_voices(proxy = proxy)):
+        yield {'id': voice['ShortName'], 'name': voice.get('FriendlyName', voice['ShortName']),
+               'languages': [voice['Locale']], 'gender': voice.get('Gender')}
+
+
+def gtts_voices():
+    from gtts.lang import tts_langs
+    for code, name in tts_langs().items():
+        yield {'id': code, 'name': name, 'languages': [code], 'gender': None}
+
+
+ENUMERATORS = {
+    'edge': edge_voices,
+    'gtts': gtts_voices,
+}
+
+_PACKAGES = {'edge': 'edge_tts', 'gtts': 'gtts'}
+
+
+def available() -> dict:
+    """The ``ENUMERATORS`` whose package is installed."""
+    return {engine: enumerate for engine, enumerate in ENUMERATORS.items()
+            if importlib.util.find_spec(_PACKAGES[engine]) is not None}
@@ -0,0 +1,171 @@
+"""Lightweight keyword spotter used to gate cloud recognition on a wake word.
+
+Enroll a few recordings of the wake word once:
+
+    python Wake_word.py enroll wake_jarvis.npz jarvis1.wav jarvis2.wav jarvis3.wav
+    python Wake_word.py record wake_jarvis.npz 3
+
+and pass the template file to ``STT(wake_word=...)``.
+"""
+import sys
+
+import numpy as np
+
+
+class KeywordSpotter():
+    """Template matcher over log-mel features.
+
+    Every chunk fed from the capture thread is turned into 25 ms / 10 ms log-mel
+    frames and appended to a short feature ring. The windows ending at the new
+    frames are stretched to each template's length (a few speaking rates) and
+    compared after mean normalisation, all in one NumPy pass. No resampling is
+    needed: the mel filterbank is built for the source sample rate."""
+
+    def __init__(self, templates = None, keyword = 'jarvis', threshold = None, stretches = (0.8, 0.9, 1.0, 1.12, 1.25),
+                 n_mels = 20, win_ms = 25, hop_ms = 10, refractory = 1.0, sample_rate = 16000):
+        self.keyword = keyword
+        self.templates = [np.asarray(t, dtype=np.float32) for t in (templates or [])]
+        self.threshold = threshold
+        self.stretches = stretches
+        self.n_mels = n_mels
+        self.win_ms = win_ms
+        self.hop_ms = hop_ms
+        self.refractory = refractory
+        self.last_score = None
+        self.bind(sample_rate)
+
+    def bind(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.win = int(sample_rate * self.win_ms / 1000)
+        self.hop = int(sample_rate * self.hop_ms / 1000)
+        n_fft = 1 << (self.win - 1).bit_length()
+        self._n_fft = n_fft
+        self._window = np.hamming(self.win).astype(np.float32)
+        self._fbank = self._mel_filterbank(sample_rate, n_fft, self.n_mels, 60, min(4000, sample_rate / 2))
+        self.reset()
+        return self
+
+    def reset(self):
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._ring = np.zeros((0, self.n_mels), dtype=np.float32)
+        self._cooldown = 0
+
+    @staticmethod
+    def _mel_filterbank(sample_rate, n_fft, n_mels, low, high):
+        mel = lambda f: 2595 * np.log10(1 + f / 700.0)
+        hz = lambda m: 700 * (10 ** (m / 2595.0) - 1)
+        points = hz(np.linspace(mel(low), mel(high), n_mels + 2))
+        bins = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+        lower, center, upper = points[:-2, None], points[1:-1, None], points[2:, None]
+        rising = (bins[None, :] - lower) / (center - lower)
+        falling = (upper - bins[None, :]) / (upper - center)
+        return np.maximum(0, np.minimum(rising, falling)).astype(np.float32)
+
+    def features(self, samples) -> np.ndarray:
+        samples = np.asarray(samples, dtype=np.float32)
+        if len(samples) < self.win:
+            return np.zeros((0, self.n_mels), dtype=np.float32)
+        frames = np.lib.stride_tricks.sliding_window_view(samples, self.win)[::self.hop]
+        power = np.abs(np.fft.rfft(frames * self._window, n=self._n_fft, axis=1)) ** 2
+        return np.log(power @ self._fbank.T + 1e-3).astype(np.float32)
+
+    def enroll(self, audio):
+        """Add a template from an ``AudioData`` (or 16-bit PCM bytes) holding just the keyword."""
+        pcm = audio.get_raw_data(convert_rate = self.sample_rate, convert_width = 2) if hasattr(audio, 'get_raw_data') else audio
+        feats = self.features(np.frombuffer(pcm, dtype='<i2'))
+        energy = feats.mean(axis=1)
+        voiced = np.flatnonzero(energy > energy.min() + 0.35 * (energy.max() - energy.min()))
+        if len(voiced) < 10:
+            raise ValueError('enrollment sample holds too little speech')
+        self.templates.append(feats[voiced[0]:voiced[-1] + 1])
+        return self
+
+    def calibrate(self, margin = 1.25):
+        """Threshold from the spread between enrolled templates."""
+        if len(self.templates) < 2:
+            return self.threshold
+        scores = []
+        for i, t in enumerate(self.templates):
+            others = self.templates[:i] + self.templates[i + 1:]
+            scores.append(min(self._score(t[None, :, :].transpose(0, 2, 1), o) for o in others))
+        self.threshold = float(max(scores) * margin)
+        return self.threshold
+
+    def feed(self, pcm) -> bool:
+        """Consume one capture chunk (16-bit mono PCM); True when the keyword just ended."""
+        samples = np.concatenate([self._carry, np.frombuffer(pcm, dtype='<i2').astype(np.float32)])
+        n_new = 0 if len(samples) < self.win else 1 + (len(samples) - self.win) // self.hop
+        if n_new:
+            self._ring = np.concatenate([self._ring, self.features(samples[:(n_new - 1) * self.hop + self.win])])
+            self._carry = samples[n_new * self.hop:]
+        else:
+            self._carry = samples
+        if not self.templates or not n_new:
+            return False
+        longest = int(max(len(t) for t in self.templates) * max(self.stretches)) + 1
+        self._ring = self._ring[-(longest + n_new):]
+        if self._cooldown > 0:
+            self._cooldown -= n_new
+            return False
+
+        best = np.inf
+        for template in self.templates:
+            for stretch in self.stretches:
+                length = int(round(len(template) * stretch))
+                if length > len(self._ring):
+                    continue
+                windows = np.lib.stride_tricks.sliding_window_view(self._ring, length, axis=0)[-n_new:]
+                best = min(best, self._score(windows, template))
+        self.last_score = best
+        threshold = self.threshold if self.threshold is not None else 4.0
+        if best < threshold:
+            self._cooldown = int(self.refractory * 1000 / self.hop_ms)
+            return True
+        return False
+
+    @staticmethod
+    def _score(windows, template):
+        # windows: (n, n_mels, L) -> resampled to the template length, mean-normalised
+        idx = np.round(np.linspace(0, windows.shape[2] - 1, len(template))).astype(int)
+        w = windows[:, :, idx].transpose(0, 2, 1)
+        w = w - w.mean(axis=1, keepdims=True)
+        t = template - template.mean(axis=0, keepdims=True)
+        return float(np.sqrt(((w - t[None]) ** 2).sum(axis=2)).mean(axis=1).min())
+
+    def save(self, path):
+        np.savez(path, keyword=self.keyword, threshold=np.nan if self.threshold is None else self.threshold,
+                 lengths=[len(t) for t in self.templates], frames=np.concatenate(self.templates) if self.templates else np.zeros((0, self.n_mels)))
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        data = np.load(path)
+        splits = np.cumsum(data['lengths'])[:-1]
+        threshold = float(data['threshold'])
+        kwargs.setdefault('threshold', None if np.isnan(threshold) else threshold)
+        return cls(templates = np.split(data['frames'], splits), keyword = str(data['keyword']), **kwargs)
+
+
+def _main(argv):
+    import speech_recognition as sr
+    if len(argv) >= 3 and argv[0] == 'enroll':
+        spotter = KeywordSpotter()
+        for path in argv[2:]:
+            spotter.enroll(sr.AudioData.from_file(path))
+    elif len(argv) >= 2 and argv[0] == 'record':
+        spotter = KeywordSpotter()
+        r = sr.Recognizer()
+        with sr.Microphone(sample_rate = 16000) as source:
+            r.adjust_for_ambient_noise(source, duration = 1)
+            for i in range(int(argv[2]) if len(argv) > 2 else 3):
+                print(f'Say the wake word ({i + 1}) . . .')
+                spotter.enroll(r.listen(source, phrase_time_limit = 2))
+    else:
+        print(__doc__)
+        return 1
+    print(f'[Wake] threshold: {spotter.calibrate()}')
+    spotter.save(argv[1])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,145 @@
+"""Indexing the apps at start-up: a full walk every time vs ``AppCache``.
+
+    python bench_app_cache.py [--folders N] [--launcher-ms MS] [--runs N]
+
+Builds a Start Menu-like tree in a temporary directory: ``--folders``
+vendor folders (default 600), some nested, each holding a few ``.lnk``
+and ``.exe`` files. The launcher is a stand-in that sleeps ``--launcher-ms``
+(default 1500, about what ``Get-StartApps`` takes) and returns a fixed app
+list. "walk" is the old ``index_windows_apps``: ``os.walk`` over every root
+plus the launcher query, on every start. For ``AppCache`` it reports the
+first start (nothing saved: full scan), a later start (load the saved
+index, the refresh runs behind it), and refreshes with nothing changed
+and after a shortcut is added or a folder removed. Each start is a fresh
+interpreter so the load is measured cold.
+"""
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from App_cache import AppCache
+
+
+def make_tree(top, folders, seed = 3):
+    rng = random.Random(seed)
+    roots = [os.path.join(top, 'Desktop'), os.path.join(top, 'ProgramData', 'Start Menu', 'Programs'),
+             os.path.join(top, 'AppData', 'Start Menu', 'Programs')]
+    for root in roots:
+        os.makedirs(root)
+    for i in range(folders):
+        folder = os.path.join(rng.choice(roots[1:]), f'Vendor {i}')
+        if rng.random() < 0.3:
+            folder = os.path.join(folder, 'Tools')
+        os.makedirs(folder, exist_ok = True)
+        for j in range(rng.randint(2, 8)):
+            extension = '.exe' if rng.random() < 0.2 else '.lnk'
+            open(os.path.join(folder, f'app {i} {j}{extension}'), 'w').close()
+    for j in range(30):
+        open(os.path.join(roots[0], f'desktop app {j}.lnk'), 'w').close()
+    return roots
+
+
+def fake_launcher(ms):
+    def launcher():
+        time.sleep(ms / 1000)
+        return {f'store app {i}': f'Store.App{i}!App' for i in range(120)}
+    return launcher
+
+
+def walk(roots, launcher):
+    # the index_windows_apps this replaces
+    index = {'shortcuts': {}, 'exes': {}, 'uwp': {}}
+    for path in roots:
+        if os.path.exists(path):
+            for root, _, files in os.walk(path):
+                for file in files:
+                    low = file.lower()
+                    full = os.path.join(root, file)
+                    if low.endswith('.lnk'):
+                        index['shortcuts'][low.replace('.lnk', "")] = full
+                    elif low.endswith('.exe'):
+                        index['exes'][low.replace('.exe', "")] = full
+    index['uwp'].update(launcher())
+    return index
+
+
+def _child(kind, roots, path, ms):
+    start = time.perf_counter()
+    if kind == 'walk':
+        tables = walk(roots, fake_launcher(ms))
+    else:
+        cache = AppCache(roots = roots, path = path, launcher = fake_launcher(ms), interval = 0)
+        if not cache.loaded:
+            cache.refresh()
+        tables = cache.tables()
+        # the start-up step returns here; the refresh would follow on a thread
+    ready = time.perf_counter() - start
+    print(json.dumps({'ready': ready, 'apps': sum(len(t) for t in tables.values())}))
+
+
+def run_child(kind, roots, path, ms):
+    out = subprocess.run([sys.executable, __file__, '--child', kind, json.dumps(roots), path, str(ms)],
+                         cwd = os.path.dirname(os.path.abspath(__file__)), capture_output = True, text = True,
+                         timeout = 120).stdout.strip().splitlines()
+    return json.loads(out[-1])
+
+
+def main(argv):
+    folders, ms, runs = 600, 1500, 3
+    args = iter(argv)
+    for arg in args:
+        if arg == '--folders':
+            folders = int(next(args))
+        elif arg == '--launcher-ms':
+            ms = int(next(args))
+        elif arg == '--runs':
+            runs = int(next(args))
+    top = tempfile.mkdtemp(prefix = 'apps-')
+    try:
+        roots = make_tree(top, folders)
+        path = os.path.join(top, 'apps.json')
+        mid = lambda rows: sorted(r['ready'] for r in rows)[len(rows) // 2] * 1000
+        rows = [run_child('walk', roots, path, ms) for _ in range(runs)]
+        print(f"{sum(1 for _ in os.walk(top))} directories, {rows[0]['apps']} apps, launcher stand-in {ms} ms")
+        print(f"{'start':<34}{'ready ms':>10}")
+        print(f"{'walk + launcher, every start':<34}{mid(rows):>10.1f}")
+        first = run_child('cache', roots, path, ms)
+        print(f"{'AppCache, first start':<34}{first['ready'] * 1000:>10.1f}")
+        rows = [run_child('cache', roots, path, ms) for _ in range(runs)]
+        assert rows[0]['apps'] == first['apps']
+        print(f"{'AppCache, later starts':<34}{mid(rows):>10.1f}   ({os.path.getsize(path) // 1024} KB on disk)")
+
+        print(f"{'refresh (background)':<34}{'ms':>10}{'listed':>8}{'skipped':>9}")
+        # the launcher's sleep left out: this times the rescan
+        cache = AppCache(roots = roots, path = path, launcher = fake_launcher(0), interval = 0)
+        for label, change in (('nothing changed', None), ('a shortcut added to the desktop', 'new tool.lnk'),
+                              ('a folder removed', 'Vendor 5')):
+            if change and change.endswith('.lnk'):
+                open(os.path.join(roots[0], change), 'w').close()
+            elif change:
+                for root in roots:
+                    shutil.rmtree(os.path.join(root, change), ignore_errors = True)
+            listed, skipped = cache.listed, cache.unchanged
+            start = time.perf_counter()
+            changed = cache.refresh()
+            took = (time.perf_counter() - start) * 1000
+            print(f"{label:<34}{took:>10.1f}{cache.listed - listed:>8}{cache.unchanged - skipped:>9}"
+                  f"{'   changed' if changed else ''}")
+        assert 'new tool' in cache.tables()['shortcuts']
+        start = time.perf_counter()
+        walk(roots, dict)
+        print(f"{'full os.walk, for comparison':<34}{(time.perf_counter() - start) * 1000:>10.1f}")
+    finally:
+        shutil.rmtree(top, ignore_errors = True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        _child(sys.argv[2], json.loads(sys.argv[3]), sys.argv[4], int(sys.argv[5]))
+    else:
+        main(sys.argv[1:])
@@ -0,0 +1,118 @@
+"""Finding an app from a spoken name: exact keys vs ``AppIndex``.
+
+    python bench_app_index.py [--size N] [--repeat N]
+
+Builds a synthetic index of ``--size`` names (default 40,000) spread over
+the shortcuts, exes and uwp tables, with a few real apps mixed in, then
+looks up names as the recognizer hears them: spacing ("note pad"), typos,
+a missing or extra word, a shortcut named differently from what is said.
+"exact" is the old lookup (a key in one of the tables). "difflib" scans
+every name with ``difflib.get_close_matches``. "AppIndex" is the trigram
+index. Reports how many each finds and the latency per lookup, then shows
+the launch-count boost deciding between two close names.
+"""
+import difflib
+import random
+import sys
+import time
+
+from App_index import KINDS, AppIndex
+from Metrics import LatencyStats
+
+REAL = {
+    'shortcuts': {'visual studio code (user)': 'Code.lnk', 'visual studio installer': 'Installer.lnk',
+                  'visual studio 2022': 'devenv.lnk', 'google chrome': 'Chrome.lnk', 'microsoft edge': 'Edge.lnk',
+                  'obs studio': 'OBS.lnk', 'microsoft powerpoint': 'POWERPNT.lnk', 'microsoft word': 'WINWORD.lnk'},
+    'exes': {'notepad': 'notepad.exe', 'notepad++': 'notepad++.exe', 'spotify': 'Spotify.exe'},
+    'uwp': {'calculator': 'Microsoft.WindowsCalculator!App', 'microsoft store': 'Microsoft.WindowsStore!App'},
+}
+# (what was heard, what should open, or None when nothing should)
+QUERIES = [
+    ('notepad', 'notepad'),
+    ('note pad', 'notepad'),
+    ('visual studio code', 'visual studio code (user)'),
+    ('chrome', 'google chrome'),
+    ('micro soft edge', 'microsoft edge'),
+    ('spottify', 'spotify'),
+    ('calculater', 'calculator'),
+    ('power point', 'microsoft powerpoint'),
+    ('the obs studio', 'obs studio'),
+    ('microsoft word', 'microsoft word'),
+    ('sing me a song', None),
+]
+VOCAB = ('asset audio backup cloud codec data desk draw driver editor flow forge game graph grid helper hub image '
+         'jet kit lab link loader manager map media meter monitor net note office pad photo pilot player port '
+         'print pro reader remote scan sense server shell sketch snap spark stack station studio suite sync '
+         'terminal tool tracker update vault video view vision viewer wave works writer zip').split()
+VENDORS = ('acme adobe asus autodesk corel dell epson hp intel lenovo logitech nvidia oracle razer realtek sony '
+           'steam ubisoft zoom').split()
+
+
+def synthetic(size, seed = 7):
+    rng = random.Random(seed)
+    tables = {kind: dict(REAL[kind]) for kind in KINDS}
+    names = set(n for table in tables.values() for n in table)
+    while len(names) < size:
+        words = [rng.choice(VENDORS)] + rng.sample(VOCAB, rng.randint(1, 3))
+        if rng.random() < 0.3:
+            words.append(str(rng.randint(2, 2024)))
+        name = ' '.join(words)
+        if name not in names:
+            names.add(name)
+            tables[KINDS[len(names) % 3]][name] = f'{name}.lnk'
+    return tables
+
+
+def exact(tables, query):
+    for kind in KINDS:
+        if query in tables[kind]:
+            return query
+    return None
+
+
+def main(argv):
+    size, repeat = 40000, 200
+    args = iter(argv)
+    for arg in args:
+        if arg == '--size':
+            size = int(next(args))
+        elif arg == '--repeat':
+            repeat = int(next(args))
+    tables = synthetic(size)
+    start = time.perf_counter()
+    index = AppIndex.from_tables(tables)
+    build = time.perf_counter() - start
+    print(f"{len(index)} names, built in {build * 1000:.0f} ms")
+
+    everything = [name for kind in KINDS for name in tables[kind]]
+    finders = [
+        ('exact', lambda q: exact(tables, q), repeat),
+        ('difflib', lambda q: next(iter(difflib.get_close_matches(q, everything, n = 1, cutoff = 0.6)), None), 1),
+        ('AppIndex', lambda q: getattr(index.best(q), 'name', None), repeat),
+    ]
+    print(f"{'lookup':<10}{'right':>7}{'p50 us':>10}{'p95 us':>10}{'max us':>10}")
+    for label, find, runs in finders:
+        stats = LatencyStats()
+        right = 0
+        for _ in range(runs):
+            for query, expected in QUERIES:
+                with stats.time():
+                    got = find(query)
+                right += got == expected
+        s = stats.snapshot()
+        print(f"{label:<10}{right // runs:>4}/{len(QUERIES):<2}{s['p50_ms'] * 1000:>10.0f}{s['p95_ms'] * 1000:>10.0f}"
+              f"{s['max_ms'] * 1000:>10.0f}")
+    for query, expected in QUERIES:
+        got = index.best(query)
+        if (got and got.name) != expected:
+            print(f"[Bench] {query!r}: {got} instead of {expected}")
+
+    print("'visual studio' before any launches:", [(m.name, round(m.score, 2)) for m in index.search('visual studio', 3)])
+    for _ in range(3):
+        index.record('shortcuts', 'visual studio 2022')
+    print("after launching visual studio 2022 three times:",
+          [(m.name, round(m.score, 2)) for m in index.search('visual studio', 3)])
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,143 @@
+"""Run many assistant sessions at once: one thread pipeline each vs one event loop.
+
+    python bench_async_sessions.py [sessions] [--speed N]
+
+Every session replays the synthetic commands from Replay_harness.py into its
+own ``STT``. A stand-in backend finds each phrase in the replayed stream and
+answers with its transcript after ``LATENCY`` seconds of blocking "network".
+Replies go to one shared TTS on pyttsx3's ``dummy`` driver. The threaded run
+uses ``build_pipeline`` per session. The async run uses ``AsyncAssistant``
+per session on one loop, with one shared executor. Reports peak thread count,
+end of speech to reply (p50/p95) and commands answered.
+"""
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import speech_recognition as sr
+
+from Async_assistant import AsyncAssistant
+from Command_handler import Command_Handler
+from Metrics import LatencyStats
+from Replay_harness import SYNTHETIC, RecordingExecutor, ReplaySource
+from STT_class import STT
+from Synthetic_audio import spoken
+from TTS_class import TTS
+from main_assist import build_pipeline
+
+LATENCY = 0.15
+
+
+class LookupBackend():
+    """Answers with the transcript of the clip the phrase came from."""
+
+    name = 'lookup'
+    min_confidence = 0.5
+
+    def __init__(self, source):
+        self.source = source
+
+    def recognize(self, audio):
+        time.sleep(LATENCY)
+        pcm = bytes(audio.get_raw_data())
+        probe = pcm[len(pcm) // 2 & ~1:][:4096]
+        transcript = self.source.transcript_at(self.source.pcm.find(probe)) if probe else None
+        if not transcript:
+            raise sr.UnknownValueError()
+        return transcript, 0.95
+
+
+def make_session(index, tts, speed):
+    clips = [(spoken(t, 10 * index + i), t) for i, t in enumerate(SYNTHETIC)]
+    source = ReplaySource(clips, speed = speed, seed = index)
+    stt = STT(tts = tts, source = source, backend = LookupBackend(source))
+    return source, stt, Command_Handler(xec = RecordingExecutor())
+
+
+class PeakThreads():
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        while not self._stop.wait(0.02):
+            self.peak = max(self.peak, threading.active_count())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.peak
+
+
+def run_threads(n, tts, speed):
+    response, answered = LatencyStats(), 0
+    watch = PeakThreads()
+    runs = []
+    for i in range(n):
+        source, stt, c_h = make_session(i, tts, speed)
+        pipeline = build_pipeline(stt, c_h, tts)
+        pipeline.origin = lambda audio, source = source: source.wall_time(audio.speech_end)
+        runs.append((source, stt, pipeline))
+    for source, stt, pipeline in runs:
+        stt.session.start()
+        pipeline.start()
+    for source, stt, pipeline in runs:
+        while not (source.finished.is_set() and not stt.session.running and not stt.session.backlog):
+            time.sleep(0.05)
+    time.sleep(1.0 + LATENCY)
+    for source, stt, pipeline in runs:
+        pipeline.stop()
+        stt.close()
+        pipeline.join()
+        for sample in pipeline.response.samples:
+            response.add(sample)
+        answered += pipeline.stages[-1].processed
+    return watch.stop(), response, answered
+
+
+async def _run_async(n, tts, speed):
+    executor = ThreadPoolExecutor(max_workers = 8, thread_name_prefix = 'assistant')
+    sessions = []
+    for i in range(n):
+        source, stt, c_h = make_session(i, tts, speed)
+        sessions.append(AsyncAssistant(stt, tts, c_h, executor = executor,
+                                       origin = lambda audio, source = source: source.wall_time(audio.speech_end)))
+    await asyncio.gather(*(session.run() for session in sessions))
+    executor.shutdown()
+    return sessions
+
+
+def run_async(n, tts, speed):
+    watch = PeakThreads()
+    sessions = asyncio.run(_run_async(n, tts, speed))
+    response = LatencyStats()
+    for session in sessions:
+        for sample in session.response.samples:
+            response.add(sample)
+    return watch.stop(), response, response.count
+
+
+def main(argv):
+    n, speed = 8, 2.0
+    args = iter(argv)
+    for arg in args:
+        if arg == '--speed':
+            speed = float(next(args))
+        else:
+            n = int(arg)
+    tts = TTS(driver = 'dummy', cache = False)
+    results = [('thread pipelines', run_threads(n, tts, speed)), ('asyncio', run_async(n, tts, speed))]
+    tts.shutdown()
+    print(f"\n{n} sessions x {len(SYNTHETIC)} commands, speed {speed}")
+    print(f"{'mode':<18}{'peak threads':>14}{'reply p50 ms':>14}{'reply p95 ms':>14}{'answered':>10}")
+    for name, (peak, response, answered) in results:
+        s = response.snapshot()
+        print(f"{name:<18}{peak:>14}{s['p50_ms']:>14}{s['p95_ms']:>14}{answered:>10}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
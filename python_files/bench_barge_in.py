@@ -0,0 +1,152 @@
+"""Measure barge-in: the user talking over the assistant.
+
+    python bench_barge_in.py [trials]
+
+A stand-in player "plays" a synthesized reply and a real-time source feeds
+``MicSession`` its echo (attenuated, delayed, with room noise), plus the
+user's voice starting part way through the reply. The echo stops when the
+player is stopped. Runs with and without ``BargeIn``, and also with a reply
+and no user. Reports user onset to audio stopped, phrases captured from the
+assistant's own voice, and whether the user's phrase was captured.
+"""
+import sys
+import time
+
+import numpy as np
+import speech_recognition as sr
+
+from Barge_in import BargeIn
+from Metrics import LatencyStats
+from Mic_session import MicSession
+from Synthetic_audio import CHUNK, SAMPLE_RATE, spoken
+from TTS_cache import wav_bytes
+
+REPLY = 'here is what I found for python tutorials on the web the first result is a free course from the python software foundation'
+USER = 'stop open youtube'
+
+
+class PlaybackStandIn():
+    """The parts of ``TTS`` that ``BargeIn`` uses, without a sound card."""
+
+    def __init__(self):
+        self.wav = None
+        self.pcm = None
+        self.started = None
+        self.stopped_at = None
+
+    def play(self, pcm):
+        self.pcm = pcm
+        self.wav = wav_bytes(pcm, SAMPLE_RATE)
+        self.started = time.perf_counter()
+        self.stopped_at = None
+
+    @property
+    def speaking(self):
+        if self.started is None or self.stopped_at is not None:
+            return False
+        return time.perf_counter() < self.started + len(self.pcm) / 2.0 / SAMPLE_RATE
+
+    def playing(self):
+        return (self.wav, self.started) if self.speaking else None
+
+    def stop(self):
+        if self.speaking:
+            self.stopped_at = time.perf_counter()
+
+    def wait_silent(self, timeout = None):
+        return not self.speaking
+
+
+class EchoSource(sr.AudioSource):
+    """Real-time stream of room noise, the player's echo and the user's voice."""
+
+    def __init__(self, player, reply, user, reply_at = 1.0, user_at = 2.5, gain = 0.3, delay = 0.04, seed = 0):
+        self.player = player
+        self.reply = np.frombuffer(reply, dtype='<i2').astype(np.float32)
+        self.user = np.frombuffer(user, dtype='<i2').astype(np.float32) if user else None
+        self.reply_at, self.user_at = reply_at, user_at
+        self.gain, self.delay = gain, delay
+        self.length = int((reply_at + 1.5) * SAMPLE_RATE) + len(self.reply)
+        self.rng = np.random.default_rng(seed)
+        self.SAMPLE_RATE, self.SAMPLE_WIDTH, self.CHUNK = SAMPLE_RATE, 2, CHUNK
+        self.stream = None
+
+    def __enter__(self):
+        self.stream = self
+        self._offset = 0
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stream = None
+
+    def read(self, size):
+        start = self._offset
+        if start >= self.length:
+            return b''
+        n = min(size, self.length - start)
+        due = self._started + (start + n) / float(SAMPLE_RATE)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        t = start / float(SAMPLE_RATE)
+        if self.player.started is None and t >= self.reply_at:
+            self.player.play(self.reply.astype('<i2').tobytes())
+            self._reply_offset = start
+        out = self.rng.normal(0, 40, n)
+        if self.player.speaking:
+            at = start - self._reply_offset - int(self.delay * SAMPLE_RATE)
+            echo = self.reply[max(0, at):max(0, at + n)]
+            out[n - len(echo):] += self.gain * echo
+        user_start = int(self.user_at * SAMPLE_RATE)
+        if self.user is not None and start + n > user_start:
+            part = self.user[max(0, start - user_start):start + n - user_start]
+            out[max(0, user_start - start):max(0, user_start - start) + len(part)] += part
+        self._offset += n
+        return np.clip(out, -32768, 32767).astype('<i2').tobytes()
+
+
+def run(with_barge_in, with_user, seed):
+    player = PlaybackStandIn()
+    reply = spoken(REPLY, seed)
+    user = spoken(USER, seed + 100) if with_user else None
+    source = EchoSource(player, reply, user, seed = seed)
+    echo = BargeIn(player) if with_barge_in else None
+    session = MicSession(source = source, ambient_duration = 0.5, phrase_time_limit = 5, max_pending = 100, echo = echo)
+    session.start()
+    phrases = []
+    while True:
+        try:
+            phrases.append(session.listen(timeout = 1))
+        except sr.WaitTimeoutError:
+            if not session.running:
+                break
+    session.stop()
+    user_end = source.user_at + (len(user) / 2.0 / SAMPLE_RATE if user else 0)
+    own = sum(1 for audio in phrases if not (with_user and audio.speech_end > source.user_at and audio.speech_start < user_end))
+    heard_user = with_user and any(audio.speech_end > source.user_at and audio.speech_start < user_end for audio in phrases)
+    return echo, own, heard_user
+
+
+def main(argv):
+    trials = int(argv[0]) if argv else 3
+    print(f"{'mode':<26}{'own phrases':>12}{'user heard':>12}{'stop p50 ms':>13}{'stop max ms':>13}")
+    for with_barge_in in (False, True):
+        for with_user in (False, True):
+            latency, own, heard = LatencyStats(), 0, 0
+            for seed in range(trials):
+                echo, n_own, heard_user = run(with_barge_in, with_user, seed)
+                own += n_own
+                heard += heard_user
+                if echo:
+                    time.sleep(0.05)
+                    for sample in echo.latency.samples:
+                        latency.add(sample)
+            name = f"{'barge-in' if with_barge_in else 'no gate'}, {'user talks' if with_user else 'reply only'}"
+            s = latency.snapshot()
+            stop = f"{s['p50_ms']:>13}{s['max_ms']:>13}" if latency.count else f"{'-':>13}{'-':>13}"
+            print(f"{name:<26}{own:>12}{(str(heard) + '/' + str(trials)) if with_user else '-':>12}{stop}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,105 @@
+"""Measure copies in phrase capture and in ``AudioData`` slicing.
+
+    python bench_buffers.py [clip.wav]
+
+Segments a 16-bit mono clip (default: the synthetic clip from bench_vad.py)
+with ``Recognizer.listen`` (a ``bytes`` per chunk in a deque, then
+``b"".join``) and with ``MicSession`` (one preallocated ``FrameRing``), then
+cuts 200 segments out of a 5 s phrase and converts it for three consumers,
+with ``sr.AudioData`` and with ``ViewAudioData``. Reports CPU time, the
+kilobytes of new phrase/segment buffers allocated, and the peak of traced
+allocations (which for the ring includes its fixed preallocation).
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import speech_recognition as sr
+
+from Audio_buffer import ViewAudioData
+from Mic_session import MicSession
+from bench_vad import synthesize
+
+
+def measure(fn):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.process_time()
+    out = fn()
+    elapsed = time.process_time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, out
+
+
+def copied(data):
+    # views share the capture buffer; anything else was built for this phrase
+    return 0 if isinstance(data, memoryview) else len(data)
+
+
+def legacy_capture(path):
+    r = sr.Recognizer()
+    phrases = new_bytes = 0
+    with sr.AudioFile(path) as source:
+        r.adjust_for_ambient_noise(source, duration = 0.5)
+        while True:
+            audio = r.listen(source)
+            if not audio.frame_data:
+                break
+            phrases += 1
+            new_bytes += copied(audio.frame_data)
+    return phrases, new_bytes
+
+
+def ring_capture(path):
+    session = MicSession(source = sr.AudioFile(path), ambient_duration = 0.5, max_pending = 1000)
+    session.start()
+    phrases = new_bytes = 0
+    while True:
+        try:
+            audio = session.listen(timeout = 2)
+        except sr.WaitTimeoutError:
+            break
+        phrases += 1
+        new_bytes += copied(audio.frame_data)
+    return phrases, new_bytes
+
+
+def slicing(cls, pcm, sample_rate):
+    audio = cls(pcm, sample_rate, 2)
+    new_bytes = 0
+    for i in range(200):
+        new_bytes += copied(audio.get_segment(i * 10, 5000 - i * 10).get_raw_data())
+    converted = set()
+    for _ in range(3):
+        data = audio.get_raw_data(convert_rate = 8000, convert_width = 2)
+        new_bytes += 0 if id(data) in converted else len(data)
+        converted.add(id(data))
+    return new_bytes
+
+
+def main(paths):
+    if not paths:
+        paths = [os.path.join(tempfile.mkdtemp(), 'synthetic.wav')]
+        synthesize(paths[0], seconds = 60)
+    path = paths[0]
+    with sr.AudioFile(path) as source:
+        seconds = source.DURATION
+        sample_rate = source.SAMPLE_RATE
+        pcm = source.stream.read(5 * sample_rate)
+
+    print(f"{'capture':<22}{'cpu ms/s':>10}{'new KB/s':>10}{'peak KB':>10}{'phrases':>9}")
+    for name, fn in (('Recognizer.listen', legacy_capture), ('MicSession ring', ring_capture)):
+        elapsed, peak, (phrases, new_bytes) = measure(lambda: fn(path))
+        print(f"{name:<22}{1000 * elapsed / seconds:>10.3f}{new_bytes / 1024 / seconds:>10.1f}{peak / 1024:>10.0f}{phrases:>9}")
+
+    print(f"\n{'5 s phrase':<22}{'cpu ms':>10}{'new KB':>10}{'peak KB':>10}")
+    for name, cls in (('sr.AudioData', sr.AudioData), ('ViewAudioData', ViewAudioData)):
+        elapsed, peak, new_bytes = measure(lambda: slicing(cls, pcm, sample_rate))
+        print(f"{name:<22}{1000 * elapsed:>10.2f}{new_bytes / 1024:>10.0f}{peak / 1024:>10.0f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
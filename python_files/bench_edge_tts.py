@@ -0,0 +1,180 @@
+"""Compare stock ``edge_tts.Communicate`` with the pooled ``EdgeBackend``.
+
+    python bench_edge_tts.py [lines] [--handshake S] [--turn S] [--drop-every N]
+
+Runs against a local websocket stand-in that speaks the read-aloud framing:
+``speech.config`` then one ``ssml`` message per turn, answered with
+``turn.start``, binary ``Path:audio`` frames and ``turn.end``. The stand-in
+checks the order of messages on every socket. Each handshake costs
+``HANDSHAKE`` seconds (TLS and the websocket upgrade to the real service)
+and each turn ``TURN`` seconds before the first frame. With
+``--drop-every N`` the stand-in closes every Nth socket it is asked to
+speak on, as the service does with idle connections. Reports per-line
+latency (p50/p95), handshakes and reconnects.
+"""
+import asyncio
+import sys
+import threading
+
+import edge_tts
+import edge_tts.communicate
+from aiohttp import web
+
+from Metrics import LatencyStats
+from TTS_backends import EdgeBackend
+
+HANDSHAKE = 0.12
+TURN = 0.03
+FRAME = b'\xff\xf3' + bytes(4094)
+FRAMES = 3
+
+LINES = [
+    'Jarvis is Online',
+    'The current time is 10:42 AM.',
+    'Opening youtube',
+    "Today's date is Saturday, October 17.",
+    'Searching Google for python tutorials',
+    'Application not found',
+]
+
+
+def _text(path, body = '{}'):
+    return f'X-RequestId:0\r\nContent-Type:application/json; charset=utf-8\r\nPath:{path}\r\n\r\n{body}'
+
+
+def _audio(data):
+    headers = b'X-RequestId:0\r\nContent-Type:audio/mpeg\r\nPath:audio'
+    # the length prefix counts itself, as the client parses it
+    return (len(headers) + 2).to_bytes(2, 'big') + headers + b'\r\n' + data
+
+
+class StandIn():
+    """Local websocket server with the read-aloud framing, on its own loop thread."""
+
+    def __init__(self, handshake = HANDSHAKE, turn = TURN, drop_every = 0):
+        self.handshake = handshake
+        self.turn = turn
+        self.drop_every = drop_every
+        self.handshakes = 0
+        self.turns = 0
+        self.drops = 0
+        self.errors = []
+        self._asked = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self.url = asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get('/edge', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f'ws://127.0.0.1:{port}/edge?TrustedClientToken=stand-in'
+
+    async def _handle(self, request):
+        await asyncio.sleep(self.handshake)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.handshakes += 1
+        configured = False
+        async for msg in ws:
+            if msg.type != web.WSMsgType.TEXT:
+                continue
+            if 'Path:speech.config' in msg.data:
+                configured = True
+                continue
+            if 'Path:ssml' not in msg.data:
+                self.errors.append('unexpected message')
+                continue
+            if not configured:
+                self.errors.append('ssml before speech.config')
+            self._asked += 1
+            if self.drop_every and self._asked % self.drop_every == 0:
+                self.drops += 1
+                await ws.close()
+                break
+            await asyncio.sleep(self.turn)
+            await ws.send_str(_text('turn.start'))
+            for _ in range(FRAMES):
+                await ws.send_bytes(_audio(FRAME))
+            await ws.send_str(_text('turn.end'))
+            self.turns += 1
+        return ws
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+async def _stock(text):
+    audio = []
+    async for chunk in edge_tts.Communicate(text).stream():
+        if chunk['type'] == 'audio':
+            audio.append(chunk['data'])
+    return b''.join(audio)
+
+
+def run_stock(server, lines):
+    # Communicate reads the URL from its module; the DRM token is appended to it
+    edge_tts.communicate.WSS_URL = server.url
+    latency = LatencyStats()
+    loop = asyncio.new_event_loop()
+    for text in lines:
+        with latency.time():
+            audio = loop.run_until_complete(_stock(text))
+        assert len(audio) == FRAMES * len(FRAME)
+    loop.close()
+    return latency, None
+
+
+def run_backend(server, lines, **kwargs):
+    backend = EdgeBackend(url = server.url, **kwargs)
+    latency = LatencyStats()
+    for text in lines:
+        with latency.time():
+            audio = backend.render(text)
+        assert len(audio) == FRAMES * len(FRAME)
+    stats = backend.stats()
+    backend.close()
+    return latency, stats
+
+
+def main(argv):
+    n, handshake, turn, drop_every = 30, HANDSHAKE, TURN, 5
+    args = iter(argv)
+    for arg in args:
+        if arg == '--handshake':
+            handshake = float(next(args))
+        elif arg == '--turn':
+            turn = float(next(args))
+        elif arg == '--drop-every':
+            drop_every = int(next(args))
+        else:
+            n = int(arg)
+    lines = [LINES[i % len(LINES)] for i in range(n)]
+    runs = [
+        ('edge_tts stock', 0, run_stock, {}),
+        ('per-turn connect', 0, run_backend, {'persistent': False}),
+        ('pooled', 0, run_backend, {}),
+        (f'pooled, drop 1/{drop_every}', drop_every, run_backend, {}),
+    ]
+    print(f"{n} lines, handshake {handshake * 1000:.0f} ms, turn {turn * 1000:.0f} ms")
+    print(f"{'client':<22}{'p50 ms':>9}{'p95 ms':>9}{'handshakes':>12}{'reconnects':>12}{'drops':>7}")
+    for name, drops, run, kwargs in runs:
+        server = StandIn(handshake = handshake, turn = turn, drop_every = drops)
+        latency, stats = run(server, lines, **kwargs)
+        server.close()
+        if server.errors:
+            print(f'[Bench] {name}: stand-in saw {server.errors}')
+        s = latency.snapshot()
+        reconnects = stats['reconnects'] if stats else '-'
+        print(f"{name:<22}{s['p50_ms']:>9}{s['p95_ms']:>9}{server.handshakes:>12}{reconnects:>12}{server.drops:>7}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
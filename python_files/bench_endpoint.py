@@ -0,0 +1,137 @@
+"""Compare fixed and adaptive end-of-utterance detection.
+
+    python bench_endpoint.py [--recognition-ms MS]
+
+Generates a session of short spoken-style commands (word bursts with short
+gaps) and two long notes, each asked for first with a short "take a note"
+phrase and dictated after a pause, and segments it with ``MicSession``
+twice: with the fixed ``pause_threshold`` / ``phrase_time_limit`` and with
+an ``AdaptiveEndpointer``. Recognition is a stand-in: each phrase is
+"recognized" ``--recognition-ms`` (default 400) after its endpoint, as the
+transcript of whatever was said in it, and routed through
+``Command_Handler``. When that transcript is the note request, its
+``is_dictation`` hint calls ``dictate()``, as ``STT.recognize`` does;
+nothing is known about the phrases that follow. Reports end of speech to
+response (endpoint wait + recognition + routing) for commands and for
+notes, split commands, cut notes, and commands taken for note text.
+"""
+import statistics
+import sys
+import time
+
+import numpy as np
+import speech_recognition as sr
+
+from Command_handler import Command_Handler
+from Endpointing import AdaptiveEndpointer
+from Mic_session import MicSession
+from Replay_harness import RecordingExecutor
+from Synthetic_audio import SAMPLE_RATE, PcmSource, word
+TRANSCRIPTS = {'command': 'what is the time', 'request': 'take a note',
+               'note': 'buy milk eggs bread and coffee then call the garage about the car and book the dentist'}
+
+
+def synthesize(seed = 11):
+    rng = np.random.default_rng(seed)
+    parts, labels, t = [np.zeros(int(1.5 * SAMPLE_RATE))], [], 1.5
+    plan = ['command'] * 12 + ['request', 'note'] + ['command'] * 6 + ['request', 'note'] + ['command'] * 4
+    for kind in plan:
+        words = 30 if kind == 'note' else rng.integers(2, 5)
+        start = t
+        for n in range(words):
+            w = word(rng, rng.uniform(0.2, 0.4))
+            parts.append(w)
+            t += len(w) / SAMPLE_RATE
+            if n < words - 1:
+                gap = rng.uniform(0.1, 0.35) if kind == 'note' else rng.uniform(0.08, 0.22)
+                parts.append(np.zeros(int(gap * SAMPLE_RATE)))
+                t += int(gap * SAMPLE_RATE) / SAMPLE_RATE
+        labels.append((kind, start, t))
+        rest = rng.uniform(1.5, 2.5)
+        parts.append(np.zeros(int(rest * SAMPLE_RATE)))
+        t += int(rest * SAMPLE_RATE) / SAMPLE_RATE
+    signal = np.concatenate(parts) + rng.normal(0, 40, sum(len(p) for p in parts))
+    return np.clip(signal, -32768, 32767).astype('<i2').tobytes(), labels
+
+
+def said(labels, start, end):
+    # what was said last between ``start`` and ``end`` seconds, by the script
+    for kind, a, b in reversed(labels):
+        if a < end + 0.05 and b > start - 0.05:
+            return kind
+    return None
+
+
+def segment(pcm, labels, endpointer, recognition):
+    source = PcmSource(pcm)
+    handler = Command_Handler(xec = RecordingExecutor())
+    if endpointer is not None:
+        # the stand-in recognizer: a phrase is recognized ``recognition``
+        # seconds after its endpoint, and "take a note" opens dictation then
+        end_phrase = endpointer.end_phrase
+
+        def recognized(published = True):
+            dictated = end_phrase(published)
+            if published and said(labels, source.position - 8, source.position) == 'request':
+                source.at(source.position + recognition, endpointer.dictate)
+            return dictated
+        endpointer.end_phrase = recognized
+    session = MicSession(source = source, ambient_duration = 1, phrase_time_limit = 5, max_pending = 1000, endpointer = endpointer,
+                         ring_seconds = 600)
+    session.start()
+    phrases = []
+    while True:
+        try:
+            audio = session.listen(timeout = 5)
+        except sr.WaitTimeoutError:
+            break
+        kind = said(labels, audio.speech_start, audio.speech_end)
+        start = time.perf_counter()
+        handler.route(TRANSCRIPTS.get(kind, ''), dictated = audio.dictated)
+        routed = time.perf_counter() - start
+        phrases.append((audio.speech_start, audio.speech_end, audio.endpoint + recognition + routed, audio.dictated))
+    session.stop()
+    return phrases
+
+
+def score(phrases, labels):
+    responses = {'command': [], 'note': []}
+    split = cut = misread = 0
+    for kind, a, b in labels:
+        mine = [p for p in phrases if p[0] < b + 0.05 and p[1] > a - 0.05]
+        if not mine:
+            continue
+        if len(mine) > 1:
+            if kind == 'note':
+                cut += 1
+            else:
+                split += 1
+        if kind != 'note':
+            misread += sum(1 for p in mine if p[3])
+        # the reply to the whole utterance follows its last phrase
+        responses['note' if kind == 'note' else 'command'].append(mine[-1][2] - b)
+    return responses, split, cut, misread
+
+
+def main(argv):
+    recognition = 0.4
+    args = iter(argv)
+    for arg in args:
+        if arg == '--recognition-ms':
+            recognition = int(next(args)) / 1000
+    pcm, labels = synthesize()
+    commands = sum(1 for kind, _, _ in labels if kind != 'note')
+    notes = len(labels) - commands
+    p95 = lambda values: sorted(values)[int(round(0.95 * (len(values) - 1)))]
+    print(f"end of speech to response, recognition stand-in {recognition * 1000:.0f} ms")
+    print(f"{'endpointing':<12}{'command p50':>13}{'command p95':>13}{'note p50':>10}{'split':>8}{'cut notes':>11}{'taken as note':>15}")
+    for name, endpointer in (('fixed', None), ('adaptive', AdaptiveEndpointer(phrase_time_limit = 5))):
+        responses, split, cut, misread = score(segment(pcm, labels, endpointer, recognition), labels)
+        print(f"{name:<12}{1000 * statistics.median(responses['command']):>10.0f} ms{1000 * p95(responses['command']):>10.0f} ms"
+              f"{1000 * statistics.median(responses['note']):>7.0f} ms{split:>5}/{commands:<2}{cut:>8}/{notes}{misread:>12}/{commands}")
+        if endpointer is not None:
+            print(f'[bench] {endpointer.snapshot()}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
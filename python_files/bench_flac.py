@@ -0,0 +1,71 @@
+"""Compare in-process FLAC encoding with the ``flac`` subprocess path.
+
+    python bench_flac.py [clip.wav ...]
+
+Encodes each clip (16-bit mono WAV, or a generated 3 s voiced clip) through
+``AudioData.get_flac_data`` (bundled ``flac --best`` subprocess) and through
+``FlacEncoder`` at every level, reporting median wall time and payload size.
+When a ``flac`` binary is available every in-process payload is decoded
+again and compared with the input samples.
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import speech_recognition as sr
+from speech_recognition.audio import get_flac_converter
+
+from Flac_encoder import FlacEncoder, LEVELS
+from Synthetic_audio import voiced
+
+REPEAT = 5
+
+
+def synthetic(seconds = 3, sample_rate = 16000, seed = 3):
+    rng = np.random.default_rng(seed)
+    t = np.arange(seconds * sample_rate) / sample_rate
+    speech = voiced(len(t), 140, vibrato = 0.1, rate = 2, sample_rate = sample_rate) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    signal = 4000 * speech + rng.normal(0, 60, len(t))
+    return sr.AudioData(signal.astype('<i2').tobytes(), sample_rate, 2)
+
+
+def timed(fn):
+    times, out = [], None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), out
+
+
+def roundtrip_ok(flac, pcm):
+    try:
+        converter = get_flac_converter()
+    except OSError:
+        return None
+    p = subprocess.run([converter, '-d', '-s', '-c', '--force-raw-format', '--endian=little', '--sign=signed', '-'],
+                       input=flac, capture_output=True)
+    return p.returncode == 0 and p.stdout == pcm
+
+
+def main(paths):
+    clips = [(p, sr.AudioData.from_file(p)) for p in paths] or [('synthetic 3 s', synthetic())]
+    for name, audio in clips:
+        pcm = audio.get_raw_data(convert_width=2)
+        audio = sr.AudioData(pcm, audio.sample_rate, 2)
+        seconds = len(pcm) / 2.0 / audio.sample_rate
+        print(f'\n{name}: {seconds:.2f} s, {len(pcm)} bytes PCM')
+        print(f"{'encoder':<18}{'median ms':>10}{'bytes':>9}{'ratio':>7}{'decodes':>9}")
+        elapsed, flac = timed(lambda: audio.get_flac_data(convert_width=2))
+        print(f"{'subprocess --best':<18}{elapsed * 1000:>10.1f}{len(flac):>9}{len(flac) / len(pcm):>7.3f}{'-':>9}")
+        for level in LEVELS:
+            encoder = FlacEncoder(level = level, latency_budget = None)
+            elapsed, flac = timed(lambda: encoder.encode(pcm, audio.sample_rate))
+            ok = roundtrip_ok(flac, pcm)
+            print(f"{'in-process -' + str(level):<18}{elapsed * 1000:>10.1f}{len(flac):>9}{len(flac) / len(pcm):>7.3f}{'n/a' if ok is None else str(ok):>9}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
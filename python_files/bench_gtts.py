@@ -0,0 +1,142 @@
+"""Compare stock ``gTTS.stream`` with the pooled, concurrent ``GTTSBackend``.
+
+    python bench_gtts.py [--connect S] [--latency S] [--workers N]
+
+Runs against a local HTTP stand-in for Google Translate's batchexecute
+endpoint that answers every part with a ``jQ1olc`` reply holding base64
+audio. A new connection costs ``CONNECT`` seconds (the TLS handshake to the
+real service) and each request ``LATENCY`` seconds. Multi-sentence replies
+are synthesized one after another. Reports time to the first part and to
+the whole reply (p50/p95), and how many connections were opened.
+"GTTSBackend.render" is the backend with its parts joined, which is when a
+player that waited for the whole buffer could start.
+"""
+import base64
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import gtts.tts
+
+from Metrics import LatencyStats
+from TTS_backends import GTTSBackend
+
+CONNECT = 0.1
+LATENCY = 0.08
+PART = base64.b64encode(b'\xff\xf3' + bytes(3070)).decode('ascii')
+
+REPLIES = [
+    'The current time is 10:42 AM. You have two meetings this afternoon. The first one starts at 2 PM.',
+    "Today's date is Saturday, October 17. It is going to rain later, so take an umbrella. Anything else?",
+    'Searching Google for python tutorials. Here are the top results. The first one is the official tutorial.',
+    'Opening youtube. Your subscriptions have new videos, and one of the channels you follow is live now.',
+]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        self.server.connections += 1
+        time.sleep(self.server.connect)
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+        body = (")]}'\n\n120\n"
+                f'[["wrb.fr","jQ1olc","[\\"{PART}\\"]",null,null,null,"generic"],["di",40],["af.httprm",40,"0",1]]\n'
+                '25\n[["e",4,null,null,200]]\n').encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandIn():
+    """batchexecute stand-in on a thread; counts the connections it accepts."""
+
+    def __init__(self, connect = CONNECT, latency = LATENCY):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.connect = connect
+        self.server.latency = latency
+        self.server.connections = 0
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/_/TranslateWebserverUi/data/batchexecute'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def connections(self):
+        return self.server.connections
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _measure(stream, text, first, total):
+    start = time.perf_counter()
+    parts = 0
+    for audio in stream(text):
+        if not parts:
+            first.add(time.perf_counter() - start)
+        assert audio[:2] == b'\xff\xf3'
+        parts += 1
+    total.add(time.perf_counter() - start)
+    return parts
+
+
+def run_stock(server, workers):
+    gtts.tts._translate_url = lambda tld = 'com', path = '': server.url
+    first, total, parts = LatencyStats(), LatencyStats(), 0
+    for text in REPLIES:
+        parts += _measure(lambda t: gtts.tts.gTTS(t, lang_check = False).stream(), text, first, total)
+    return first, total, parts
+
+
+def run_backend(server, workers):
+    backend = GTTSBackend(workers = workers, url = server.url)
+    first, total, parts = LatencyStats(), LatencyStats(), 0
+    for text in REPLIES:
+        parts += _measure(backend.stream, text, first, total)
+    backend.close()
+    return first, total, parts
+
+
+def run_render(server, workers):
+    backend = GTTSBackend(workers = workers, url = server.url)
+    first, total, parts = LatencyStats(), LatencyStats(), 0
+    for text in REPLIES:
+        parts += _measure(lambda t: [backend.render(t)], text, first, total)
+    backend.close()
+    return first, total, parts
+
+
+def main(argv):
+    connect, latency, workers = CONNECT, LATENCY, 4
+    args = iter(argv)
+    for arg in args:
+        if arg == '--connect':
+            connect = float(next(args))
+        elif arg == '--latency':
+            latency = float(next(args))
+        elif arg == '--workers':
+            workers = int(next(args))
+    print(f"{len(REPLIES)} replies, connect {connect * 1000:.0f} ms, request {latency * 1000:.0f} ms, {workers} workers")
+    print(f"{'client':<20}{'parts':>7}{'first p50 ms':>14}{'total p50 ms':>14}{'total p95 ms':>14}{'connections':>13}")
+    for name, run in (('gTTS stock', run_stock), ('GTTSBackend', run_backend), ('GTTSBackend.render', run_render)):
+        server = StandIn(connect = connect, latency = latency)
+        first, total, parts = run(server, workers)
+        server.close()
+        f, t = first.snapshot(), total.snapshot()
+        print(f"{name:<20}{parts:>7}{f['p50_ms']:>14}{t['p50_ms']:>14}{t['p95_ms']:>14}{server.connections:>13}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,79 @@
+"""The scikit-learn intent pipeline vs the exported NumPy hashed n-gram model.
+
+    python bench_intent_numpy.py [runs]
+
+Each run is a fresh interpreter. It imports the classifier module, loads the
+model, scores every line of ``toy_set.csv`` one at a time and reports import
+and load time (scikit-learn or NumPy included), resident memory added, and
+per-utterance latency (p50/p95). It also reports accuracy on the dataset,
+which is the training set, so it is a sanity check and not a score. Needs
+``python Intent_classifier.py train`` and ``export`` to have been run (done
+here if the models are missing).
+"""
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def _rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _child(kind):
+    rss = _rss_kb()
+    start = time.perf_counter()
+    import Intent_classifier
+    classifier = Intent_classifier.HashedIntentClassifier() if kind == 'numpy' else Intent_classifier.IntentClassifier()
+    classifier.warm()
+    ready = time.perf_counter() - start
+    with open(Intent_classifier.DATASET, newline = '', encoding = 'utf-8') as f:
+        rows = list(csv.DictReader(f))
+    correct = 0
+    for _ in range(10):
+        for row in rows:
+            intent, _ = classifier.predict(row['text'])
+            correct += intent == row['intent']
+    latency = classifier.latency.snapshot()
+    print(json.dumps({'ready': ready, 'rss': _rss_kb() - rss, 'p50': latency['p50_ms'], 'p95': latency['p95_ms'],
+                      'accuracy': correct / (10 * len(rows)), 'modules': len(sys.modules)}))
+
+
+def main(argv):
+    runs = int(argv[0]) if argv else 3
+    here = os.path.dirname(os.path.abspath(__file__))
+    import Intent_classifier
+    if not os.path.exists(Intent_classifier.MODEL):
+        Intent_classifier.train()
+    if not os.path.exists(os.path.join(Intent_classifier.HASHED_MODEL, 'weights.npy')):
+        Intent_classifier.export()
+    weights = os.path.getsize(os.path.join(Intent_classifier.HASHED_MODEL, 'weights.npy'))
+    print(f"{runs} cold runs each, model files: joblib {os.path.getsize(Intent_classifier.MODEL) // 1024} KB, "
+          f"npy {weights // 1024} KB")
+    print(f"{'classifier':<20}{'import+load ms':>16}{'RSS MB':>9}{'p50 us':>9}{'p95 us':>9}{'modules':>9}{'train acc':>11}")
+    for name, kind in (('TF-IDF + sklearn LR', 'sklearn'), ('hashed n-gram NumPy', 'numpy')):
+        rows = []
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, __file__, '--child', kind], cwd = here, capture_output = True,
+                                 text = True, timeout = 120).stdout.strip().splitlines()
+            rows.append(json.loads(out[-1]))
+        mid = lambda key: sorted(r[key] for r in rows)[len(rows) // 2]
+        print(f"{name:<20}{mid('ready') * 1000:>16.0f}{mid('rss') / 1024:>9.1f}{mid('p50') * 1000:>9.0f}"
+              f"{mid('p95') * 1000:>9.0f}{mid('modules'):>9}{mid('accuracy'):>11.2f}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        _child(sys.argv[2])
+    else:
+        main(sys.argv[1:])
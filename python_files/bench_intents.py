@@ -0,0 +1,114 @@
+"""Regex router with the intent classifier as a fallback tier.
+
+    python bench_intents.py [--threshold T] [--margin M] [--hashed] [--sweep]
+
+Sends commands the router knows, and the held-out set it does not
+(``held_out.csv``: paraphrases plus out-of-domain speech, none of it
+trained on), through ``Command_Handler`` with an ``IntentClassifier``.
+Reports the latency of each tier, what loading the model costs the first
+fallback, single vs batch prediction cost, and how many fallbacks were
+acted on (hit rate) and how many of those were right. Acting on
+out-of-domain speech counts as wrong. ``--hashed`` uses the exported NumPy
+model (``python Intent_classifier.py export``) instead of scikit-learn.
+``--sweep`` prints right and wrong actions on the held-out set over a grid
+of thresholds and margins, which is how the defaults were picked.
+"""
+import sys
+import time
+
+from Command_handler import Command_Handler
+from Intent_classifier import HELD_OUT, NONE, HashedIntentClassifier, IntentClassifier, load_rows
+from Replay_harness import RecordingExecutor
+
+KNOWN = ['what is the time', 'open youtube', 'search for python tutorials', 'take a note buy milk and eggs',
+         'what is the date', 'open downloads folder', 'open notepad']
+THRESHOLDS = [0.2, 0.3, 0.4, 0.45, 0.5, 0.6]
+MARGINS = [0.0, 0.1, 0.2, 0.3]
+
+
+def held_out():
+    # (command, intent it should get, or None when nothing should happen)
+    # lower case, as transcripts arrive
+    return [(row['text'].lower(), None if row['intent'] == NONE else row['intent']) for row in load_rows(HELD_OUT)]
+
+
+def sweep(classifier, samples):
+    in_domain = sum(1 for _, expected in samples if expected)
+    print(f"held out: {in_domain} in-domain, {len(samples) - in_domain} out-of-domain; right/wrong actions")
+    print(f"{'threshold':>10}" + ''.join(f"{f'margin {m}':>12}" for m in MARGINS))
+    for threshold in THRESHOLDS:
+        line = f"{threshold:>10}"
+        for margin in MARGINS:
+            classifier.margin = margin
+            right = wrong = 0
+            for (intent, confidence), (_, expected) in zip(classifier.predict_batch([t for t, _ in samples]), samples):
+                if intent == NONE or confidence < threshold:
+                    continue
+                right += intent == expected
+                wrong += intent != expected
+            line += f"{f'{right}/{wrong}':>12}"
+        print(line)
+
+
+def main(argv):
+    threshold, margin, hashed, grid = None, None, False, False
+    args = iter(argv)
+    for arg in args:
+        if arg == '--threshold':
+            threshold = float(next(args))
+        elif arg == '--margin':
+            margin = float(next(args))
+        elif arg == '--hashed':
+            hashed = True
+        elif arg == '--sweep':
+            grid = True
+    xec = RecordingExecutor()
+    classifier = HashedIntentClassifier() if hashed else IntentClassifier()
+    samples = held_out()
+    if grid:
+        return sweep(classifier.warm(), samples)
+    c_h = Command_Handler(xec = xec, classifier = classifier, threshold = threshold)
+    intents = {action: intent for intent, action in c_h._INTENTS.items() if not isinstance(action, str)}
+
+    start = time.perf_counter()
+    c_h.route(samples[0][0])
+    first = time.perf_counter() - start
+    if margin is not None:
+        classifier.margin = margin
+    for command in KNOWN * 20:
+        c_h.route(command)
+    right = wrong = 0
+    for command, expected in samples:
+        action, reply = c_h.route(command)
+        got = 'exit' if reply == '__EXIT__' else intents.get(action)
+        if got is None and action is None:
+            right += expected is None
+            continue
+        if got == expected:
+            right += 1
+        else:
+            wrong += 1
+            print(f'[Bench] {command!r}: {got} instead of {expected}')
+
+    texts = [command for command, _ in samples]
+    single = time.perf_counter()
+    for text in texts * 20:
+        classifier.predict(text)
+    single = (time.perf_counter() - single) / (20 * len(texts))
+    batch = time.perf_counter()
+    for _ in range(20):
+        classifier.predict_batch(texts)
+    batch = (time.perf_counter() - batch) / (20 * len(texts))
+
+    s = c_h.stats()
+    print(f"{'tier':<12}{'calls':>7}{'p50 ms':>9}{'p95 ms':>9}")
+    for tier in ('router', 'classifier'):
+        print(f"{tier:<12}{s[tier]['count']:>7}{s[tier]['p50_ms']:>9}{s[tier]['p95_ms']:>9}")
+    print(f"first fallback (loads the model): {first * 1000:.0f} ms, load {classifier.load.snapshot()['max_ms']} ms")
+    print(f"predict: {single * 1e6:.0f} us single, {batch * 1e6:.0f} us per text in a batch of {len(texts)}")
+    print(f"threshold {threshold or classifier.threshold}, margin {classifier.margin}: {s['fallbacks']} fallbacks, "
+          f"hit rate {s['fallback_hit_rate']}, {right}/{len(samples)} held-out commands handled right, {wrong} wrong actions")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
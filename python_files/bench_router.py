@@ -0,0 +1,85 @@
+"""Dispatch cost as commands are added: one pattern after another vs ``CommandRouter``.
+
+    python bench_router.py [--repeat N]
+
+Starts from the 8 routes ``Command_Handler`` registers and adds synthetic
+skills ("turn on light 12", "skill12 status") up to 5,000 routes. Each size
+dispatches a mix of everyday commands, the newest skills and commands
+nothing handles. "linear" tries the patterns one by one in priority order,
+as the old if-chain did. "router" is ``CommandRouter`` with the LRU off, and
+"router + LRU" with it on. Reports mean microseconds per dispatch.
+"""
+import re
+import sys
+import time
+
+from Command_handler import Command_Handler
+from Command_router import CommandRouter
+from Replay_harness import RecordingExecutor
+
+SIZES = [8, 50, 500, 5000]
+EVERYDAY = ['what is the time', 'open youtube', 'open notepad', 'search for python tutorials',
+            'take a note buy milk and eggs', 'what is the date', 'open downloads folder', 'sing me a song']
+
+
+def extra_routes(n):
+    for i in range(n):
+        if i % 2:
+            yield rf"turn (on|off) light {i}( please)?", 10, (f'turn on light {i}', f'turn off light {i}')
+        else:
+            yield rf"skill{i} (?P<what>status|start|stop)", 10, (f'skill{i}',)
+
+
+def build(size):
+    handler = Command_Handler(xec = RecordingExecutor())
+    routes = [(r.pattern, r.target, r.priority) for r in handler.router._routes]
+    for pattern, priority, keywords in extra_routes(size - len(routes)):
+        handler.register(pattern, 'ok', priority = priority, keywords = keywords)
+        routes.append((re.compile(pattern), 'ok', priority))
+    linear = [p for p, _, _ in sorted(routes, key = lambda r: -r[2])]
+    return handler.router, linear
+
+
+def queries(size):
+    newest = size - 8
+    extra = [f'skill{newest - newest % 2} status', f'turn off light {newest - newest % 2 + 1}'] if size > 8 else []
+    return EVERYDAY + extra + ['turn on the kettle', 'skill999999 status']
+
+
+def per_call(fn, texts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - start) / (repeat * len(texts)) * 1e6
+
+
+def main(argv):
+    repeat = 200
+    args = iter(argv)
+    for arg in args:
+        if arg == '--repeat':
+            repeat = int(next(args))
+    print(f"{'routes':>7}{'linear us':>12}{'router us':>12}{'router + LRU us':>17}")
+    for size in SIZES:
+        router, linear = build(size)
+        texts = queries(size)
+
+        def scan(text):
+            for pattern in linear:
+                m = pattern.fullmatch(text)
+                if m:
+                    return m
+            return None
+
+        cold = CommandRouter(cache_size = 0)
+        for route in router._routes:
+            cold.add(route.pattern, route.target, priority = route.priority, keywords = [' '.join(k) for k in route.keywords])
+        for text in texts:
+            assert (scan(text) is None) == (cold.dispatch(text) is None), text
+        print(f"{len(router):>7}{per_call(scan, texts, repeat):>12.2f}{per_call(cold.dispatch, texts, repeat):>12.2f}"
+              f"{per_call(router.dispatch, texts, repeat):>17.2f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
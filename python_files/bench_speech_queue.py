@@ -0,0 +1,113 @@
+"""Compare the FIFO TTS queue with the priority/deadline ``SpeechQueue``.
+
+    python bench_speech_queue.py
+
+Replays a start-up burst (index notice, greetings), then answers and
+speech-service errors arriving while earlier messages are still being said.
+A stand-in speaker takes 0.3 s per word (scaled by ``SCALE``). Reports
+how long answers and errors waited to start, what was dropped or merged, and
+how long the urgent error waited with preemption.
+"""
+import queue
+import threading
+import time
+
+from Metrics import LatencyStats
+from Speech_queue import CHATTER, NORMAL, URGENT, SpeechQueue
+
+SCALE = 0.1
+SECONDS_PER_WORD = 0.3
+
+# (at seconds, text, priority, key)
+SCRIPT = [
+    (0.0, 'Indexing the apps.', CHATTER, None),
+    (0.0, 'Jarvis is Online', CHATTER, None),
+    (0.0, 'Greetings', CHATTER, None),
+    (1.0, 'The current time is 10:42 AM.', NORMAL, None),
+    (2.0, 'Searching Google for python tutorials on the web right now', NORMAL, None),
+    (2.2, 'ERROR: Speech service error!', URGENT, 'error'),
+    (2.4, 'ERROR: Speech service error!', URGENT, 'error'),
+    (2.6, 'ERROR: Speech service error!', URGENT, 'error'),
+    (9.0, 'Jarvis is Online', CHATTER, None),
+    (9.1, 'Opening youtube', NORMAL, None),
+]
+
+
+class Speaker():
+    """Says one message at a time; ``cut(message)`` ends it early if that
+    message is still the one being said."""
+
+    def __init__(self):
+        self._cut = threading.Event()
+        self._lock = threading.Lock()
+        self._saying = None
+        self.stale_cuts = 0
+
+    def say(self, text, message = None):
+        with self._lock:
+            self._saying = message
+            self._cut.clear()
+        self._cut.wait(len(text.split()) * SECONDS_PER_WORD * SCALE)
+        with self._lock:
+            self._saying = None
+
+    def cut(self, message = None):
+        with self._lock:
+            if message is not None and message is not self._saying:
+                # the speaker already moved on, maybe to the urgent message
+                self.stale_cuts += 1
+                return
+            self._cut.set()
+
+
+def run(prioritized):
+    speaker = Speaker()
+    waits = {NORMAL: LatencyStats(), URGENT: LatencyStats(), CHATTER: LatencyStats()}
+    said = []
+    q = SpeechQueue(on_preempt = speaker.cut, ttl = {NORMAL: 20.0 * SCALE, CHATTER: 6.0 * SCALE}) if prioritized else queue.Queue()
+
+    def worker():
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            if prioritized:
+                text, priority, requested_at = item.text, item.priority, item.requested_at
+            else:
+                text, priority, requested_at = item
+            waits[priority].add((time.perf_counter() - requested_at) / SCALE)
+            said.append(text)
+            speaker.say(text, item if prioritized else None)
+            q.task_done()
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    start = time.perf_counter()
+    for at, text, priority, key in SCRIPT:
+        time.sleep(max(0.0, start + at * SCALE - time.perf_counter()))
+        if prioritized:
+            q.put(text, priority = priority, key = key)
+        else:
+            q.put((text, priority, time.perf_counter()))
+    q.join()
+    if prioritized:
+        q.close()
+    else:
+        q.put(None)
+    thread.join()
+    return waits, said, q
+
+
+def main():
+    print(f"{'queue':<12}{'said':>6}{'answer p50 s':>14}{'answer max s':>14}{'error max s':>13}{'dropped':>9}{'merged':>8}")
+    for name, prioritized in (('FIFO', False), ('SpeechQueue', True)):
+        waits, said, q = run(prioritized)
+        answer, error = waits[NORMAL].snapshot(), waits[URGENT].snapshot()
+        dropped = q.expired if prioritized else 0
+        merged = q.merged if prioritized else 0
+        print(f"{name:<12}{len(said):>6}{answer['p50_ms'] / 1000:>14.2f}{answer['max_ms'] / 1000:>14.2f}"
+              f"{error['max_ms'] / 1000:>13.2f}{dropped:>9}{merged:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Start-up time: the old one-after-another order vs the ``Startup`` orchestrator.
+
+    python bench_startup.py [runs] [--index S] [--render-ms MS]
+
+Each run is a fresh interpreter, so imports are cold. App indexing is a
+stand-in that takes ``INDEX`` seconds (the os.walk and the PowerShell call
+on Windows). TTS uses pyttsx3's ``dummy`` driver. The microphone is a
+``ReplaySource`` that calibrates on one second of room noise, as a real
+one would. Reports when the assistant was listening, when the greeting had
+been said and when "open <app>" could be served (p50 over the runs). The
+critical path of the last orchestrated run follows the table.
+
+With ``--render-ms`` replies are rendered ahead and played as TTS does with
+SAPI and a sound card: a stand-in render thread takes ``MS`` per phrase and
+a stand-in player 0.3 s, and "first words" is when the greeting started
+playing.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+INDEX = 1.5
+
+
+def _child(mode, index, render):
+    origin = time.perf_counter()
+    played = []
+    from Command_handler import Command_Handler
+    from Executor import Executor
+    from Speech_queue import CHATTER
+
+    class SlowIndex(Executor):
+        def index_windows_apps(self):
+            time.sleep(index)
+            self._APP_INDEX['exes']['notepad'] = 'notepad.exe'
+
+    def make_tts():
+        TTS_class = __import__('TTS_class')
+        if not render:
+            return TTS_class.TTS(rate = 0, volume = 100, driver = 'dummy', cache = False)
+
+        class RenderingTTS(TTS_class.TTS):
+            def _render(self, text):
+                time.sleep(render)
+                return TTS_class.wav_bytes(bytes(320), 16000)
+
+        def play(player, wav):
+            played.append(time.perf_counter())
+            time.sleep(0.3)
+        TTS_class._Player.available = staticmethod(lambda compressed = False: True)
+        TTS_class._Player._play = play
+        return RenderingTTS(rate = 0, volume = 100, driver = 'dummy', cache_dir = tempfile.mkdtemp())
+
+    def make_stt(tts, c_h):
+        from Replay_harness import ReplaySource
+        STT = __import__('STT_class').STT
+        return STT(tts = tts, source = ReplaySource([], lead = 30), dictation_hint = c_h.is_dictation)
+
+    xec = SlowIndex()
+    c_h = Command_Handler(xec = xec)
+    if mode == 'sequential':
+        tts = make_tts()
+        stt = make_stt(tts, c_h)
+        xec.index_windows_apps()
+        apps = time.perf_counter()
+        for line in ('Indexing the apps.', 'Jarvis is Online', 'Greetings'):
+            tts.speak(line, priority = CHATTER)
+        stt.session.start()
+        listening = time.perf_counter()
+    else:
+        from main_assist import start
+        startup, tts, stt = start(c_h, index = True, make_tts = make_tts, make_stt = make_stt)
+        listening = time.perf_counter()
+        xec.apps_ready.result()
+        apps = time.perf_counter()
+        startup.report(until = ('microphone',))
+    tts.queue.join()
+    said = time.perf_counter()
+    stt.close()
+    tts.shutdown()
+    if mode != 'sequential':
+        startup.shutdown()
+    first = played[0] - origin if played else None
+    print(json.dumps({'listening': listening - origin, 'apps': apps - origin, 'greeting': said - origin, 'first': first}))
+
+
+def _p50(values):
+    values = sorted(values)
+    return values[len(values) // 2] * 1000 if values else 0.0
+
+
+def main(argv):
+    runs, index, render = 5, INDEX, 0.0
+    args = iter(argv)
+    for arg in args:
+        if arg == '--index':
+            index = float(next(args))
+        elif arg == '--render-ms':
+            render = int(next(args)) / 1000
+        else:
+            runs = int(arg)
+    here = os.path.dirname(os.path.abspath(__file__))
+    results, report = {}, ''
+    for mode in ('sequential', 'orchestrated'):
+        results[mode] = []
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, __file__, '--child', mode, str(index), str(render)], cwd = here,
+                                 capture_output = True, text = True, timeout = 60).stdout.strip().splitlines()
+            results[mode].append(json.loads(out[-1]))
+            if mode == 'orchestrated':
+                report = '\n'.join(line for line in out if line.startswith('[Startup] critical'))
+    print(f"{runs} cold starts, app index {index * 1000:.0f} ms"
+          f"{f', render {render * 1000:.0f} ms' if render else ''}, p50 ms from interpreter start")
+    print(f"{'start-up':<14}{'listening':>11}{'first words':>13}{'greeting':>10}{'app index':>11}")
+    for mode, rows in results.items():
+        first = [r['first'] for r in rows if r['first'] is not None]
+        print(f"{mode:<14}{_p50([r['listening'] for r in rows]):>11.0f}{_p50(first) if first else float('nan'):>13.0f}"
+              f"{_p50([r['greeting'] for r in rows]):>10.0f}{_p50([r['apps'] for r in rows]):>11.0f}")
+    print(report)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        _child(sys.argv[2], float(sys.argv[3]), float(sys.argv[4]))
+    else:
+        main(sys.argv[1:])
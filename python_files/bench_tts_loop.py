@@ -0,0 +1,143 @@
+"""Measure per-utterance overhead and stop latency of the pyttsx3 worker.
+
+    python bench_tts_loop.py [utterances] [--driver NAME]
+
+Runs on pyttsx3's ``dummy`` driver by default, which reports utterances
+started and finished without producing sound, so what is timed is the
+engine plumbing around each utterance. ``runAndWait`` is the old worker
+(``say()`` then ``runAndWait()`` per utterance); ``persistent loop`` is
+``_EngineLoop`` (one ``startLoop(False)``, ``iterate()`` ticks,
+``finished-utterance`` callbacks). Stop latency is the time from ``stop()``
+with a queue of utterances pending until the worker is idle again.
+
+The dummy driver's blocking ``startLoop`` sleeps 0.5 s per turn, and
+``runAndWait`` has to go through it, so on that driver the ``runAndWait``
+row is mostly that sleep: it is not what ``runAndWait`` costs on a real
+driver. Pass ``--driver sapi5`` (or ``espeak``, ``nsss``) to compare on a
+real one, where both rows include the time to speak ``TEXT``.
+"""
+import queue
+import sys
+import threading
+import time
+
+import pyttsx3
+
+from Metrics import LatencyStats
+from TTS_class import _EngineLoop
+
+TEXT = 'The current time is 10:42 AM.'
+
+
+class RunAndWaitWorker():
+    """The worker as it was: one driver loop started and torn down per utterance."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.commands = queue.Queue()
+        self.idle = threading.Event()
+        self.idle.set()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def say(self, text):
+        self.idle.clear()
+        self.commands.put(text)
+
+    def stop(self):
+        try:
+            while True:
+                self.commands.get_nowait()
+        except queue.Empty:
+            pass
+        self.engine.stop()
+
+    def _loop(self):
+        while True:
+            text = self.commands.get()
+            say_and_wait(self.engine, text)
+            if self.commands.empty():
+                self.idle.set()
+
+
+def say_and_wait(engine, text):
+    if type(getattr(engine.proxy, '_driver', None)).__name__ == 'DummyDriver':
+        # the dummy driver only pumps queued commands once its loop is running;
+        # left idle, it would run endLoop before startLoop and never return
+        engine.proxy.setBusy(True)
+    engine.say(text)
+    engine.runAndWait()
+
+
+def overhead_run_and_wait(engine, n):
+    stats = LatencyStats()
+    for _ in range(n):
+        with stats.time():
+            say_and_wait(engine, TEXT)
+    return stats
+
+
+def overhead_loop(loop, n):
+    stats = LatencyStats()
+    for _ in range(n):
+        with stats.time():
+            loop.say(TEXT).wait()
+    return stats
+
+
+def stop_run_and_wait(engine, trials):
+    stats = LatencyStats()
+    worker = RunAndWaitWorker(engine)
+    for _ in range(trials):
+        for _ in range(20):
+            worker.say(TEXT)
+        time.sleep(0.05)
+        start = time.perf_counter()
+        worker.stop()
+        worker.idle.wait()
+        stats.add(time.perf_counter() - start)
+    return stats
+
+
+def stop_loop(loop, trials):
+    stats = LatencyStats()
+    for _ in range(trials):
+        handles = [loop.say(TEXT) for _ in range(20)]
+        time.sleep(0.05)
+        start = time.perf_counter()
+        loop.stop()
+        for handle in handles:
+            handle.done.wait()
+        stats.add(time.perf_counter() - start)
+    return stats
+
+
+def main(argv):
+    n, driver = 10, 'dummy'
+    args = iter(argv)
+    for arg in args:
+        if arg == '--driver':
+            driver = next(args)
+        else:
+            n = int(arg)
+    print(f"pyttsx3 driver: {driver}")
+    print(f"{'worker':<18}{'utt p50 ms':>12}{'utt p95 ms':>12}{'stop p50 ms':>13}{'stop p95 ms':>13}")
+
+    engine = pyttsx3.init(driver)
+    said = overhead_run_and_wait(engine, n).snapshot()
+    stopped = stop_run_and_wait(engine, 5).snapshot()
+    print(f"{'runAndWait':<18}{said['p50_ms']:>12}{said['p95_ms']:>12}{stopped['p50_ms']:>13}{stopped['p95_ms']:>13}")
+
+    loop = _EngineLoop(pyttsx3.init(driver))
+    said = overhead_loop(loop, n * 10).snapshot()
+    stopped = stop_loop(loop, 5).snapshot()
+    loop.shutdown()
+    print(f"{'persistent loop':<18}{said['p50_ms']:>12}{said['p95_ms']:>12}{stopped['p50_ms']:>13}{stopped['p95_ms']:>13}")
+    if driver == 'dummy':
+        print("[bench] caveat: the dummy driver's startLoop sleeps 0.5 s, and runAndWait has to go through it, "
+              "so the runAndWait row is mostly that sleep, not a real driver's cost; nothing is spoken in either row. "
+              "Use --driver sapi5 (or espeak) to measure the difference on a real driver.")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
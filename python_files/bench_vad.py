@@ -0,0 +1,169 @@
+"""Compare the voice-activity detectors on recorded WAVs.
+
+    python bench_vad.py clip1.wav clip2.wav ...
+
+Each WAV may have a ``clip1.txt`` next to it with one ``start end`` line
+(seconds) per speech segment. Without arguments a synthetic clip with fan
+noise, keyboard clicks and voiced bursts is generated. Reports CPU time per
+second of audio, chunk-level accuracy and phrase endpointing error for the
+legacy ``audioop`` energy gate and each NumPy detector.
+"""
+import audioop
+import os
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+import speech_recognition as sr
+
+from Mic_session import MicSession
+from Synthetic_audio import voiced
+from VAD import VADS
+
+CHUNK = 1024
+CALIBRATION = 0.5
+
+
+class LegacyGate():
+    """The per-chunk loop of ``Recognizer._listen``, for reference."""
+
+    name = 'audioop'
+
+    def __init__(self):
+        self.r = sr.Recognizer()
+
+    def run(self, pcm, sample_rate):
+        r = self.r
+        seconds_per_buffer = float(CHUNK) / sample_rate
+        calibration_chunks = int(CALIBRATION / seconds_per_buffer)
+        decisions = []
+        for i in range(0, len(pcm) - 2 * CHUNK + 1, 2 * CHUNK):
+            energy = audioop.rms(pcm[i:i + 2 * CHUNK], 2)
+            speech = energy > r.energy_threshold and len(decisions) >= calibration_chunks
+            decisions.append(speech)
+            if not speech:
+                damping = r.dynamic_energy_adjustment_damping ** seconds_per_buffer
+                target_energy = energy * r.dynamic_energy_ratio
+                r.energy_threshold = r.energy_threshold * damping + target_energy * (1 - damping)
+        return decisions
+
+
+def run_vad(vad, pcm, sample_rate):
+    vad.bind(sample_rate, CHUNK)
+    calibration = int(CALIBRATION * sample_rate / CHUNK) * 2 * CHUNK
+    vad.calibrate(pcm[:calibration])
+    decisions = [False] * (calibration // (2 * CHUNK))
+    for i in range(calibration, len(pcm) - 2 * CHUNK + 1, 2 * CHUNK):
+        decisions.append(vad.process(pcm[i:i + 2 * CHUNK], adapt = not (decisions and decisions[-1])))
+    return decisions
+
+
+def synthesize(path, seconds = 30, sample_rate = 16000, seed = 7):
+    rng = np.random.default_rng(seed)
+    n = seconds * sample_rate
+    fan = np.convolve(rng.normal(0, 900, n), np.ones(8) / 8, mode='same')
+    fan += 250 * np.sin(2 * np.pi * 120 * np.arange(n) / sample_rate)
+    signal = fan.copy()
+    for start in rng.uniform(0, seconds - 1, 25):
+        i = int(start * sample_rate)
+        signal[i:i + 80] += rng.normal(0, 6000, len(signal[i:i + 80]))
+    segments, t = [], 2.0
+    while t < seconds - 2:
+        length = rng.uniform(0.6, 2.5)
+        i, j = int(t * sample_rate), int((t + length) * sample_rate)
+        tt = np.arange(j - i) / sample_rate
+        envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * tt - np.pi / 2)) ** 0.5
+        signal[i:j] += 3500 * voiced(j - i, rng.uniform(100, 220), harmonics = 11, sample_rate = sample_rate) * envelope
+        segments.append((t, t + length))
+        t += length + rng.uniform(1.2, 3.0)
+    pcm = np.clip(signal, -32768, 32767).astype('<i2').tobytes()
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    with open(os.path.splitext(path)[0] + '.txt', 'w') as f:
+        f.writelines(f'{a:.3f} {b:.3f}\n' for a, b in segments)
+
+
+def load(path):
+    with wave.open(path, 'rb') as w:
+        assert w.getnchannels() == 1 and w.getsampwidth() == 2, 'expected 16-bit mono WAV'
+        sample_rate, pcm = w.getframerate(), w.readframes(w.getnframes())
+    labels = []
+    label_path = os.path.splitext(path)[0] + '.txt'
+    if os.path.exists(label_path):
+        with open(label_path) as f:
+            labels = [tuple(map(float, line.split()[:2])) for line in f if line.strip()]
+    return pcm, sample_rate, labels
+
+
+def chunk_truth(labels, n_chunks, sample_rate):
+    mids = (np.arange(n_chunks) + 0.5) * CHUNK / sample_rate
+    truth = np.zeros(n_chunks, dtype=bool)
+    for a, b in labels:
+        truth |= (mids >= a) & (mids <= b)
+    return truth
+
+
+def endpointing(path, vad):
+    session = MicSession(source = sr.AudioFile(path), ambient_duration = CALIBRATION, max_pending = 1000, vad = vad, ring_seconds = 600)
+    session.start()
+    phrases = []
+    while True:
+        try:
+            audio = session.listen(timeout = 5)
+        except sr.WaitTimeoutError:
+            break
+        phrases.append((audio.speech_start, audio.speech_end))
+    return phrases
+
+
+def score_phrases(phrases, labels):
+    hits, end_errors = 0, []
+    for a, b in labels:
+        overlapping = [p for p in phrases if p[0] < b and p[1] > a]
+        if overlapping:
+            hits += 1
+            end_errors.append(abs(max(p[1] for p in overlapping) - b))
+    false = sum(1 for p in phrases if not any(p[0] < b and p[1] > a for a, b in labels))
+    return hits, false, (sum(end_errors) / len(end_errors) if end_errors else float('nan'))
+
+
+def main(paths):
+    if not paths:
+        tmp = tempfile.mkdtemp()
+        paths = [os.path.join(tmp, 'synthetic.wav')]
+        synthesize(paths[0])
+        print(f'[bench] no WAVs given, using {paths[0]}')
+
+    detectors = [('audioop', None)] + [(name, cls) for name, cls in VADS.items()]
+    print(f"{'vad':<10}{'cpu ms/s':>10}{'recall':>9}{'false+':>9}{'phrases':>9}{'missed':>8}{'false':>7}{'end err s':>11}")
+    for name, cls in detectors:
+        cpu, audio_seconds, tp, fp, fn, tn = 0.0, 0.0, 0, 0, 0, 0
+        hits = false = total = 0
+        end_errors = []
+        for path in paths:
+            pcm, sample_rate, labels = load(path)
+            start = time.process_time()
+            decisions = LegacyGate().run(pcm, sample_rate) if cls is None else run_vad(cls(), pcm, sample_rate)
+            cpu += time.process_time() - start
+            audio_seconds += len(pcm) / 2.0 / sample_rate
+            pred = np.array(decisions, dtype=bool)
+            truth = chunk_truth(labels, len(pred), sample_rate)
+            tp += int(np.sum(pred & truth)); fp += int(np.sum(pred & ~truth))
+            fn += int(np.sum(~pred & truth)); tn += int(np.sum(~pred & ~truth))
+            h, f, e = score_phrases(endpointing(path, None if cls is None else cls()), labels)
+            hits, false, total = hits + h, false + f, total + len(labels)
+            if e == e:
+                end_errors.append(e)
+        recall = tp / float(tp + fn or 1)
+        false_rate = fp / float(fp + tn or 1)
+        end_error = sum(end_errors) / len(end_errors) if end_errors else float('nan')
+        print(f"{name:<10}{1000 * cpu / audio_seconds:>10.3f}{recall:>9.2f}{false_rate:>9.2f}{hits:>5}/{total:<3}{total - hits:>8}{false:>7}{end_error:>11.3f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
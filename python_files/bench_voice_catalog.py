@@ -0,0 +1,149 @@
+"""Voice selection at start-up: enumerate and scan every time vs the persisted catalog.
+
+    python bench_voice_catalog.py [--voices N] [--latency S] [--starts N]
+
+The Edge voice list is served by a local HTTP stand-in with ``N`` voices
+in the service's JSON shape, answering after ``LATENCY`` seconds. Each
+start-up picks four voices. The old way calls ``edge_tts.list_voices``
+and scans the list per pick (``VoicesManager`` does the same). The catalog
+way opens ``VoiceCatalog`` from disk and looks each pick up in its index.
+The first catalog start-up fetches the list and stores it, like a
+stale or missing catalog would. Also times pyttsx3 on the ``dummy``
+driver. Reports start-up time (p50/max) and fetches made.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import edge_tts
+import edge_tts.voices
+import pyttsx3
+
+from Metrics import LatencyStats
+from Voice_catalog import VoiceCatalog, edge_voices, pyttsx3_voices
+
+LOCALES = ['en-US', 'en-GB', 'en-AU', 'en-IN', 'de-DE', 'fr-FR', 'es-ES', 'es-MX', 'it-IT', 'ja-JP', 'pt-BR', 'hi-IN']
+PICKS = [('AriaNeural', {}), ('Ryan', {}), (None, {'language': 'fr-FR', 'gender': 'male'}),
+         ('en-IN female', {})]
+
+
+def synthetic_voices(n):
+    names = ['Aria', 'Guy', 'Jenny', 'Ryan', 'Sonia', 'Natasha', 'Katja', 'Denise', 'Henri', 'Elvira',
+             'Dalia', 'Isabella', 'Nanami', 'Francisca', 'Swara', 'Neerja', 'Prabhat', 'William']
+    voices = []
+    for i in range(n):
+        locale = LOCALES[i % len(LOCALES)]
+        name = f'{names[i % len(names)]}{"" if i < len(names) * len(LOCALES) else i}Neural'
+        voices.append({
+            'Name': f'Microsoft Server Speech Text to Speech Voice ({locale}, {name})',
+            'ShortName': f'{locale}-{name}', 'Gender': 'Female' if (i // len(LOCALES)) % 2 else 'Male', 'Locale': locale,
+            'SuggestedCodec': 'audio-24khz-48kbitrate-mono-mp3', 'FriendlyName': f'Microsoft {name} Online (Natural) - {locale}',
+            'Status': 'GA', 'VoiceTag': {'ContentCategories': ['General'], 'VoicePersonalities': ['Friendly']},
+        })
+    return voices
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.server.fetches += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandIn():
+    def __init__(self, voices, latency):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.body = json.dumps(voices).encode('utf-8')
+        self.server.latency = latency
+        self.server.fetches = 0
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/voices/list?trustedclienttoken=stand-in'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def scan(voices, query, language = None, gender = None):
+    # what picking a voice looks like without an index
+    for v in voices:
+        if query and query.lower() not in (v['ShortName'] + ' ' + v['FriendlyName']).lower():
+            if not all(w in (v['ShortName'] + ' ' + v['Gender']).lower() for w in query.lower().split()):
+                continue
+        if language and v['Locale'] != language:
+            continue
+        if gender and v['Gender'].lower() != gender:
+            continue
+        return v['ShortName']
+    return None
+
+
+def start_scanning():
+    voices = asyncio.run(edge_tts.list_voices())
+    return [scan(voices, query, **filters) for query, filters in PICKS]
+
+
+def start_catalog(path):
+    catalog = VoiceCatalog(path = path)
+    picks = []
+    for query, filters in PICKS:
+        found = catalog.find(query, engine = 'edge', enumerate = edge_voices, **filters)
+        picks.append(found['id'] if found else None)
+    return picks
+
+
+def timed(starts, run):
+    stats = LatencyStats()
+    for _ in range(starts):
+        with stats.time():
+            picks = run()
+    return stats, picks
+
+
+def main(argv):
+    n, latency, starts = 400, 0.15, 10
+    args = iter(argv)
+    for arg in args:
+        if arg == '--voices':
+            n = int(next(args))
+        elif arg == '--latency':
+            latency = float(next(args))
+        elif arg == '--starts':
+            starts = int(next(args))
+    server = StandIn(synthetic_voices(n), latency)
+    # list_voices reads the URL from its module; the DRM token is appended to it
+    edge_tts.voices.VOICE_LIST = server.url
+    path = os.path.join(tempfile.mkdtemp(), 'voices.json')
+    print(f"{n} Edge voices, list latency {latency * 1000:.0f} ms, {starts} start-ups x {len(PICKS)} picks")
+    print(f"{'start-up':<22}{'p50 ms':>9}{'max ms':>9}{'fetches':>9}  picks")
+    for name, run in (('list + scan', start_scanning), ('VoiceCatalog', lambda: start_catalog(path))):
+        before = server.server.fetches
+        stats, picks = timed(starts, run)
+        s = stats.snapshot()
+        print(f"{name:<22}{s['p50_ms']:>9}{s['max_ms']:>9}{server.server.fetches - before:>9}  {picks}")
+    server.close()
+
+    engine = pyttsx3.init('dummy')
+    scan_stats, _ = timed(starts, lambda: next((v.id for v in engine.getProperty('voices') if 'jane' in v.name.lower()), None))
+    catalog = VoiceCatalog(path = path)
+    catalog.find('jane', engine = 'pyttsx3-dummy', enumerate = lambda: pyttsx3_voices(engine))
+    find_stats, _ = timed(starts, lambda: VoiceCatalog(path = path).find('jane', engine = 'pyttsx3-dummy')['id'])
+    for name, stats in (('pyttsx3 dummy scan', scan_stats), ('pyttsx3 dummy catalog', find_stats)):
+        s = stats.snapshot()
+        print(f"{name:<22}{s['p50_ms']:>9}{s['max_ms']:>9}{'-':>9}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
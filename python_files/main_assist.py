@@ -1,36 +1,149 @@
-from Executor import Executor 
-from Command_handler import Command_Handler 
-from TTS_class import TTS
-from STT_class import STT 
+from Executor import Executor
+from Command_handler import Command_Handler
+from Pipeline import Pipeline, Stage
+from Speech_queue import CHATTER, URGENT
+from Startup import Startup
+from Intent_classifier import load_classifier
+import importlib
 import platform
+import os
+import sys
+import time
 
 IS_WINDOWS = platform.system() == 'Windows'
+OFFLINE = '--offline' in sys.argv
+# race Google against local pocketsphinx, first confident answer wins
+HEDGED = '--hedged' in sys.argv
+# keep listening while speaking; talking over the assistant interrupts it
+DUPLEX = '--duplex' in sys.argv
+# index apps under these directories (os.pathsep separated) instead of the Start Menu, on any OS
+APP_ROOTS = sys.argv[sys.argv.index('--app-roots') + 1].split(os.pathsep) if '--app-roots' in sys.argv else None
+WAKE_TEMPLATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wake_jarvis.npz')
+GREETING = ['Jarvis is Online', 'Greetings']
+# the fixed parts of the usual replies (see TTS_cache.TEMPLATES), rendered while the apps are indexed
+COMMON_REPLIES = ['Opening', 'The current time is', "Today's date is", 'Searching Google for',
+                  "I haven't been modelled for that action!", 'Goodbye!']
 
-if __name__ == '__main__':
-    xec = Executor()
-    c_h = Command_Handler(xec=xec) 
-    tts = TTS(rate = 0, volume = 100)
-    stt = STT(tts = tts)
-
-    if IS_WINDOWS:
-        xec.index_windows_apps()
-        tts.speak('Indexing the apps.')
-    else:
-        print("[Index] Non-Windows OS: skipping Start Menu/UWP indexing.")
 
-    
-    tts.speak('Jarvis is Online')
-    tts.speak('Greetings')
-    
+def build_pipeline(stt, c_h, tts):
+    import speech_recognition as sr
+
+    def capture():
+        try:
+            audio = stt.capture()
+            if audio is None:
+                # the session is closed; nothing more comes until the pipeline stops
+                time.sleep(0.1)
+            return audio
+        except sr.WaitTimeoutError:
+            return None
+        except OSError as e:
+            tts.speak(f'ERROR: {e}', priority = URGENT, key = 'error')
+            time.sleep(1)
+            return None
+
+    def recognize(audio):
+        command = stt.recognize(audio)
+        return (command, getattr(audio, 'dictated', False)) if command else None
+
+    def route(heard):
+        command, dictated = heard
+        return c_h.route(command, dictated = dictated)
 
-    while True:
-        command = stt.listen()
-        if not command:
-            continue
-        result = c_h.handle_command(command)
+    def execute(route):
+        result = c_h.execute(route)
         if result == '__EXIT__':
             tts.speak('Goodbye!')
-            break
-        tts.speak(result)
-    
+            pipeline.stop()
+            return None
+        return result
+
+    pipeline = Pipeline([
+        Stage('capture', capture),
+        Stage('recognize', recognize, workers = 2, maxsize = 4),
+        Stage('route', route),
+        Stage('execute', execute),
+        Stage('speak', tts.speak),
+    ], origin = lambda audio: getattr(audio, 'ended_at', None))
+    return pipeline
+
+
+def make_tts():
+    return importlib.import_module('TTS_class').TTS(rate = 0, volume = 100)
+
+
+def make_stt(tts, c_h):
+    STT = importlib.import_module('STT_class').STT
+    stt = STT(tts = tts, backend = 'sphinx' if OFFLINE else ['google', 'sphinx'] if HEDGED else 'google', dictation_hint = c_h.is_dictation,
+              wake_word = WAKE_TEMPLATES if os.path.exists(WAKE_TEMPLATES) else None, barge_in = DUPLEX)
+    if stt.endpointer:
+        # "take a note" the classifier recognized, which the hint's pattern missed
+        c_h.on_dictation = stt.endpointer.dictate
+    return stt
+
+
+def start(c_h, index = IS_WINDOWS or APP_ROOTS is not None, make_tts = make_tts, make_stt = make_stt):
+    # imports, engine set-up, app indexing and the microphone all overlap;
+    # only "open <app>" waits for the index. Returns once the microphone is
+    # listening (or has failed to open).
+    startup = Startup()
+    xec = c_h.xec
+    greeting = (['Indexing the apps.'] if index else []) + GREETING
+    startup.step('import stt', importlib.import_module, 'STT_class')
+    startup.step('tts', make_tts)
+    if index:
+        xec.apps_ready = startup.step('index apps', xec.index_windows_apps)
+    else:
+        print("[Index] Non-Windows OS: skipping Start Menu/UWP indexing.")
+    # only the greeting is on the way to first speech; COMMON_REPLIES follow it below
+    startup.step('prerender', lambda: [f.result() for f in startup.result('tts').prerender(greeting)], after = ('tts',))
+    startup.step('stt', lambda: make_stt(startup.result('tts'), c_h), after = ('import stt', 'tts'))
+    startup.step('microphone', lambda: startup.result('stt').session and startup.result('stt').session.start(), after = ('stt',))
+    if c_h.classifier is not None:
+        # loaded behind the microphone rather than on the first unknown command
+        startup.step('intents', c_h.classifier.warm, after = ('microphone',))
+
+    tts = startup.result('tts')
+    # startup chatter gives way to answers and is dropped if it goes stale
+    said = None
+    for line in greeting:
+        if line != 'Indexing the apps.' or not xec.apps_ready.done():
+            said = tts.speak(line, priority = CHATTER) or said
+    # the common replies go to the (single) render thread once the greeting
+    # has been said or dropped, so they never hold up its render
+    if said is not None:
+        said.add_done_callback(lambda completed: tts.prerender(COMMON_REPLIES))
+    else:
+        tts.prerender(COMMON_REPLIES)
+    try:
+        startup.result('microphone')
+    except Exception as e:
+        # capture reports it again and keeps retrying
+        print(f'[Mic] {e}')
+    return startup, tts, startup.result('stt')
+
+
+if __name__ == '__main__':
+    xec = Executor(app_roots = APP_ROOTS)
+    c_h = Command_Handler(xec=xec, classifier = load_classifier())
+    startup, tts, stt = start(c_h)
+
+    pipeline = build_pipeline(stt, c_h, tts)
+    pipeline.start()
+    startup.report(until = ('microphone',))
+    try:
+        pipeline.wait()
+    except KeyboardInterrupt:
+        pipeline.stop()
+
+    stt.close()
+    pipeline.join()
+    pipeline.report()
+    if hasattr(stt.backend, 'stats'):
+        print(f'[STT] {stt.backend.stats()}')
+    print(f'[TTS] {tts.stats()}')
+    print(f'[Commands] {c_h.stats()}')
+    if stt.barge_in:
+        print(f'[Barge-in] {stt.barge_in.snapshot()}')
     tts.shutdown()
+    startup.shutdown()
@@ -0,0 +1,45 @@
+"""Which rule an "open ... folder" command ends up on.
+
+    python -m pytest -q test_command_handler.py
+
+Uses the shipped NumPy intent model and records actions instead of
+performing them.
+"""
+import importlib.util
+import os
+import unittest
+
+from Command_handler import Command_Handler
+from Intent_classifier import HASHED_MODEL, HashedIntentClassifier
+from Replay_harness import RecordingExecutor
+
+
+@unittest.skipUnless(importlib.util.find_spec('numpy') is not None and os.path.exists(os.path.join(HASHED_MODEL, 'weights.npy')),
+                     'no NumPy or no exported intent model')
+class OpenFolder(unittest.TestCase):
+
+    def setUp(self):
+        self.xec = RecordingExecutor()
+        self.handler = Command_Handler(xec = self.xec, classifier = HashedIntentClassifier())
+
+    def said(self, command):
+        self.handler.handle_command(command)
+        return self.xec.actions[-1]
+
+    def test_folder_phrases_go_to_the_folder_rule(self):
+        self.assertEqual(self.said('open my videos folder please'), ('open_folder', 'videos'))
+        self.assertEqual(self.said('open the pictures folder'), ('open_folder', 'pictures'))
+        self.assertEqual(self.said('open music folder'), ('open_folder', 'music'))
+
+    def test_apps_stay_apps(self):
+        self.assertEqual(self.said('open notepad'), ('launch', 'notepad'))
+        self.assertEqual(self.said('open calculator'), ('launch', 'calculator'))
+
+    def test_without_a_classifier_the_app_rule_stands(self):
+        handler = Command_Handler(xec = self.xec)
+        handler.handle_command('open my videos folder please')
+        self.assertEqual(self.xec.actions[-1], ('launch', 'my videos folder please'))
+
+
+if __name__ == '__main__':
+    unittest.main()
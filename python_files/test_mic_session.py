@@ -0,0 +1,111 @@
+"""Shutting a session down while capture is in flight.
+
+    python -m pytest -q test_mic_session.py
+
+The source is in-memory noise read at real time, so the session's worker
+is blocked in a read (or calibrating) when ``close()`` lands.
+"""
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from STT_class import STT
+from Synthetic_audio import CHUNK, SAMPLE_RATE, PcmSource
+
+
+class PacedSource(PcmSource):
+    """``seconds`` of low noise, each read taking as long as it would from a microphone."""
+
+    def __init__(self, seconds = 30, seed = 0):
+        noise = np.random.default_rng(seed).normal(0, 30, int(seconds * SAMPLE_RATE))
+        super().__init__(noise.astype('<i2').tobytes())
+
+    def read(self, size):
+        time.sleep(size / float(SAMPLE_RATE))
+        return super().read(size)
+
+
+def make_stt(source):
+    return STT(source = source, ambient_duration = 0.1, listen_timeout = 0.2, flac_level = None, endpointing = False)
+
+
+class CloseWhileCapturing(unittest.TestCase):
+
+    def test_close_races_capture_loop(self):
+        # the pipeline's capture stage calls capture() in a loop while the
+        # main thread closes the session, at a different moment each round
+        for round in range(20):
+            stt = make_stt(PacedSource(seed = round))
+            errors, results = [], []
+
+            def capture_loop():
+                try:
+                    while True:
+                        try:
+                            audio = stt.capture()
+                        except Exception as e:
+                            if type(e).__name__ != 'WaitTimeoutError':
+                                raise
+                            continue
+                        if audio is None:
+                            results.append(None)
+                            return
+                except BaseException as e:
+                    errors.append(e)
+
+            thread = threading.Thread(target = capture_loop, daemon = True)
+            thread.start()
+            time.sleep((round % 5) * 0.03)
+            stt.close()
+            thread.join(timeout = 5)
+            self.assertFalse(thread.is_alive(), 'capture did not return after close()')
+            self.assertEqual(errors, [])
+            self.assertEqual(results, [None])
+            self.assertTrue(stt.session.closed)
+            self.assertFalse(stt.session.running)
+
+    def test_stop_races_start(self):
+        for round in range(20):
+            stt = make_stt(PacedSource(seed = round))
+            errors = []
+
+            def start():
+                try:
+                    stt.session.start()
+                except RuntimeError as e:
+                    # stop() got the lock first
+                    self.assertIn('closed', str(e))
+                except BaseException as e:
+                    errors.append(e)
+
+            thread = threading.Thread(target = start, daemon = True)
+            thread.start()
+            time.sleep((round % 4) * CHUNK / float(SAMPLE_RATE))
+            stt.session.stop()
+            thread.join(timeout = 5)
+            self.assertEqual(errors, [])
+            self.assertFalse(stt.session.running)
+
+    def test_capture_does_not_restart_a_closed_session(self):
+        stt = make_stt(PacedSource())
+        stt.session.start()
+        stt.close()
+        self.assertIsNone(stt.capture())
+        self.assertFalse(stt.session.running)
+        with self.assertRaises(RuntimeError):
+            stt.session.start()
+
+    def test_source_running_out_closes_the_session(self):
+        stt = make_stt(PcmSource(bytes(2 * SAMPLE_RATE)))
+        stt.session.start()
+        deadline = time.monotonic() + 5
+        while stt.session.running and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(stt.session.closed)
+        self.assertIsNone(stt.capture())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Which engine ``TTS`` ends up on for a requested backend.
+
+    python -m pytest -q test_tts_backends.py
+
+Constructing the backends opens no connection, so these run offline.
+"""
+import unittest
+from unittest import mock
+
+import TTS_backends
+from TTS_backends import _HAS_EDGE_TTS, _HAS_GTTS, EdgeBackend, GTTSBackend
+from TTS_class import TTS
+
+
+@unittest.skipUnless(_HAS_EDGE_TTS, 'edge_tts is not installed')
+class EdgeSelected(unittest.TestCase):
+
+    def test_default_rate_and_volume_select_edge(self):
+        # TTS passes rate = None and volume = None unless told otherwise
+        tts = TTS(backend = 'edge', cache = False)
+        try:
+            self.assertEqual(tts.engine_kind, 'edge')
+            self.assertIsInstance(tts._backend, EdgeBackend)
+            self.assertEqual((tts._backend.config.rate, tts._backend.config.volume), ('+0%', '+0%'))
+        finally:
+            tts.shutdown()
+
+    def test_sapi_scale_numbers(self):
+        backend = EdgeBackend(rate = 2, volume = 80)
+        try:
+            self.assertEqual((backend.config.rate, backend.config.volume), ('+20%', '-20%'))
+        finally:
+            backend.close()
+
+
+class OldGTTS():
+    """A gTTS with ``stream`` but no ``_prepare_requests``."""
+
+    def __init__(self, text, **kwargs):
+        self.text = text
+
+    def stream(self):
+        for word in self.text.split():
+            yield word.encode()
+
+
+@unittest.skipUnless(_HAS_GTTS, 'gTTS is not installed')
+class GTTSFallback(unittest.TestCase):
+
+    def test_without_prepare_requests(self):
+        backend = GTTSBackend()
+        try:
+            with mock.patch.object(TTS_backends, 'gTTS', OldGTTS):
+                self.assertEqual(backend.render('one two three'), b'onetwothree')
+            self.assertEqual(backend.parts, 3)
+        finally:
+            backend.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
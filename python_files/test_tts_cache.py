@@ -0,0 +1,51 @@
+"""The disk tier of ``SpeechCache``: file names and the byte budget.
+
+    python -m pytest -q test_tts_cache.py
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from TTS_cache import SpeechCache
+
+
+class DiskTier(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors = True)
+
+    def test_files_are_named_by_audio_format(self):
+        cache = SpeechCache(directory = self.directory, audio_format = 'mp3')
+        cache.put('a', b'ID3 mp3')
+        self.assertEqual(os.listdir(self.directory), ['a.mp3'])
+        self.assertEqual(SpeechCache(directory = self.directory, audio_format = 'mp3').get('a'), b'ID3 mp3')
+
+    def test_least_recently_used_goes_first(self):
+        cache = SpeechCache(directory = self.directory, memory_items = 0, disk_bytes = 30)
+        for key in 'abc':
+            cache.put(key, bytes(10))
+        cache.get('a')
+        cache.put('d', bytes(10))
+        self.assertEqual(sorted(os.listdir(self.directory)), ['a.wav', 'c.wav', 'd.wav'])
+        self.assertEqual(cache.stats()['disk_bytes'], 30)
+
+    def test_overwrite_is_counted_once(self):
+        cache = SpeechCache(directory = self.directory, disk_bytes = 30)
+        for _ in range(5):
+            cache.put('a', bytes(10))
+        self.assertEqual(cache.stats()['disk_bytes'], 10)
+
+    def test_startup_scan_counts_every_format(self):
+        SpeechCache(directory = self.directory, audio_format = 'mp3').put('a', bytes(20))
+        SpeechCache(directory = self.directory).put('b', bytes(20))
+        cache = SpeechCache(directory = self.directory, disk_bytes = 30)
+        self.assertEqual(cache.stats()['disk_bytes'], 20)
+        self.assertEqual(os.listdir(self.directory), ['b.wav'])
+
+
+if __name__ == '__main__':
+    unittest.main()
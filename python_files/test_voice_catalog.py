@@ -0,0 +1,57 @@
+"""Listing the voices of every engine through ``VoiceCatalog.all``.
+
+    python -m pytest -q test_voice_catalog.py
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from Voice_catalog import VoiceCatalog
+
+
+class Counting():
+    """An enumerator returning ``voices`` and counting its calls."""
+
+    def __init__(self, *names):
+        self.voices = [{'id': name, 'name': name, 'languages': ['en-US'], 'gender': None} for name in names]
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.voices
+
+
+class AllEngines(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'voices.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors = True)
+
+    def test_each_engine_is_listed_once_per_ttl(self):
+        edge, local = Counting('Aria', 'Guy'), Counting('Zira')
+        catalog = VoiceCatalog(path = self.path)
+        for _ in range(3):
+            voices = catalog.all({'edge': edge, 'sapi': local})
+        self.assertEqual({engine: [v['id'] for v in found] for engine, found in voices.items()},
+                         {'edge': ['Aria', 'Guy'], 'sapi': ['Zira']})
+        self.assertEqual((edge.calls, local.calls), (1, 1))
+
+    def test_stored_engines_are_included(self):
+        VoiceCatalog(path = self.path).voices('pyttsx3', Counting('david'))
+        gtts = Counting('en')
+        voices = VoiceCatalog(path = self.path).all({'gtts': gtts})
+        self.assertEqual(sorted(voices), ['gtts', 'pyttsx3'])
+
+    def test_a_failing_engine_does_not_hide_the_others(self):
+        def offline():
+            raise OSError('no network')
+        voices = VoiceCatalog(path = self.path).all({'edge': offline, 'gtts': Counting('en')})
+        self.assertEqual(sorted(voices), ['gtts'])
+
+
+if __name__ == '__main__':
+    unittest.main()